@@ -0,0 +1,138 @@
+"""
+Items/sec for the per-item vs batch tools of the mcpconcepts math and text servers.
+
+Modes per server:
+- item:  one multiply/reverse call per item (--item-count items)
+- json:  multiply_batch/reverse_batch with JSON lists (--batch-count items, in --chunk sized calls)
+- b64:   the same batches as packed base64 payloads (mcpconcepts/packing.py)
+The servers run in-process over FastMCP's in-memory transport by default, which
+isolates protocol + serialization cost; --http talks to running servers on 8000/8001.
+
+Run from the repo root:
+    python -m benchmarks.bench_batch_tools --item-count 2000 --batch-count 1000000
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import string
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict
+
+from fastmcp import Client
+
+from mcpconcepts import math_server, text_server
+from mcpconcepts.packing import pack_array, pack_strings, unpack_array, unpack_strings
+
+
+def _payload(result: Any) -> Any:
+    return json.loads(result.content[0].text)
+
+
+async def _timed(n_items: int, fn: Callable[[], Awaitable[None]]) -> Dict[str, Any]:
+    started = time.perf_counter()
+    await fn()
+    wall = time.perf_counter() - started
+    return {"items": n_items, "wall_s": round(wall, 4), "items_per_s": round(n_items / wall, 1) if wall else 0.0}
+
+
+async def bench_math(client: Client, args: argparse.Namespace) -> Dict[str, Any]:
+    rng = random.Random(0)
+    a = [rng.randint(-1000, 1000) for _ in range(args.batch_count)]
+    b = [rng.randint(-1000, 1000) for _ in range(args.batch_count)]
+    chunks = [(a[i:i + args.chunk], b[i:i + args.chunk]) for i in range(0, args.batch_count, args.chunk)]
+
+    async def item() -> None:
+        sem = asyncio.Semaphore(args.concurrency)
+
+        async def one(i: int) -> None:
+            async with sem:
+                res = await client.call_tool("multiply", {"a": a[i], "b": b[i]})
+                assert int(res.content[0].text) == a[i] * b[i]
+
+        await asyncio.gather(*(one(i) for i in range(args.item_count)))
+
+    async def as_json() -> None:
+        for xs, ys in chunks:
+            out = _payload(await client.call_tool("multiply_batch", {"a": xs, "b": ys}))["result"]
+            assert out[-1] == xs[-1] * ys[-1]
+
+    async def as_b64() -> None:
+        for xs, ys in chunks:
+            res = _payload(await client.call_tool("multiply_batch", {"a_b64": pack_array(xs), "b_b64": pack_array(ys)}))
+            assert int(unpack_array(res["result_b64"])[-1]) == xs[-1] * ys[-1]
+
+    return {
+        "item": await _timed(args.item_count, item),
+        "json": await _timed(args.batch_count, as_json),
+        "b64": await _timed(args.batch_count, as_b64),
+    }
+
+
+async def bench_text(client: Client, args: argparse.Namespace) -> Dict[str, Any]:
+    rng = random.Random(1)
+    texts = ["".join(rng.choices(string.ascii_letters, k=args.text_len)) for _ in range(args.batch_count // 10)]
+    chunk = max(1, args.chunk // 10)
+    chunks = [texts[i:i + chunk] for i in range(0, len(texts), chunk)]
+
+    async def item() -> None:
+        sem = asyncio.Semaphore(args.concurrency)
+
+        async def one(i: int) -> None:
+            async with sem:
+                res = await client.call_tool("reverse", {"text": texts[i]})
+                assert res.content[0].text == texts[i][::-1]
+
+        await asyncio.gather(*(one(i) for i in range(min(args.item_count, len(texts)))))
+
+    async def as_json() -> None:
+        for part in chunks:
+            out = _payload(await client.call_tool("reverse_batch", {"texts": part}))["result"]
+            assert out[-1] == part[-1][::-1]
+
+    async def as_b64() -> None:
+        for part in chunks:
+            res = _payload(await client.call_tool("reverse_batch", {"texts_b64": pack_strings(part)}))
+            assert unpack_strings(res["result_b64"])[-1] == part[-1][::-1]
+
+    return {
+        "item": await _timed(min(args.item_count, len(texts)), item),
+        "json": await _timed(len(texts), as_json),
+        "b64": await _timed(len(texts), as_b64),
+    }
+
+
+async def _run(args: argparse.Namespace) -> Dict[str, Any]:
+    math_target = "http://127.0.0.1:8000/mcp" if args.http else math_server.mcp
+    text_target = "http://127.0.0.1:8001/mcp" if args.http else text_server.mcp
+    results: Dict[str, Any] = {}
+    async with Client(math_target) as client:
+        results["math"] = await bench_math(client, args)
+    async with Client(text_target) as client:
+        results["text"] = await bench_text(client, args)
+    for server, modes in results.items():
+        base = modes["item"]["items_per_s"] or 1.0
+        for mode, stats in modes.items():
+            print(f"{server:5s} {mode:5s} {stats['items_per_s']:>12,.0f} items/s  ({stats['items_per_s'] / base:,.0f}x item)")
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Per-item vs batch tool throughput for mcpconcepts servers")
+    parser.add_argument("--item-count", type=int, default=2000, help="Items sent one call each")
+    parser.add_argument("--batch-count", type=int, default=1_000_000, help="Items sent through the batch tools")
+    parser.add_argument("--chunk", type=int, default=100_000, help="Items per batch call (strings: a tenth of this)")
+    parser.add_argument("--text-len", type=int, default=32, help="Length of each string for the text server")
+    parser.add_argument("--concurrency", type=int, default=16, help="In-flight per-item calls")
+    parser.add_argument("--http", action="store_true", help="Use running servers on :8000/:8001 instead of in-memory")
+    parser.add_argument("--out", type=str, default="bench_batch_tools.json", help="Where to write the results JSON")
+    args = parser.parse_args()
+    results = asyncio.run(_run(args))
+    Path(args.out).write_text(json.dumps(results, indent=2), encoding="utf-8")
+    print(f"Results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""
+Offline end-to-end benchmark for the research and DeepWiki pipelines.
+
+Every external dependency is replaced by a local stand-in (see fakes.py):
+DuckDuckGo -> FakeDDGS, live websites -> FixtureWebServer, Gemini -> FakeGenAI,
+hosted DeepWiki -> in-process fake server. The research MCP server runs
+in-process through FastMCP's in-memory transport.
+
+Run from the repo root:
+    python -m benchmarks.bench_pipelines --concurrency 1,4,16 --repeat 3
+    python -m benchmarks.bench_pipelines --update-baseline
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List
+
+from benchmarks.fakes import FakeGenAI, FixtureWebServer, build_fake_deepwiki, make_fake_ddgs
+
+BASELINE_PATH = Path(__file__).resolve().parent / "baselines.json"
+SCENARIOS = ("research", "sk_agent", "simple_agent", "deepwiki")
+
+
+class StageRecorder:
+    """Accumulates wall time per pipeline stage (summed over concurrent runs)."""
+
+    def __init__(self):
+        self.totals: Dict[str, float] = defaultdict(float)
+        self.counts: Dict[str, int] = defaultdict(int)
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.totals[stage] += seconds
+        self.counts[stage] += 1
+
+    def reset(self) -> None:
+        self.totals.clear()
+        self.counts.clear()
+
+    def per_run(self, runs: int) -> Dict[str, float]:
+        return {k: round(v / max(1, runs), 6) for k, v in sorted(self.totals.items())}
+
+
+@contextmanager
+def _patched(obj: Any, name: str, value: Any):
+    old = getattr(obj, name)
+    setattr(obj, name, value)
+    try:
+        yield
+    finally:
+        setattr(obj, name, old)
+
+
+def _wrap_async(recorder: StageRecorder, fn: Callable, stage_of: Callable[..., str]):
+    async def wrapper(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await fn(self, *args, **kwargs)
+        finally:
+            recorder.add(stage_of(*args, **kwargs), time.perf_counter() - started)
+
+    return wrapper
+
+
+class Harness:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.recorder = StageRecorder()
+        self.web = FixtureWebServer(pages_dir=args.pages_dir, latency=args.web_latency, page_bytes=args.page_bytes)
+        self.fake_llm = FakeGenAI(
+            first_token_latency=args.llm_first_token,
+            token_latency=args.llm_token_latency,
+            rpm=args.llm_rpm,
+            on_call=lambda model, dt: self.recorder.add("llm", dt),
+        )
+
+    @contextmanager
+    def installed(self):
+        """Swap the real backends for the stand-ins for the duration of the run."""
+        os.environ.setdefault("GOOGLE_API_KEY", "offline-benchmark")
+        from fastmcp import Client
+        from common import llm_gateway
+        import research_assistant.server as ra_server
+        import research_assistant.client as ra_client
+        import research_assistant.sk_client as ra_sk
+        import research_assistant.llm_driven_client as ra_llm
+        import deepwiki_assistant.client as dw_client
+
+        self.ra_server = ra_server
+        self.ra_client = ra_client
+        self.ra_sk = ra_sk
+        self.ra_llm = ra_llm
+        self.dw_client = dw_client
+        self.fake_deepwiki = build_fake_deepwiki(latency={
+            "read_wiki_structure": self.args.deepwiki_latency,
+            "read_wiki_contents": self.args.deepwiki_latency,
+            "ask_question": self.args.deepwiki_latency * 4,
+        })
+
+        self.web.start()
+        fake_ddgs = make_fake_ddgs(self.web.urls(), latency=self.args.search_latency)
+        call_tool = _wrap_async(self.recorder, Client.call_tool, lambda name, *a, **k: f"mcp:{name}")
+        get_prompt = _wrap_async(self.recorder, Client.get_prompt, lambda name, *a, **k: f"prompt:{name}")
+        try:
+            with _patched(ra_server, "DDGS", fake_ddgs), \
+                    _patched(ra_server, "STORE", None), \
+                    _patched(ra_server, "PAGES", ra_server.PageStore()), \
+                    _patched(ra_server, "CORPUS", None), \
+                    _patched(llm_gateway, "genai", self.fake_llm), \
+                    _patched(llm_gateway, "_GATEWAY", llm_gateway.LLMGateway(rpm=100_000, max_concurrency=64)), \
+                    _patched(ra_client, "SERVER_URL", ra_server.mcp), \
+                    _patched(Client, "call_tool", call_tool), \
+                    _patched(Client, "get_prompt", get_prompt):
+                yield self
+        finally:
+            self.web.stop()
+
+    def scenario(self, name: str, workdir: Path) -> Callable[[int], Awaitable[Any]]:
+        if name == "research":
+            return lambda i: self.ra_client.research_and_summarize(f"topic {i}", max_results=5, out_file=None)
+        if name == "sk_agent":
+            return lambda i: self.ra_sk.SKAgent(server_url=self.ra_server.mcp).run(
+                f"topic {i}", max_results=5, out_file=str(workdir / f"sk_{i}.md")
+            )
+        if name == "simple_agent":
+            return lambda i: self.ra_llm.SimpleAgent(server_url=self.ra_server.mcp).run(f"explain topic {i}")
+        if name == "deepwiki":
+            return lambda i: self.dw_client.query_deepwiki(
+                self.fake_deepwiki, "owner/repo", f"how does part {i} work?", topic="overview"
+            )
+        raise ValueError(f"unknown scenario: {name}")
+
+    async def measure(self, name: str, concurrency: int, repeat: int, workdir: Path) -> Dict[str, Any]:
+        run = self.scenario(name, workdir)
+        await run(0)  # warm-up (imports, first connections)
+        walls: List[float] = []
+        run_times: List[float] = []
+        peaks: List[int] = []
+        self.recorder.reset()
+
+        async def _timed(i: int) -> None:
+            started = time.perf_counter()
+            await run(i)
+            run_times.append(time.perf_counter() - started)
+
+        for _ in range(repeat):
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            started = time.perf_counter()
+            await asyncio.gather(*(_timed(i) for i in range(concurrency)))
+            walls.append(time.perf_counter() - started)
+            peaks.append(tracemalloc.get_traced_memory()[1] - base)
+
+        wall = statistics.median(walls)
+        run_times.sort()
+        return {
+            "wall_s": round(wall, 4),
+            "run_p50_s": round(run_times[len(run_times) // 2], 4),
+            "run_p95_s": round(run_times[min(len(run_times) - 1, int(len(run_times) * 0.95))], 4),
+            "throughput_rps": round(concurrency / wall, 3) if wall else 0.0,
+            "peak_mem_mb": round(max(peaks) / 1e6, 3),
+            "stages_s": self.recorder.per_run(concurrency * repeat),
+        }
+
+
+def compare_to_baseline(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Return a list of human-readable regressions (empty when within tolerance)."""
+    regressions: List[str] = []
+    for scenario, levels in results.items():
+        for level, cur in levels.items():
+            base = baseline.get(scenario, {}).get(level)
+            if not base:
+                continue
+            for metric in ("wall_s", "peak_mem_mb"):
+                if base.get(metric) and cur[metric] > base[metric] * (1 + tolerance):
+                    regressions.append(
+                        f"{scenario} c={level} {metric}: {cur[metric]} > {base[metric]} (+{tolerance:.0%} allowed)"
+                    )
+            if base.get("throughput_rps") and cur["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+                regressions.append(
+                    f"{scenario} c={level} throughput_rps: {cur['throughput_rps']} < {base['throughput_rps']}"
+                )
+    return regressions
+
+
+async def _run(args: argparse.Namespace) -> Dict[str, Any]:
+    harness = Harness(args)
+    results: Dict[str, Any] = {}
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+    with harness.installed(), tempfile.TemporaryDirectory() as tmp:
+        tracemalloc.start()
+        try:
+            for name in args.scenarios.split(","):
+                name = name.strip()
+                results[name] = {}
+                for c in levels:
+                    stats = await harness.measure(name, c, args.repeat, Path(tmp))
+                    results[name][str(c)] = stats
+                    print(f"{name:13s} c={c:<3d} wall={stats['wall_s']:.3f}s "
+                          f"p50={stats['run_p50_s']:.3f}s rps={stats['throughput_rps']:.2f} "
+                          f"peak={stats['peak_mem_mb']:.1f}MB")
+        finally:
+            tracemalloc.stop()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline pipeline benchmark with local stand-ins")
+    parser.add_argument("--scenarios", type=str, default=",".join(SCENARIOS), help="Comma-separated scenarios")
+    parser.add_argument("--concurrency", type=str, default="1,4,16", help="Comma-separated concurrency levels")
+    parser.add_argument("--repeat", type=int, default=3, help="Repetitions per level (median wall time is kept)")
+    parser.add_argument("--pages-dir", type=str, default=None, help="Directory of recorded *.html pages to serve")
+    parser.add_argument("--page-bytes", type=int, default=20_000, help="Size of generated pages")
+    parser.add_argument("--web-latency", type=float, default=0.02, help="Fixture web server latency per request (s)")
+    parser.add_argument("--search-latency", type=float, default=0.05, help="Fake search latency per query (s)")
+    parser.add_argument("--deepwiki-latency", type=float, default=0.02, help="Fake DeepWiki latency per call (s)")
+    parser.add_argument("--llm-first-token", type=float, default=0.05, help="Fake LLM first-token latency (s)")
+    parser.add_argument("--llm-token-latency", type=float, default=0.0005, help="Fake LLM per-token latency (s)")
+    parser.add_argument("--llm-rpm", type=int, default=0, help="Fake LLM requests/minute limit (0 = unlimited)")
+    parser.add_argument("--out", type=str, default="bench_results.json", help="Where to write the results JSON")
+    parser.add_argument("--baseline", type=str, default=str(BASELINE_PATH), help="Baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative regression (0.25 = 25%%)")
+    parser.add_argument("--update-baseline", action="store_true", help="Store this run as the new baseline")
+    args = parser.parse_args()
+
+    results = asyncio.run(_run(args))
+    Path(args.out).write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+    if args.update_baseline:
+        Path(args.baseline).write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"Baseline updated: {args.baseline}")
+        return
+    if not Path(args.baseline).exists():
+        print(f"No baseline at {args.baseline}; run with --update-baseline to record one.")
+        return
+    baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+    regressions = compare_to_baseline(results, baseline, args.tolerance)
+    if regressions:
+        print("Regressions against baseline:")
+        for r in regressions:
+            print(" -", r)
+        sys.exit(1)
+    print("No regressions against baseline.")
+
+
+if __name__ == "__main__":
+    main()
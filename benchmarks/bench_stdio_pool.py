@@ -0,0 +1,100 @@
+"""
+Calls/sec through the stdio worker pool vs spawning a server per run.
+
+- spawn: every run starts `python -m mcp_demo.server`, initializes, makes
+  --calls-per-run calls and exits (what mcp_demo/client.py does);
+- pool: one StdioServerPool (--pool-size warm workers) serves the same calls.
+Both issue --runs runs with --concurrency runs in flight. Uses the echo/add
+tools only, so no Gemini key is needed.
+
+Run from the repo root:
+    python -m benchmarks.bench_stdio_pool --runs 40 --concurrency 1,8 --pool-size 4
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List
+
+from mcp.client.session import ClientSession
+from mcp.client.stdio import stdio_client
+
+from mcp_demo.pool import StdioServerPool, demo_server_params
+
+
+async def _calls(call: Callable[[str, Dict[str, Any]], Awaitable[Any]], n: int, i: int) -> None:
+    for k in range(n):
+        if k % 2:
+            await call("add", {"a": i, "b": k})
+        else:
+            await call("echo", {"text": f"run {i} call {k}"})
+
+
+async def _spawn_run(i: int, calls_per_run: int) -> None:
+    async with stdio_client(demo_server_params()) as (read, write):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+            await _calls(session.call_tool, calls_per_run, i)
+
+
+async def _measure(run: Callable[[int], Awaitable[None]], runs: int, concurrency: int, calls_per_run: int) -> Dict[str, Any]:
+    sem = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+
+    async def _one(i: int) -> None:
+        async with sem:
+            started = time.perf_counter()
+            await run(i)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(_one(i) for i in range(runs)))
+    wall = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "wall_s": round(wall, 4),
+        "calls_per_s": round(runs * calls_per_run / wall, 2) if wall else 0.0,
+        "run_p50_s": round(latencies[len(latencies) // 2], 4),
+        "run_p95_s": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 4),
+    }
+
+
+async def _run(args: argparse.Namespace) -> Dict[str, Any]:
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+    results: Dict[str, Any] = {"spawn": {}, "pool": {}}
+    for c in levels:
+        stats = await _measure(lambda i: _spawn_run(i, args.calls_per_run), args.runs, c, args.calls_per_run)
+        results["spawn"][str(c)] = stats
+        print(f"spawn c={c:<3d} calls/s={stats['calls_per_s']:.1f} p50={stats['run_p50_s']:.3f}s")
+
+    started = time.perf_counter()
+    async with StdioServerPool(demo_server_params(), size=args.pool_size) as pool:
+        results["pool_startup_s"] = round(time.perf_counter() - started, 3)
+        for c in levels:
+            stats = await _measure(lambda i: _calls(pool.call_tool, args.calls_per_run, i), args.runs, c, args.calls_per_run)
+            results["pool"][str(c)] = stats
+            print(f"pool  c={c:<3d} calls/s={stats['calls_per_s']:.1f} p50={stats['run_p50_s']:.3f}s")
+        results["pool_stats"] = pool.stats()
+    for c in levels:
+        spawn, pooled = results["spawn"][str(c)]["calls_per_s"], results["pool"][str(c)]["calls_per_s"]
+        print(f"c={c}: pool is {pooled / spawn:.1f}x spawn-per-run" if spawn else f"c={c}: n/a")
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="stdio worker pool vs spawn-per-run benchmark")
+    parser.add_argument("--runs", type=int, default=40, help="Client runs per concurrency level")
+    parser.add_argument("--calls-per-run", type=int, default=2, help="Tool calls per run (client.py makes 2)")
+    parser.add_argument("--concurrency", type=str, default="1,8", help="Comma-separated concurrency levels")
+    parser.add_argument("--pool-size", type=int, default=4, help="Warm workers in the pool")
+    parser.add_argument("--out", type=str, default="bench_stdio_pool.json", help="Where to write the results JSON")
+    args = parser.parse_args()
+    results = asyncio.run(_run(args))
+    Path(args.out).write_text(json.dumps(results, indent=2), encoding="utf-8")
+    print(f"Results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
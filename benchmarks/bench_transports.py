@@ -0,0 +1,273 @@
+"""
+Transport cost of the mcpconcepts servers: streamable HTTP vs stdio.
+
+Sweeps, per transport and server:
+- client concurrency (--concurrency);
+- payload size for text_server.reverse (--payload-sizes, 10 B .. 10 MB);
+- session reuse (one session for all calls) vs reconnect (a new session per
+  call; over stdio that is a new server process per call).
+Workloads: math_server.multiply, text_server.reverse, and reading
+simple_resources_server's res://hello.txt and res://time.json.
+
+Each cell reports calls/sec, p50/p99 latency, and the server's CPU time, CPU %
+and RSS/peak RSS. Server metrics come from /proc on Linux and from psutil
+elsewhere (when installed); they are omitted for stdio reconnect runs, where every call
+has its own short-lived process. Results go to a JSON file (--out).
+
+Run from the repo root:
+    python -m benchmarks.bench_transports --transports http,stdio --concurrency 1,8,32
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from fastmcp import Client
+from fastmcp.client.transports import StdioTransport
+
+try:
+    import psutil  # type: ignore
+except ImportError:  # pragma: no cover - optional outside Linux
+    psutil = None  # type: ignore
+
+_PROC = Path("/proc/self/status").exists()
+
+ROOT = Path(__file__).resolve().parent.parent
+SERVERS = {
+    "math": "mcpconcepts.math_server",
+    "text": "mcpconcepts.text_server",
+    "resources": "mcpconcepts.simple_resources_server",
+}
+
+
+# ---- server process metrics ----
+def _children() -> Set[int]:
+    if not _PROC and psutil is not None:
+        return {p.pid for p in psutil.Process().children(recursive=True)}
+    me, out = os.getpid(), set()
+    for entry in Path("/proc").iterdir():
+        if entry.name.isdigit():
+            try:
+                stat = (entry / "stat").read_text()
+            except OSError:
+                continue
+            if int(stat.rsplit(")", 1)[1].split()[1]) == me:
+                out.add(int(entry.name))
+    return out
+
+
+def _usage(pid: Optional[int]) -> Dict[str, float]:
+    """CPU seconds, RSS and peak RSS (MB) of a process; empty when unavailable."""
+    if pid is None:
+        return {}
+    try:
+        if not _PROC:
+            if psutil is None:
+                return {}
+            proc = psutil.Process(pid)
+            cpu = proc.cpu_times()
+            mem = proc.memory_info()
+            peak = getattr(mem, "peak_wset", None) or getattr(mem, "rss", 0)
+            return {"cpu_s": cpu.user + cpu.system, "rss_mb": mem.rss / 1e6, "peak_rss_mb": peak / 1e6}
+        fields = Path(f"/proc/{pid}/stat").read_text().rsplit(")", 1)[1].split()
+        ticks = os.sysconf("SC_CLK_TCK")
+        status = dict(
+            line.split(":", 1) for line in Path(f"/proc/{pid}/status").read_text().splitlines() if ":" in line
+        )
+        kb = lambda key: float(status.get(key, "0 kB").split()[0])
+        return {
+            "cpu_s": (int(fields[11]) + int(fields[12])) / ticks,
+            "rss_mb": kb("VmRSS") / 1e3,
+            "peak_rss_mb": kb("VmHWM") / 1e3,
+        }
+    except Exception:
+        return {}
+
+
+# ---- servers ----
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class HttpServer:
+    def __init__(self, module: str):
+        self.port = _free_port()
+        self.url = f"http://127.0.0.1:{self.port}/mcp"
+        self.proc = subprocess.Popen(
+            [sys.executable, "-m", module, "--transport", "http", "--port", str(self.port)],
+            cwd=str(ROOT), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        self.pid: Optional[int] = self.proc.pid
+
+    def wait_ready(self, timeout: float = 30.0) -> None:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.proc.poll() is not None:
+                raise RuntimeError(f"server exited with {self.proc.returncode}")
+            try:
+                with socket.create_connection(("127.0.0.1", self.port), timeout=0.5):
+                    return
+            except OSError:
+                time.sleep(0.1)
+        raise TimeoutError(f"server on port {self.port} did not start")
+
+    def client(self) -> Client:
+        return Client(self.url)
+
+    def stop(self) -> None:
+        self.proc.terminate()
+        try:
+            self.proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+
+
+def _stdio_client(module: str) -> Client:
+    return Client(StdioTransport(command=sys.executable, args=["-m", module, "--transport", "stdio"], cwd=str(ROOT)))
+
+
+# ---- workloads ----
+def _workloads(server: str, payload_sizes: List[int]) -> List[Dict[str, Any]]:
+    if server == "math":
+        return [{"name": "multiply", "bytes": 0, "call": lambda c: c.call_tool("multiply", {"a": 6, "b": 7})}]
+    if server == "text":
+        return [
+            {"name": "reverse", "bytes": n, "call": (lambda text: lambda c: c.call_tool("reverse", {"text": text}))("x" * n)}
+            for n in payload_sizes
+        ]
+    return [
+        {"name": "read hello.txt", "bytes": 0, "call": lambda c: c.read_resource("res://hello.txt")},
+        {"name": "read time.json", "bytes": 0, "call": lambda c: c.read_resource("res://time.json")},
+    ]
+
+
+def _calls_for(payload: int, args: argparse.Namespace, reconnect: bool) -> int:
+    calls = args.reconnect_calls if reconnect else args.calls
+    if payload:
+        calls = min(calls, max(args.min_calls, args.max_bytes // payload))
+    return calls
+
+
+async def _run_cell(
+    call: Callable[[Client], Awaitable[Any]],
+    make_client: Callable[[], Client],
+    shared: Optional[Client],
+    calls: int,
+    concurrency: int,
+) -> Dict[str, Any]:
+    sem = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+
+    async def one() -> None:
+        async with sem:
+            started = time.perf_counter()
+            if shared is not None:
+                await call(shared)
+            else:
+                async with make_client() as client:
+                    await call(client)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(calls)))
+    wall = time.perf_counter() - started
+    latencies.sort()
+    pct = lambda q: round(latencies[min(len(latencies) - 1, int(len(latencies) * q))] * 1000, 3)
+    return {"calls": calls, "wall_s": round(wall, 4), "calls_per_s": round(calls / wall, 2) if wall else 0.0,
+            "p50_ms": pct(0.50), "p99_ms": pct(0.99)}
+
+
+async def _bench_server(transport: str, server: str, args: argparse.Namespace, rows: List[Dict[str, Any]]) -> None:
+    module = SERVERS[server]
+    http = HttpServer(module) if transport == "http" else None
+    try:
+        if http is not None:
+            http.wait_ready()
+        make_client = http.client if http is not None else (lambda: _stdio_client(module))
+        levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+        sizes = [int(s) for s in args.payload_sizes.split(",") if s.strip()]
+
+        for session in args.sessions.split(","):
+            reconnect = session == "reconnect"
+            before = _children()
+            shared = None if reconnect else make_client()
+            if shared is not None:
+                await shared.__aenter__()
+            try:
+                pid = http.pid if http is not None else (None if reconnect else next(iter(_children() - before), None))
+                for work in _workloads(server, sizes):
+                    if shared is not None:
+                        await work["call"](shared)  # warm-up
+                    for c in levels:
+                        calls = _calls_for(work["bytes"], args, reconnect)
+                        u0 = _usage(pid)
+                        cell = await _run_cell(work["call"], make_client, shared, calls, c)
+                        u1 = _usage(pid)
+                        row = {"transport": transport, "server": server, "workload": work["name"],
+                               "payload_bytes": work["bytes"], "concurrency": c, "session": session, **cell}
+                        if u0 and u1:
+                            cpu = u1["cpu_s"] - u0["cpu_s"]
+                            row.update(server_cpu_s=round(cpu, 4),
+                                       server_cpu_pct=round(100 * cpu / cell["wall_s"], 1) if cell["wall_s"] else 0.0,
+                                       server_rss_mb=round(u1["rss_mb"], 2), server_peak_rss_mb=round(u1["peak_rss_mb"], 2))
+                        rows.append(row)
+                        print(f"{transport:5s} {server:9s} {work['name']:15s} {work['bytes']:>9d}B c={c:<3d} {session:9s} "
+                              f"{cell['calls_per_s']:>9.1f} calls/s p50={cell['p50_ms']:.2f}ms p99={cell['p99_ms']:.2f}ms "
+                              f"cpu={row.get('server_cpu_pct', '-')}% rss={row.get('server_rss_mb', '-')}MB")
+            finally:
+                if shared is not None:
+                    await shared.__aexit__(None, None, None)
+    finally:
+        if http is not None:
+            http.stop()
+
+
+async def _run(args: argparse.Namespace) -> Dict[str, Any]:
+    rows: List[Dict[str, Any]] = []
+    for transport in args.transports.split(","):
+        for server in args.servers.split(","):
+            await _bench_server(transport.strip(), server.strip(), args, rows)
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "server_metrics": "/proc" if _PROC else ("psutil" if psutil is not None else "none"),
+            "args": vars(args),
+        },
+        "results": rows,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="MCP transport benchmark for the mcpconcepts servers")
+    parser.add_argument("--transports", type=str, default="http,stdio", help="Comma-separated: http,stdio")
+    parser.add_argument("--servers", type=str, default="math,text,resources", help="Comma-separated: math,text,resources")
+    parser.add_argument("--concurrency", type=str, default="1,8,32", help="Comma-separated client concurrency levels")
+    parser.add_argument("--payload-sizes", type=str, default="10,1000,100000,10000000", help="reverse() payload sizes (bytes)")
+    parser.add_argument("--sessions", type=str, default="reuse,reconnect", help="Comma-separated: reuse,reconnect")
+    parser.add_argument("--calls", type=int, default=500, help="Calls per cell with session reuse")
+    parser.add_argument("--reconnect-calls", type=int, default=30, help="Calls per cell when reconnecting per call")
+    parser.add_argument("--min-calls", type=int, default=5, help="Lower bound on calls for large payloads")
+    parser.add_argument("--max-bytes", type=int, default=200_000_000, help="Payload byte budget per cell")
+    parser.add_argument("--out", type=str, default="bench_transports.json", help="Where to write the results JSON")
+    args = parser.parse_args()
+    results = asyncio.run(_run(args))
+    Path(args.out).write_text(json.dumps(results, indent=2), encoding="utf-8")
+    print(f"Results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
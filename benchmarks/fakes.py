@@ -0,0 +1,273 @@
+"""
+Local stand-ins for the external services the pipelines depend on.
+
+- FixtureWebServer: threaded HTTP server serving recorded (or generated) pages
+  with configurable per-request latency.
+- FakeDDGS: drop-in for duckduckgo_search.DDGS that returns fixture URLs.
+- FakeGenAI: drop-in for the google.generativeai module with deterministic
+  output, configurable first-token/per-token latency and an RPM limit.
+- build_fake_deepwiki: in-process FastMCP server exposing the DeepWiki tools.
+"""
+
+import hashlib
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+
+_WORDS = (
+    "model context protocol server client tool resource prompt agent transport stdio http "
+    "session capability schema request response streaming latency token budget cache index "
+    "retrieval grounding evidence summary report citation source gateway quota throughput"
+).split()
+
+
+def _words(seed: str, n: int) -> str:
+    h = hashlib.sha256(seed.encode("utf-8")).digest()
+    out = []
+    for i in range(n):
+        out.append(_WORDS[(h[i % len(h)] + i * 7) % len(_WORDS)])
+    return " ".join(out)
+
+
+def generate_page(slug: str, size_bytes: int = 20_000) -> str:
+    """Deterministic HTML page of roughly size_bytes."""
+    paras = []
+    total = 0
+    i = 0
+    while total < size_bytes:
+        p = f"<p>{_words(f'{slug}:{i}', 60)}.</p>"
+        paras.append(p)
+        total += len(p)
+        i += 1
+    return (
+        f"<html><head><title>{slug.replace('-', ' ').title()}</title>"
+        "<script>var tracking = 1;</script><style>body{}</style></head>"
+        f"<body><h1>{slug}</h1>{''.join(paras)}</body></html>"
+    )
+
+
+class FixtureWebServer:
+    """Serve recorded pages from a directory (or generated ones) on 127.0.0.1."""
+
+    def __init__(self, pages_dir: Optional[str] = None, latency: float = 0.0, n_pages: int = 20, page_bytes: int = 20_000):
+        self.latency = latency
+        self.pages: Dict[str, bytes] = {}
+        if pages_dir and Path(pages_dir).is_dir():
+            for f in sorted(Path(pages_dir).glob("*.html")):
+                self.pages[f.stem] = f.read_bytes()
+        if not self.pages:
+            for i in range(n_pages):
+                slug = f"page-{i}"
+                self.pages[slug] = generate_page(slug, page_bytes).encode("utf-8")
+        self.requests = 0
+        self._httpd: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        assert self._httpd is not None, "server not started"
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def urls(self) -> List[str]:
+        return [f"{self.base_url}/{slug}" for slug in self.pages]
+
+    def start(self) -> "FixtureWebServer":
+        fixture = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self):  # noqa: N802 (http.server API)
+                fixture.requests += 1
+                if fixture.latency:
+                    time.sleep(fixture.latency)
+                body = fixture.pages.get(self.path.strip("/").split("?")[0])
+                if body is None:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+
+def make_fake_ddgs(urls: List[str], latency: float = 0.0):
+    """Return a DDGS-compatible class whose results point at the given URLs."""
+
+    class FakeDDGS:
+        calls = 0
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def text(self, query: str, max_results: int = 5, **_: Any) -> Iterator[Dict[str, Any]]:
+            FakeDDGS.calls += 1
+            if latency:
+                time.sleep(latency)
+            # Deterministic query-dependent ordering
+            start = int(hashlib.sha256(query.encode("utf-8")).hexdigest(), 16) % max(1, len(urls))
+            for i in range(min(max_results, len(urls))):
+                url = urls[(start + i) % len(urls)]
+                yield {"title": f"Result {i + 1} for {query}", "href": url, "body": _words(url, 25)}
+
+    return FakeDDGS
+
+
+class FakeQuotaError(Exception):
+    """Mimics google.api_core.exceptions.ResourceExhausted (HTTP 429)."""
+
+    code = 429
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"429 Resource has been exhausted (e.g. check quota). Please retry in {retry_after:.1f}s.")
+        self.retry_after = retry_after
+
+
+class _FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeGenAI:
+    """
+    Deterministic stand-in for the google.generativeai module.
+    - first_token_latency / token_latency: simulated generation time.
+    - rpm: requests per minute before FakeQuotaError is raised (0 = unlimited).
+    - model_latency: optional per-model multipliers (e.g. a slow "pro" model).
+    """
+
+    def __init__(
+        self,
+        first_token_latency: float = 0.05,
+        token_latency: float = 0.001,
+        output_tokens: int = 300,
+        rpm: int = 0,
+        model_latency: Optional[Dict[str, float]] = None,
+        on_call: Optional[Callable[[str, float], None]] = None,
+    ):
+        self.first_token_latency = first_token_latency
+        self.token_latency = token_latency
+        self.output_tokens = output_tokens
+        self.rpm = rpm
+        self.model_latency = model_latency or {}
+        self.on_call = on_call
+        self.calls = 0
+        self.throttled = 0
+        self._window: deque = deque()
+        self._lock = threading.Lock()
+        fake = self
+
+        class GenerativeModel:
+            def __init__(self, model_name: str, system_instruction: Optional[str] = None, **_: Any):
+                self.model_name = model_name
+                self.system_instruction = system_instruction or ""
+
+            def generate_content(self, prompt: Any, stream: bool = False, **_: Any):
+                return fake._generate(self.model_name, self.system_instruction, str(prompt), stream)
+
+        self.GenerativeModel = GenerativeModel
+
+    def configure(self, **_: Any) -> None:
+        pass
+
+    def _admit(self) -> None:
+        if not self.rpm:
+            return
+        with self._lock:
+            now = time.monotonic()
+            while self._window and now - self._window[0] > 60:
+                self._window.popleft()
+            if len(self._window) >= self.rpm:
+                self.throttled += 1
+                raise FakeQuotaError(60 - (now - self._window[0]))
+            self._window.append(now)
+
+    def _reply(self, system_instruction: str, prompt: str) -> str:
+        # SimpleAgent's routing prompt expects a JSON action
+        if "Decide which tool is needed" in system_instruction and "Write a concise paragraph" not in prompt:
+            query = prompt.strip().splitlines()[-1][:80].replace('"', "'")
+            return '{"action": "search_web", "args": {"query": "%s"}}' % query
+        body = _words(prompt[-2000:], self.output_tokens)
+        return f"# Report\n\n## Overview\n\n{body}\n\n## Sources\n\n- [1] fixture\n"
+
+    def _generate(self, model_name: str, system_instruction: str, prompt: str, stream: bool):
+        self._admit()
+        self.calls += 1
+        scale = self.model_latency.get(model_name, 1.0)
+        text = self._reply(system_instruction, prompt)
+        n_tokens = max(1, len(text) // 4)
+        if not stream:
+            started = time.perf_counter()
+            time.sleep((self.first_token_latency + n_tokens * self.token_latency) * scale)
+            if self.on_call:
+                self.on_call(model_name, time.perf_counter() - started)
+            return _FakeResponse(text)
+
+        def _chunks():
+            started = time.perf_counter()
+            time.sleep(self.first_token_latency * scale)
+            step = 64
+            for i in range(0, len(text), step):
+                time.sleep(step // 4 * self.token_latency * scale)
+                yield _FakeResponse(text[i:i + step])
+            if self.on_call:
+                self.on_call(model_name, time.perf_counter() - started)
+
+        return _chunks()
+
+
+def build_fake_deepwiki(latency: Optional[Dict[str, float]] = None, toc_entries: int = 200):
+    """In-process FastMCP server exposing read_wiki_structure/read_wiki_contents/ask_question."""
+    from fastmcp import FastMCP
+    import asyncio
+
+    latency = latency or {}
+    server = FastMCP("Fake DeepWiki")
+    toc_lines = []
+    for i in range(toc_entries):
+        toc_lines.append(f"- {i + 1} {_words(f'toc:{i}', 3).title()}")
+        toc_lines.append(f"  - {i + 1}.1 {_words(f'toc:{i}:1', 4).title()}")
+    toc = "\n".join(toc_lines)
+
+    @server.tool(name="read_wiki_structure")
+    async def read_wiki_structure(repoName: str = "", repo: str = "") -> str:
+        await asyncio.sleep(latency.get("read_wiki_structure", 0.0))
+        return f"Available pages for {repoName or repo}:\n\n{toc}"
+
+    @server.tool(name="read_wiki_contents")
+    async def read_wiki_contents(repoName: str = "", repo: str = "", topicName: str = "", topic: str = "") -> str:
+        await asyncio.sleep(latency.get("read_wiki_contents", 0.0))
+        name = topicName or topic
+        sections = [f"## {name} part {i}\n\n{_words(f'{name}:{i}', 120)}" for i in range(20)]
+        return f"# {name}\n\n" + "\n\n".join(sections)
+
+    @server.tool(name="ask_question")
+    async def ask_question(repoName: str = "", repo: str = "", question: str = "", questionText: str = "") -> str:
+        await asyncio.sleep(latency.get("ask_question", 0.0))
+        q = question or questionText
+        return f"{_words(q, 150)}."
+
+    return server
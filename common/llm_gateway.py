@@ -0,0 +1,573 @@
+"""
+Shared, quota-aware gateway for Gemini calls.
+
+Every module that talks to Gemini goes through get_gateway().generate() so the
+process shares one view of the quota:
+- token buckets for requests/minute and tokens/minute, with adaptive
+  slow-down after 429s (halve the rate, recover gradually on success);
+- retries with full-jitter exponential backoff that honor server retry hints
+  ("Please retry in 13.5s", RetryInfo.retry_delay);
+- a concurrency cap whose waiters are served by priority, so interactive
+  callers overtake batch jobs;
+- optional hedging across the preferred and fallback model, with the hedge
+  delay taken from the observed first-token latency quantile and counted from
+  when the preferred model is called (not while it waits for a slot or quota);
+- optional single-flight coalescing: identical in-flight requests share one
+  upstream call;
+- configured model handles cached per (model, system instruction), and a
+  dedicated, explicitly sized thread pool for the blocking SDK calls, so a
+  burst can't starve the default executor used by asyncio.to_thread elsewhere;
+- counters for calls, retries, throttled and failed requests, hedge wins and
+  time saved (stats()).
+
+Configuration (env): GEMINI_RPM, GEMINI_TPM, GEMINI_MAX_CONCURRENCY,
+GEMINI_MAX_RETRIES, GEMINI_MAX_BACKOFF, GEMINI_HEDGE, GEMINI_HEDGE_DELAY,
+GEMINI_HEDGE_QUANTILE, GEMINI_THREADS.
+"""
+
+import asyncio
+import contextvars
+import heapq
+import itertools
+import os
+import random
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+import google.generativeai as genai
+
+from common import tracing
+
+DEFAULT_MODEL = "gemini-1.5-flash"
+PRIORITIES = {"interactive": 0, "batch": 1}
+
+
+class LLMUnavailableError(RuntimeError):
+    """Raised when a generation fails after retries (quota, outage, bad request, missing key)."""
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4) if text else 0
+
+
+class TokenBucket:
+    """Continuous-refill bucket; capacity is the per-minute budget."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.scale = 1.0  # adaptive multiplier on the refill rate
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        rate = self.capacity * self.scale / 60.0
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * rate)
+        self._updated = now
+
+    async def acquire(self, amount: float) -> float:
+        """Wait until amount tokens are available; returns seconds waited."""
+        if self.capacity <= 0:
+            return 0.0
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            self._refill()
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return waited
+            delay = (amount - self.tokens) / (self.capacity * self.scale / 60.0)
+            await asyncio.sleep(delay)
+            waited += delay
+
+    def drain(self) -> None:
+        """Empty the bucket (used when the server says we are over quota)."""
+        self._refill()
+        self.tokens = 0.0
+
+
+class _PrioritySlots:
+    """Concurrency cap whose waiters are woken in (priority, arrival) order."""
+
+    def __init__(self, limit: int):
+        self.limit = max(1, limit)
+        self.in_use = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+
+    async def acquire(self, priority: int) -> None:
+        if self.in_use < self.limit and not self._waiters:
+            self.in_use += 1
+            return
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), fut))
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # The slot was handed to us just before cancellation: pass it on
+                self.release()
+            raise
+
+    def release(self) -> None:
+        while self._waiters:
+            _, _, fut = heapq.heappop(self._waiters)
+            if not fut.done():
+                fut.set_result(None)  # hand the slot over directly
+                return
+        self.in_use -= 1
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for _, _, f in self._waiters if not f.done())
+
+
+_RETRY_IN = re.compile(r"retry in ([0-9.]+)\s*s", re.IGNORECASE)
+_RETRY_DELAY = re.compile(r"retry_delay\s*\{\s*seconds:\s*([0-9]+)")
+
+
+class _Flight:
+    """One shared upstream request and the number of callers still waiting on it."""
+
+    def __init__(self, task: "asyncio.Task[str]"):
+        self.task = task
+        self.waiters = 0
+
+
+def _retry_hint(exc: BaseException) -> Optional[float]:
+    """Server-suggested delay in seconds, if the error carries one."""
+    for attr in ("retry_after", "retry_delay"):
+        value = getattr(exc, attr, None)
+        if isinstance(value, (int, float)):
+            return float(value)
+        seconds = getattr(value, "total_seconds", None) or getattr(value, "seconds", None)
+        if callable(seconds):
+            return float(seconds())
+        if isinstance(seconds, (int, float)):
+            return float(seconds)
+    msg = str(exc)
+    m = _RETRY_IN.search(msg) or _RETRY_DELAY.search(msg)
+    return float(m.group(1)) if m else None
+
+
+def _classify(exc: BaseException) -> str:
+    """'throttled', 'transient' or 'fatal'."""
+    name = type(exc).__name__
+    code = getattr(exc, "code", None)
+    code = getattr(code, "value", code)
+    msg = str(exc).lower()
+    if name in ("ResourceExhausted", "TooManyRequests") or code == 429 or "resource has been exhausted" in msg or "quota" in msg:
+        return "throttled"
+    if name in ("ServiceUnavailable", "InternalServerError", "DeadlineExceeded", "GatewayTimeout", "TimeoutError") \
+            or code in (500, 502, 503, 504) or "timed out" in msg:
+        return "transient"
+    return "fatal"
+
+
+def _response_text(resp: Any) -> str:
+    try:
+        return getattr(resp, "text", "") or ""
+    except ValueError:
+        # .text raises when the candidate was blocked / has no parts
+        return ""
+
+
+class LLMGateway:
+    def __init__(
+        self,
+        rpm: int = 15,
+        tpm: int = 1_000_000,
+        max_concurrency: int = 4,
+        max_retries: int = 3,
+        base_backoff: float = 1.0,
+        max_backoff: float = 60.0,
+        hedge: bool = False,
+        hedge_initial_delay: float = 3.0,
+        hedge_quantile: float = 0.95,
+        threads: Optional[int] = None,
+    ):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.slots = _PrioritySlots(max_concurrency)
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._configured = False
+        # A slot is held until its thread returns, so threads never outnumber slots; a little headroom anyway
+        self.threads = threads or max_concurrency * 2 + 2
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._models: "OrderedDict[Tuple[str, Optional[str]], Any]" = OrderedDict()
+        self._models_lock = threading.Lock()
+        self._inflight: Dict[Tuple[Any, ...], "_Flight"] = {}
+        self.hedge_default = hedge
+        self.hedge_initial_delay = hedge_initial_delay
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_delay = 0.2
+        self.hedge_max_delay = 30.0
+        self.hedge_wins: Dict[str, int] = {}
+        self._first_token_latency: Dict[str, Deque[float]] = {}
+        self._total_latency: Dict[str, Deque[float]] = {}
+        self.counters: Dict[str, float] = {
+            "calls": 0,
+            "succeeded": 0,
+            "failed": 0,
+            "retries": 0,
+            "throttled": 0,
+            "fallbacks": 0,
+            "hedges": 0,
+            "hedge_saved_s": 0.0,
+            "rate_wait_s": 0.0,
+            "queue_wait_s": 0.0,
+            "coalesced": 0,
+        }
+
+    @classmethod
+    def from_env(cls) -> "LLMGateway":
+        return cls(
+            rpm=int(os.getenv("GEMINI_RPM", "15")),
+            tpm=int(os.getenv("GEMINI_TPM", "1000000")),
+            max_concurrency=int(os.getenv("GEMINI_MAX_CONCURRENCY", "4")),
+            max_retries=int(os.getenv("GEMINI_MAX_RETRIES", "3")),
+            max_backoff=float(os.getenv("GEMINI_MAX_BACKOFF", "60")),
+            hedge=os.getenv("GEMINI_HEDGE", "0") == "1",
+            hedge_initial_delay=float(os.getenv("GEMINI_HEDGE_DELAY", "3.0")),
+            hedge_quantile=float(os.getenv("GEMINI_HEDGE_QUANTILE", "0.95")),
+            threads=int(os.getenv("GEMINI_THREADS", "0")) or None,
+        )
+
+    def _configure(self) -> None:
+        if self._configured:
+            return
+        api_key = os.getenv("GOOGLE_API_KEY")
+        if not api_key:
+            raise LLMUnavailableError("GOOGLE_API_KEY is not set in environment/.env")
+        genai.configure(api_key=api_key)
+        self._configured = True
+
+    def _model_handle(self, model: str, system_instruction: Optional[str]) -> Any:
+        """Configured GenerativeModel for (model, system instruction), built once and reused."""
+        key = (model, system_instruction)
+        with self._models_lock:
+            mdl = self._models.get(key)
+            if mdl is None:
+                mdl = genai.GenerativeModel(model, system_instruction=system_instruction) if system_instruction \
+                    else genai.GenerativeModel(model)
+                self._models[key] = mdl
+                if len(self._models) > 32:
+                    self._models.popitem(last=False)
+            else:
+                self._models.move_to_end(key)
+            return mdl
+
+    def _run_blocking(self, fn: Callable[[], str]) -> "asyncio.Future[str]":
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="llm-gateway")
+        ctx = contextvars.copy_context()  # like asyncio.to_thread: keep the caller's trace context
+        return asyncio.get_running_loop().run_in_executor(self._executor, ctx.run, fn)
+
+    def _adapt(self, throttled: bool) -> None:
+        for bucket in (self.requests, self.tokens):
+            if throttled:
+                bucket.scale = max(0.1, bucket.scale * 0.5)
+            else:
+                bucket.scale = min(1.0, bucket.scale + 0.05)
+
+    async def _call_model(
+        self,
+        model: str,
+        prompt: str,
+        system_instruction: Optional[str],
+        on_first_token: Optional[Callable[[], None]] = None,
+        cancel: Optional[threading.Event] = None,
+        running: Optional[List["asyncio.Future[str]"]] = None,
+    ) -> str:
+        """
+        One upstream call in the gateway's thread pool. The thread can't be interrupted (a streaming call
+        stops at the next chunk once cancel is set), so a cancelled caller stops waiting but the future keeps
+        running; it is appended to running so the caller can hold its slot until the thread returns.
+        """
+        loop = asyncio.get_running_loop()
+        started = time.monotonic()
+
+        def _run_sync() -> str:
+            mdl = self._model_handle(model, system_instruction)
+            if on_first_token is None:
+                return _response_text(mdl.generate_content(prompt))
+            # Streaming lets the hedging policy see the first token and stop a losing request early
+            parts: List[str] = []
+            for chunk in mdl.generate_content(prompt, stream=True):
+                if cancel is not None and cancel.is_set():
+                    break
+                if not parts:
+                    first_token.append(time.monotonic() - started)
+                    self._record_latency(self._first_token_latency, model, first_token[0])
+                    loop.call_soon_threadsafe(on_first_token)
+                parts.append(_response_text(chunk))
+            return "".join(parts)
+
+        first_token: List[float] = []
+        fut = self._run_blocking(_run_sync)
+        if running is not None:
+            running.append(fut)
+        try:
+            text = await asyncio.shield(fut)
+        except asyncio.CancelledError:
+            # Censored samples: a cancelled call (usually a hedge loser, the slow calls hedging exists for)
+            # took at least this long. Dropping them would bias hedge_delay low and hedge ever more often.
+            elapsed = time.monotonic() - started
+            if on_first_token is not None and not first_token:
+                self._record_latency(self._first_token_latency, model, elapsed)
+            self._record_latency(self._total_latency, model, elapsed)
+            raise
+        self._record_latency(self._total_latency, model, time.monotonic() - started)
+        return text
+
+    async def _generate_once(self, model: str, prompt: str, system_instruction: Optional[str], priority: int,
+                             max_retries: int, expected_output_tokens: int,
+                             on_first_token: Optional[Callable[[], None]] = None,
+                             cancel: Optional[threading.Event] = None,
+                             on_start: Optional[Callable[[], None]] = None) -> str:
+        """on_start is called each time an attempt has its slot and rate budget and calls the model."""
+        cost = estimate_tokens(prompt) + estimate_tokens(system_instruction or "") + expected_output_tokens
+        last_exc: Optional[BaseException] = None
+        for attempt in range(max_retries + 1):
+            queued_at = time.monotonic()
+            await self.slots.acquire(priority)
+            running: List["asyncio.Future[str]"] = []
+            try:
+                self.counters["queue_wait_s"] += time.monotonic() - queued_at
+                self.counters["rate_wait_s"] += await self.requests.acquire(1)
+                self.counters["rate_wait_s"] += await self.tokens.acquire(cost)
+                self.counters["calls"] += 1
+                if on_start is not None:
+                    on_start()
+                with tracing.span("llm.generate", cat="llm", model=model, attempt=attempt, prompt_chars=len(prompt)):
+                    text = await self._call_model(model, prompt, system_instruction, on_first_token, cancel, running)
+                self._adapt(throttled=False)
+                self.counters["succeeded"] += 1
+                return text
+            except asyncio.CancelledError:
+                if cancel is not None:
+                    cancel.set()
+                raise
+            except Exception as e:
+                last_exc = e
+                kind = _classify(e)
+                if kind == "throttled":
+                    self.counters["throttled"] += 1
+                    self._adapt(throttled=True)
+                    self.requests.drain()
+                if kind == "fatal" or attempt >= max_retries:
+                    break
+            finally:
+                self._release_after(running)
+            # Full jitter backoff, but never sooner than the server asked for
+            self.counters["retries"] += 1
+            backoff = random.uniform(0, min(self.max_backoff, self.base_backoff * (2 ** attempt)))
+            hint = _retry_hint(last_exc) if last_exc is not None else None
+            await asyncio.sleep(min(self.max_backoff, max(backoff, hint or 0.0)))
+        self.counters["failed"] += 1
+        raise LLMUnavailableError(f"{model} failed: {type(last_exc).__name__}: {last_exc}") from last_exc
+
+    def _release_after(self, running: List["asyncio.Future[str]"]) -> None:
+        """Release a slot now, or when the call's thread returns if a cancelled caller left it running."""
+        thread = running[-1] if running else None
+        if thread is None or thread.done():
+            self.slots.release()
+            return
+
+        def _done(f: "asyncio.Future[str]") -> None:
+            if not f.cancelled():
+                f.exception()  # nobody awaits it any more: don't log "exception was never retrieved"
+            self.slots.release()
+
+        thread.add_done_callback(_done)
+
+    # ---- hedging ----
+    def _record_latency(self, table: Dict[str, Deque[float]], model: str, seconds: float) -> None:
+        table.setdefault(model, deque(maxlen=100)).append(seconds)
+
+    def hedge_delay(self, model: str) -> float:
+        """Delay before starting the fallback: the observed first-token quantile for this model."""
+        samples = sorted(self._first_token_latency.get(model, ()))
+        if len(samples) < 5:
+            return self.hedge_initial_delay
+        q = samples[min(len(samples) - 1, int(len(samples) * self.hedge_quantile))]
+        return min(self.hedge_max_delay, max(self.hedge_min_delay, q))
+
+    async def _generate_hedged(self, model: str, fallback_model: str, prompt: str, system_instruction: Optional[str],
+                               priority: int, max_retries: int, expected_output_tokens: int) -> str:
+        started = time.monotonic()
+        calling = asyncio.Event()
+        first_token = asyncio.Event()
+        cancels = {model: threading.Event(), fallback_model: threading.Event()}
+        primary = asyncio.create_task(self._generate_once(
+            model, prompt, system_instruction, priority, max_retries, expected_output_tokens,
+            on_first_token=first_token.set, cancel=cancels[model], on_start=calling.set,
+        ))
+        delay = self.hedge_delay(model)
+        try:
+            # The hedge clock starts when the preferred model is actually called: hedge_delay is a first-token
+            # latency, and time spent queued for a slot or rate budget would only spend more quota
+            for event, timeout in ((calling, None), (first_token, delay)):
+                waiter = asyncio.create_task(event.wait())
+                try:
+                    await asyncio.wait({primary, waiter}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    waiter.cancel()
+                if primary.done():
+                    break
+        except asyncio.CancelledError:
+            # The caller gave up (or a coalesced flight lost its last waiter): don't leave the request running
+            cancels[model].set()
+            primary.cancel()
+            raise
+        if first_token.is_set() or primary.done():
+            # Preferred model is streaming (or already finished/failed): no hedge needed
+            try:
+                return await primary
+            except LLMUnavailableError:
+                self.counters["fallbacks"] += 1
+                return await self._generate_once(fallback_model, prompt, system_instruction, priority, 0,
+                                                 expected_output_tokens)
+
+        hedge_at = time.monotonic() - started
+        self.counters["hedges"] += 1
+        secondary = asyncio.create_task(self._generate_once(
+            fallback_model, prompt, system_instruction, priority, 0, expected_output_tokens,
+            on_first_token=lambda: None, cancel=cancels[fallback_model],
+        ))
+        legs = {primary: model, secondary: fallback_model}
+        pending = set(legs)
+        primary_failed_at: Optional[float] = None
+        last_exc: Optional[BaseException] = None
+        with tracing.span("llm.hedge", cat="llm", preferred=model, fallback=fallback_model, delay_s=round(delay, 3)) as sp:
+            try:
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        if task.exception() is None:
+                            winner = legs[task]
+                            elapsed = time.monotonic() - started
+                            saved = self._hedge_saving(model, winner, hedge_at, elapsed, primary_failed_at)
+                            self.counters["hedge_saved_s"] += saved
+                            self.hedge_wins[winner] = self.hedge_wins.get(winner, 0) + 1
+                            sp.set(winner=winner, saved_s=round(saved, 3))
+                            return task.result()
+                        last_exc = task.exception()
+                        if task is primary:
+                            primary_failed_at = time.monotonic() - started
+            finally:
+                for task in pending:
+                    cancels[legs[task]].set()
+                    task.cancel()
+        raise LLMUnavailableError(f"hedged {model}/{fallback_model} failed: {last_exc}") from last_exc
+
+    def _hedge_saving(self, model: str, winner: str, hedge_at: float, elapsed: float,
+                      primary_failed_at: Optional[float]) -> float:
+        """
+        Time saved versus the old sequential policy (wait for the preferred model,
+        then start the fallback), from this hedge's own timings. Exact when the
+        preferred model failed. Otherwise it was still running at `elapsed`, so the
+        sequential policy would only have started the fallback after that: the
+        saving is the fallback's run time (elapsed - hedge_at). No completed
+        preferred-model samples are needed, and slow preferred calls seldom complete.
+        """
+        if winner == model:
+            return 0.0
+        if primary_failed_at is not None:
+            return max(0.0, primary_failed_at - hedge_at)
+        return max(0.0, elapsed - hedge_at)
+
+    async def generate(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        system_instruction: Optional[str] = None,
+        priority: str = "interactive",
+        fallback_model: Optional[str] = DEFAULT_MODEL,
+        max_retries: Optional[int] = None,
+        expected_output_tokens: int = 1024,
+        hedge: Optional[bool] = None,
+        coalesce: bool = False,
+    ) -> str:
+        """
+        Generate text with the preferred model. With hedge=True (default from
+        GEMINI_HEDGE) the fallback model is started in parallel when the preferred
+        one has not produced a first token within hedge_delay() of being called; whichever finishes
+        first wins and the other is cancelled. Without hedging the fallback is tried
+        once after the preferred model fails. With coalesce=True, callers asking for
+        the same (model, fallback, system instruction, prompt) while an identical
+        request is in flight share its result instead of paying for another call.
+        Raises LLMUnavailableError.
+        """
+        self._configure()
+        model = model or os.getenv("GEMINI_MODEL") or DEFAULT_MODEL
+        prio = PRIORITIES.get(priority, PRIORITIES["batch"])
+        retries = self.max_retries if max_retries is None else max_retries
+        hedge = self.hedge_default if hedge is None else hedge
+        run = lambda: self._generate(prompt, model, system_instruction, prio, fallback_model, retries,
+                                     expected_output_tokens, hedge)
+        if not coalesce:
+            return await run()
+
+        key = (model, fallback_model, system_instruction, prompt)
+        flight = self._inflight.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.create_task(run()))
+            self._inflight[key] = flight
+            flight.task.add_done_callback(
+                lambda t, k=key, f=flight: self._inflight.pop(k, None) if self._inflight.get(k) is f else None
+            )
+        else:
+            self.counters["coalesced"] += 1
+        flight.waiters += 1
+        try:
+            # shield: one caller giving up must not cancel the request for the others
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+
+    async def _generate(self, prompt: str, model: str, system_instruction: Optional[str], prio: int,
+                        fallback_model: Optional[str], retries: int, expected_output_tokens: int,
+                        hedge: bool) -> str:
+        if hedge and fallback_model and fallback_model != model:
+            return await self._generate_hedged(model, fallback_model, prompt, system_instruction, prio, retries,
+                                               expected_output_tokens)
+        try:
+            return await self._generate_once(model, prompt, system_instruction, prio, retries, expected_output_tokens)
+        except LLMUnavailableError:
+            if not fallback_model or fallback_model == model:
+                raise
+            self.counters["fallbacks"] += 1
+            return await self._generate_once(fallback_model, prompt, system_instruction, prio, 0, expected_output_tokens)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **{k: (round(v, 3) if isinstance(v, float) else v) for k, v in self.counters.items()},
+            "in_flight": self.slots.in_use,
+            "queued": self.slots.queued,
+            "rate_scale": round(self.requests.scale, 3),
+            "hedge_wins": dict(self.hedge_wins),
+            "hedge_delay_s": {m: round(self.hedge_delay(m), 3) for m in self._first_token_latency},
+            "in_flight_coalesced": len(self._inflight),
+            "model_handles": len(self._models),
+            "threads": self.threads,
+        }
+
+
+_GATEWAY: Optional[LLMGateway] = None
+
+
+def get_gateway() -> LLMGateway:
+    """Process-wide gateway configured from the environment."""
+    global _GATEWAY
+    if _GATEWAY is None:
+        _GATEWAY = LLMGateway.from_env()
+    return _GATEWAY
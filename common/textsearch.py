@@ -0,0 +1,48 @@
+"""Small lexical text utilities shared by the retrieval and compaction code."""
+
+import math
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Sequence
+
+_WORD = re.compile(r"[A-Za-z0-9_]+")
+
+STOPWORDS = frozenset(
+    "a an and are as at be but by can do does for from has have how i if in into is it its of on or "
+    "that the their then there these this to was what when where which who why will with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens without stopwords; identifiers are also split on '_' and camelCase."""
+    out: List[str] = []
+    for word in _WORD.findall(text):
+        parts = [word]
+        if "_" in word or any(c.isupper() for c in word[1:]):
+            pieces = [p for p in re.split(r"_|(?<=[a-z0-9])(?=[A-Z])", word) if p]
+            if len(pieces) > 1:
+                parts += pieces
+        for p in parts:
+            p = p.lower()
+            if len(p) > 1 and p not in STOPWORDS:
+                out.append(p)
+    return out
+
+
+def idf(docs: Sequence[Sequence[str]]) -> Dict[str, float]:
+    """Smoothed inverse document frequency over tokenized documents."""
+    df: Counter = Counter()
+    for d in docs:
+        df.update(set(d))
+    n = len(docs)
+    return {t: math.log(1 + (n - c + 0.5) / (c + 0.5)) for t, c in df.items()}
+
+
+def overlap_score(query_terms: Iterable[str], doc_terms: Sequence[str], weights: Dict[str, float]) -> float:
+    """Sum of query-term weights with sublinear term frequency; 0 when nothing matches."""
+    tf = Counter(doc_terms)
+    score = 0.0
+    for t in set(query_terms):
+        if tf[t]:
+            score += weights.get(t, 1.0) * (1 + math.log(tf[t]))
+    return score
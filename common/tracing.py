@@ -0,0 +1,236 @@
+"""
+Span-based tracing shared by the clients and MCP servers in this repo.
+
+- Disabled by default: span() returns a shared no-op object and inject()
+  returns None, so instrumented code pays a single global check.
+- enable(path) (or MCP_TRACE=path) records spans and writes them on exit in
+  Chrome trace format, which opens in chrome://tracing and ui.perfetto.dev.
+- Trace context crosses the client -> MCP -> server boundary as a W3C-style
+  "traceparent" entry in the MCP request metadata (call_tool() helper below,
+  tool_span() on the server side).
+
+Merge the client and server files into one timeline with:
+    python -m common.tracing merge client.json server.json -o trace.json
+"""
+
+import asyncio
+import atexit
+import contextvars
+import inspect
+import json
+import os
+import secrets
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# (trace_id, span_id) of the innermost active span in this task
+_current: contextvars.ContextVar[Optional[Tuple[str, str]]] = contextvars.ContextVar("mcp_trace_ctx", default=None)
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **_: Any) -> None:
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class Span:
+    __slots__ = ("tracer", "name", "cat", "args", "trace_id", "span_id", "parent_id", "start_us", "_token")
+
+    def __init__(self, tracer: "Tracer", name: str, cat: str, args: Dict[str, Any], parent: Optional[Tuple[str, str]]):
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.args = args
+        self.trace_id = parent[0] if parent else secrets.token_hex(16)
+        self.parent_id = parent[1] if parent else None
+        self.span_id = secrets.token_hex(8)
+        self.start_us = 0
+        self._token = None
+
+    def set(self, **args: Any) -> None:
+        self.args.update(args)
+
+    def __enter__(self):
+        self.start_us = time.time_ns() // 1000
+        self._token = _current.set((self.trace_id, self.span_id))
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end_us = time.time_ns() // 1000
+        if self._token is not None:
+            _current.reset(self._token)
+        if exc_type is not None:
+            self.args["error"] = f"{exc_type.__name__}: {exc}"
+        self.tracer.record(self, end_us)
+        return False
+
+
+class Tracer:
+    def __init__(self, path: str, process_name: str):
+        self.path = path
+        self.process_name = process_name
+        self.pid = os.getpid()
+        self._events: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._tids: Dict[int, int] = {}
+
+    def _tid(self) -> int:
+        # One lane per asyncio task (or thread) so concurrent spans don't interleave
+        try:
+            key = id(asyncio.current_task())
+        except RuntimeError:
+            key = threading.get_ident()
+        with self._lock:
+            return self._tids.setdefault(key, len(self._tids) + 1)
+
+    def record(self, span: Span, end_us: int) -> None:
+        event = {
+            "name": span.name,
+            "cat": span.cat,
+            "ph": "X",
+            "ts": span.start_us,
+            "dur": max(0, end_us - span.start_us),
+            "pid": self.pid,
+            "tid": self._tid(),
+            "args": {"trace_id": span.trace_id, "span_id": span.span_id, "parent_id": span.parent_id, **span.args},
+        }
+        with self._lock:
+            self._events.append(event)
+
+    def flush(self) -> None:
+        meta = {"name": "process_name", "ph": "M", "pid": self.pid, "tid": 0, "args": {"name": self.process_name}}
+        with self._lock:
+            events = [meta] + list(self._events)
+        Path(self.path).write_text(json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}), encoding="utf-8")
+
+
+_TRACER: Optional[Tracer] = None
+
+
+def enable(path: str, process_name: Optional[str] = None) -> None:
+    """Start recording spans; they are written to path at interpreter exit (and on flush())."""
+    global _TRACER
+    _TRACER = Tracer(path, process_name or Path(sys.argv[0]).stem or "python")
+    atexit.register(flush)
+
+
+def enable_from_env(process_name: Optional[str] = None) -> None:
+    path = os.getenv("MCP_TRACE")
+    if path and _TRACER is None:
+        enable(path, process_name)
+
+
+def enabled() -> bool:
+    return _TRACER is not None
+
+
+def flush() -> None:
+    if _TRACER is not None:
+        _TRACER.flush()
+
+
+def span(name: str, cat: str = "app", **args: Any):
+    """Context manager timing a block; a shared no-op when tracing is off."""
+    if _TRACER is None:
+        return _NOOP
+    return Span(_TRACER, name, cat, args, _current.get())
+
+
+# ---- context propagation ----
+def inject() -> Optional[Dict[str, str]]:
+    """Trace context to attach to an outgoing MCP request (None when disabled)."""
+    if _TRACER is None:
+        return None
+    ctx = _current.get()
+    if ctx is None:
+        return None
+    return {"traceparent": f"00-{ctx[0]}-{ctx[1]}-01"}
+
+
+def _parse_traceparent(value: Any) -> Optional[Tuple[str, str]]:
+    if not isinstance(value, str):
+        return None
+    parts = value.split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    return parts[1], parts[2]
+
+
+_CALL_TOOL_HAS_META: Optional[bool] = None
+
+
+async def call_tool(client: Any, name: str, arguments: Dict[str, Any], **kwargs: Any) -> Any:
+    """client.call_tool() wrapped in a span, with the trace context sent as request metadata."""
+    global _CALL_TOOL_HAS_META
+    if _TRACER is None:
+        return await client.call_tool(name, arguments, **kwargs)
+    with span(f"mcp.call_tool {name}", cat="mcp", tool=name):
+        meta = inject()
+        if _CALL_TOOL_HAS_META is None:
+            try:
+                _CALL_TOOL_HAS_META = "meta" in inspect.signature(client.call_tool).parameters
+            except (TypeError, ValueError):
+                _CALL_TOOL_HAS_META = False
+        if meta and _CALL_TOOL_HAS_META:
+            kwargs["meta"] = meta
+        return await client.call_tool(name, arguments, **kwargs)
+
+
+def _request_parent() -> Optional[Tuple[str, str]]:
+    """Read the caller's traceparent from the current FastMCP request, if any."""
+    try:
+        from fastmcp.server.dependencies import get_context
+
+        meta = get_context().request_context.meta
+    except Exception:
+        return None
+    if meta is None:
+        return None
+    value = getattr(meta, "traceparent", None)
+    if value is None:
+        extra = getattr(meta, "model_extra", None) or {}
+        value = extra.get("traceparent")
+    return _parse_traceparent(value)
+
+
+def tool_span(name: str, **args: Any):
+    """Server-side span for an MCP tool call, parented to the client's span when available."""
+    if _TRACER is None:
+        return _NOOP
+    parent = _request_parent() or _current.get()
+    return Span(_TRACER, name, "server", args, parent)
+
+
+# ---- CLI: merge trace files from several processes ----
+def merge(paths: List[str], out: str) -> int:
+    events: List[Dict[str, Any]] = []
+    for p in paths:
+        events.extend(json.loads(Path(p).read_text(encoding="utf-8")).get("traceEvents", []))
+    Path(out).write_text(json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}), encoding="utf-8")
+    return len(events)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Trace file utilities")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    m = sub.add_parser("merge", help="Merge Chrome-trace files from client and server processes")
+    m.add_argument("files", nargs="+")
+    m.add_argument("-o", "--out", required=True)
+    a = parser.parse_args()
+    n = merge(a.files, a.out)
+    print(f"Wrote {n} events to {a.out}")
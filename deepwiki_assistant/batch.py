@@ -0,0 +1,219 @@
+"""
+Batch mode for the DeepWiki assistant.
+
+Reads a JSONL or YAML file of items ({"repo", "question", "topic"?, "id"?,
+"server_url"?}) and answers them all:
+- one MCP session per DeepWiki server, shared by every item for that server;
+- each repo's TOC (and each repo/topic page) is fetched once per run, through
+  the wiki cache when one is given;
+- ask_question calls and Gemini calls have separate concurrency limits;
+- each answer goes to its own Markdown file, plus an index.md summary;
+- progress is appended to state.jsonl, so a restarted run skips finished items.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastmcp import Client as MCPClient
+
+from common import tracing
+from deepwiki_assistant.cache import WikiCache
+from deepwiki_assistant.client import (
+    DEFAULT_DEEPWIKI_URL,
+    _build_prompt,
+    _call_text,
+    _explain,
+    _parse_page,
+    _parse_toc,
+)
+
+STATE_FILE = "state.jsonl"
+INDEX_FILE = "index.md"
+
+
+@dataclass
+class BatchItem:
+    id: str
+    repo: str
+    question: str
+    topic: Optional[str] = None
+    server_url: str = DEFAULT_DEEPWIKI_URL
+
+    @property
+    def filename(self) -> str:
+        slug = re.sub(r"[^A-Za-z0-9]+", "-", self.repo).strip("-").lower()
+        return f"{slug}-{self.id}.md"
+
+
+def load_items(path: str, default_server_url: str = DEFAULT_DEEPWIKI_URL) -> List[BatchItem]:
+    """Load batch items from .jsonl/.json (one object per line) or .yaml/.yml (a list of objects)."""
+    text = Path(path).read_text(encoding="utf-8")
+    if path.endswith((".yaml", ".yml")):
+        try:
+            import yaml  # type: ignore
+        except ImportError as e:  # pragma: no cover
+            raise SystemExit("PyYAML is required for YAML batch files (pip install pyyaml).") from e
+        raw = yaml.safe_load(text) or []
+        if isinstance(raw, dict):
+            raw = raw.get("items", [])
+    else:
+        raw = [json.loads(line) for line in text.splitlines() if line.strip() and not line.lstrip().startswith("#")]
+
+    items: List[BatchItem] = []
+    for n, obj in enumerate(raw, 1):
+        repo = (obj.get("repo") or "").strip()
+        question = (obj.get("question") or "").strip()
+        if not repo or not question:
+            raise SystemExit(f"Batch item {n} needs both 'repo' and 'question'.")
+        topic = obj.get("topic") or None
+        item_id = str(obj.get("id") or hashlib.sha1(f"{repo}|{question}|{topic or ''}".encode("utf-8")).hexdigest()[:12])
+        items.append(BatchItem(item_id, repo, question, topic, obj.get("server_url") or default_server_url))
+    return items
+
+
+def _load_state(out_dir: Path) -> Dict[str, Dict[str, Any]]:
+    state: Dict[str, Dict[str, Any]] = {}
+    path = out_dir / STATE_FILE
+    if path.exists():
+        for line in path.read_text(encoding="utf-8").splitlines():
+            try:
+                rec = json.loads(line)
+            except Exception:
+                continue  # torn last line after a crash
+            state[rec["id"]] = rec
+    return state
+
+
+def _append_state(out_dir: Path, record: Dict[str, Any]) -> None:
+    with open(out_dir / STATE_FILE, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _write_atomic(path: Path, text: str) -> None:
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _write_index(out_dir: Path, items: List[BatchItem], state: Dict[str, Dict[str, Any]]) -> None:
+    lines = ["# DeepWiki batch answers", "", "| # | Repo | Question | Topic | Status | Answer |", "|---|---|---|---|---|---|"]
+    for n, item in enumerate(items, 1):
+        rec = state.get(item.id, {})
+        status = rec.get("status", "pending")
+        link = f"[{item.filename}]({item.filename})" if status == "ok" else (rec.get("error") or "")
+        question = item.question.replace("|", "\\|")
+        lines.append(f"| {n} | `{item.repo}` | {question} | {item.topic or ''} | {status} | {link} |")
+    _write_atomic(out_dir / INDEX_FILE, "\n".join(lines) + "\n")
+
+
+class _ServerRun:
+    """Shared state for all items that talk to one DeepWiki server."""
+
+    def __init__(self, server_url: str, client: MCPClient, cache: Optional[WikiCache], refresh: bool):
+        self.server_url = server_url
+        self.client = client
+        self.cache = cache
+        self.refresh = refresh
+        self._once: Dict[Tuple[str, str, str], asyncio.Task] = {}
+
+    def _read(self, repo: str, kind: str, name: str, args: Dict[str, Any], key: str = "") -> "asyncio.Task":
+        # One fetch per (repo, kind, topic) per run, no matter how many items need it
+        k = (repo, kind, key)
+        if k not in self._once:
+            fetch = lambda: _call_text(self.client, name, args)
+            coro = fetch() if self.cache is None else self.cache.get_or_fetch(
+                self.server_url, repo, kind, key, fetch, refresh=self.refresh
+            )
+            self._once[k] = asyncio.create_task(coro)
+        return self._once[k]
+
+    def toc(self, repo: str) -> "asyncio.Task":
+        return self._read(repo, "structure", "read_wiki_structure", {"repo": repo, "repoName": repo})
+
+    def page(self, repo: str, topic: str) -> "asyncio.Task":
+        return self._read(
+            repo, "contents", "read_wiki_contents", {"repo": repo, "repoName": repo, "topic": topic, "topicName": topic}, topic
+        )
+
+
+async def run_batch(
+    items: List[BatchItem],
+    out_dir: str,
+    model: Optional[str] = None,
+    ask_concurrency: int = 4,
+    llm_concurrency: int = 2,
+    cache: Optional[WikiCache] = None,
+    refresh: bool = False,
+) -> Dict[str, int]:
+    """Answer all items, skipping ones already recorded as done in out_dir/state.jsonl."""
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    state = _load_state(out)
+    todo = [i for i in items if not (state.get(i.id, {}).get("status") == "ok" and (out / i.filename).exists())]
+    print(f"Batch: {len(items)} items, {len(items) - len(todo)} already done, {len(todo)} to run.")
+
+    ask_sem = asyncio.Semaphore(ask_concurrency)
+    llm_sem = asyncio.Semaphore(llm_concurrency)
+    counts = {"ok": 0, "error": 0, "skipped": len(items) - len(todo)}
+
+    async def _answer(run: _ServerRun, item: BatchItem) -> None:
+        with tracing.span("batch.item", cat="client", repo=item.repo, id=item.id):
+            try:
+                toc_task = run.toc(item.repo)
+                page_task = run.page(item.repo, item.topic) if item.topic else None
+                async with ask_sem:
+                    ask_txt = await _call_text(run.client, "ask_question", {
+                        "repo": item.repo, "repoName": item.repo, "question": item.question, "questionText": item.question,
+                    })
+                toc_txt = await toc_task
+                page_txt = await page_task if page_task is not None else None
+                if ask_txt is None:
+                    # The TOC alone (usually cached) is not an answer: record an error so the next run retries
+                    raise RuntimeError("DeepWiki ask_question failed or timed out for this item")
+                prompt = _build_prompt(
+                    item.repo, item.question, item.topic,
+                    _parse_toc(toc_txt) if toc_txt is not None else "",
+                    _parse_page(page_txt) if page_txt is not None else None,
+                    ask_txt or "",
+                )
+                async with llm_sem:
+                    # No stub fallback: a failed item is recorded as an error and retried on the next run
+                    md = await _explain(prompt, item.repo, item.question, ask_txt or "", model=model, priority="batch",
+                                        fallback=False)
+                _write_atomic(out / item.filename, md)
+                record = {"id": item.id, "status": "ok", "file": item.filename}
+                counts["ok"] += 1
+            except Exception as e:
+                record = {"id": item.id, "status": "error", "error": f"{type(e).__name__}: {e}"}
+                counts["error"] += 1
+            state[item.id] = record
+            _append_state(out, record)
+
+    by_server: Dict[str, List[BatchItem]] = {}
+    for item in todo:
+        by_server.setdefault(item.server_url, []).append(item)
+
+    async def _serve(server_url: str, server_items: List[BatchItem]) -> None:
+        async with MCPClient(server_url) as client:
+            run = _ServerRun(server_url, client, cache, refresh)
+            await asyncio.gather(*(_answer(run, i) for i in server_items))
+            if cache is not None:
+                await cache.drain(timeout=30)
+
+    try:
+        results = await asyncio.gather(*(_serve(url, its) for url, its in by_server.items()), return_exceptions=True)
+        for url, res in zip(by_server, results):
+            if isinstance(res, BaseException):
+                # Items for this server stay pending and are retried on the next run
+                print(f"Batch: server {url} failed: {type(res).__name__}: {res}")
+    finally:
+        _write_index(out, items, state)
+    return counts
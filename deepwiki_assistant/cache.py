@@ -0,0 +1,143 @@
+"""
+Persistent cache for DeepWiki wiki structure (TOC) and topic pages.
+
+Entries are keyed by (server URL, repo, kind, topic), so two DeepWiki servers
+(e.g. hosted and self-hosted) never serve each other's pages, and stored in a
+small SQLite file:
+- fresh (age < ttl): served directly;
+- stale (age < ttl + stale_ttl): served immediately while a background
+  refresh runs (stale-while-revalidate);
+- expired: fetched synchronously (the expired copy is still used if the fetch fails).
+The file is size-bounded; least recently used entries are evicted first.
+
+Defaults (env): DEEPWIKI_CACHE_DIR (~/.cache/deepwiki_assistant),
+DEEPWIKI_CACHE_TTL (86400 s), DEEPWIKI_CACHE_STALE_TTL (604800 s),
+DEEPWIKI_CACHE_MAX_BYTES (50 MB).
+"""
+
+import asyncio
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional, Set, Tuple
+
+Fetch = Callable[[], Awaitable[Optional[str]]]
+
+
+class WikiCache:
+    def __init__(self, path: str, ttl: float = 86400, stale_ttl: float = 7 * 86400, max_bytes: int = 50_000_000):
+        self.path = path
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_bytes = max_bytes
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path)
+        columns = [r[1] for r in self._db.execute("PRAGMA table_info(entries)")]
+        if columns and "server" not in columns:
+            self._db.execute("DROP TABLE entries")  # written before entries were keyed by server; only a cache
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " server TEXT NOT NULL, repo TEXT NOT NULL, kind TEXT NOT NULL, topic TEXT NOT NULL,"
+            " value TEXT NOT NULL, size INTEGER NOT NULL,"
+            " fetched_at REAL NOT NULL, accessed_at REAL NOT NULL,"
+            " PRIMARY KEY (server, repo, kind, topic))"
+        )
+        self._db.commit()
+        self._refreshing: Dict[Tuple[str, str, str, str], asyncio.Task] = {}
+        self._background: Set[asyncio.Task] = set()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    @classmethod
+    def default(cls) -> "WikiCache":
+        cache_dir = os.getenv("DEEPWIKI_CACHE_DIR") or str(Path.home() / ".cache" / "deepwiki_assistant")
+        return cls(
+            str(Path(cache_dir) / "wiki_cache.sqlite3"),
+            ttl=float(os.getenv("DEEPWIKI_CACHE_TTL", "86400")),
+            stale_ttl=float(os.getenv("DEEPWIKI_CACHE_STALE_TTL", str(7 * 86400))),
+            max_bytes=int(os.getenv("DEEPWIKI_CACHE_MAX_BYTES", "50000000")),
+        )
+
+    # ---- storage ----
+    def get(self, server: str, repo: str, kind: str, topic: str = "") -> Optional[Tuple[str, float]]:
+        """Return (value, age_seconds) or None."""
+        key = (server, repo, kind, topic)
+        row = self._db.execute(
+            "SELECT value, fetched_at FROM entries WHERE server=? AND repo=? AND kind=? AND topic=?", key
+        ).fetchone()
+        if row is None:
+            return None
+        self._db.execute(
+            "UPDATE entries SET accessed_at=? WHERE server=? AND repo=? AND kind=? AND topic=?", (time.time(), *key)
+        )
+        self._db.commit()
+        return row[0], time.time() - row[1]
+
+    def put(self, server: str, repo: str, kind: str, topic: str, value: str) -> None:
+        now = time.time()
+        self._db.execute(
+            "INSERT OR REPLACE INTO entries (server, repo, kind, topic, value, size, fetched_at, accessed_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (server, repo, kind, topic, value, len(value.encode("utf-8")), now, now),
+        )
+        self._evict()
+        self._db.commit()
+
+    def _evict(self) -> None:
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._db.execute(
+            "SELECT server, repo, kind, topic, size FROM entries ORDER BY accessed_at ASC"
+        ).fetchall()
+        for server, repo, kind, topic, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._db.execute(
+                "DELETE FROM entries WHERE server=? AND repo=? AND kind=? AND topic=?", (server, repo, kind, topic)
+            )
+            total -= size
+
+    def invalidate(self, server: str, repo: str) -> None:
+        self._db.execute("DELETE FROM entries WHERE server=? AND repo=?", (server, repo))
+        self._db.commit()
+
+    # ---- read-through with stale-while-revalidate ----
+    async def _fetch_and_store(self, key: Tuple[str, str, str, str], fetch: Fetch) -> Optional[str]:
+        value = await fetch()
+        if value is not None:
+            self.put(*key, value)
+        return value
+
+    async def get_or_fetch(self, server: str, repo: str, kind: str, topic: str, fetch: Fetch,
+                           refresh: bool = False) -> Optional[str]:
+        key = (server, repo, kind, topic or "")
+        cached = None if refresh else self.get(*key)
+        if cached is not None:
+            value, age = cached
+            if age < self.ttl:
+                self.hits += 1
+                return value
+            if age < self.ttl + self.stale_ttl:
+                self.stale_hits += 1
+                if key not in self._refreshing:
+                    task = asyncio.create_task(self._fetch_and_store(key, fetch))
+                    self._refreshing[key] = task
+                    self._background.add(task)
+                    task.add_done_callback(lambda t, k=key: (self._refreshing.pop(k, None), self._background.discard(t)))
+                return value
+        self.misses += 1
+        fresh = await self._fetch_and_store(key, fetch)
+        if fresh is None and cached is not None:
+            return cached[0]  # expired copy beats nothing
+        return fresh
+
+    async def drain(self, timeout: Optional[float] = None) -> None:
+        """Wait for background refreshes (call once, before closing the MCP session they use)."""
+        if self._background:
+            await asyncio.wait(set(self._background), timeout=timeout)
+
+    def close(self) -> None:
+        self._db.close()
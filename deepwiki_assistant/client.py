@@ -8,13 +8,18 @@ stdio has no URL; you'd spawn a local process and talk via stdin/stdout with a d
 
 import asyncio
 import json
+import logging
 import os
 import sys
-from typing import Any, Dict
+from typing import Any, Dict, Tuple
 
 from dotenv import load_dotenv
 from fastmcp import Client as MCPClient
-import google.generativeai as genai
+
+from common import tracing
+from common.llm_gateway import get_gateway
+from deepwiki_assistant.cache import WikiCache
+from deepwiki_assistant.grounding import compact_grounding
 
 # Defaults; override via CLI
 # Prefer the public DeepWiki MCP endpoint if no env is set.
@@ -47,56 +52,74 @@ def _safe_preview(s: str, n: int = 800) -> str:
     return s[:n]
 
 
-async def query_deepwiki(
+# Per-call timeouts (seconds). The TOC and topic page are nice-to-have grounding,
+# so they get short budgets; ask_question is the slow, essential call.
+CALL_TIMEOUTS: Dict[str, float] = {
+    "read_wiki_structure": float(os.getenv("DEEPWIKI_STRUCTURE_TIMEOUT", "15")),
+    "read_wiki_contents": float(os.getenv("DEEPWIKI_CONTENTS_TIMEOUT", "20")),
+    "ask_question": float(os.getenv("DEEPWIKI_ASK_TIMEOUT", "120")),
+}
+
+
+def _parse_toc(toc_txt: str) -> Any:
+    try:
+        return json.loads(toc_txt) if toc_txt.strip().startswith(("[", "{")) else toc_txt
+    except Exception:
+        return toc_txt
+
+
+def _parse_page(page_txt: str) -> Dict[str, Any]:
+    try:
+        return json.loads(page_txt) if page_txt.strip().startswith(("{", "[")) else {"content": page_txt}
+    except Exception:
+        return {"content": page_txt}
+
+
+async def _call_text(client: MCPClient, name: str, args: Dict[str, Any]) -> str | None:
+    """Call a DeepWiki tool with its timeout; returns None (and warns) on error or timeout."""
+    try:
+        obj = await asyncio.wait_for(tracing.call_tool(client, name, args), timeout=CALL_TIMEOUTS.get(name))
+    except Exception as e:
+        print(f"Warning: {name} skipped ({type(e).__name__}: {e})", file=sys.stderr)
+        return None
+    return _extract_text(obj)
+
+
+async def _gather_grounding(
+    client: MCPClient,
     server_url: str,
     repo: str,
     question: str,
-    topic: str | None = None,
-    model: str | None = None,
-    out_file: str | None = None,
-) -> str:
-    """
-    - Uses DeepWiki MCP tools to gather repo docs and answer a question.
-    - Uses Gemini to produce a clear, grounded explanation (Markdown).
-    - Optionally saves to out_file and returns the markdown string.
-    """
-    load_dotenv()
+    topic: str | None,
+    cache: WikiCache | None = None,
+    refresh: bool = False,
+) -> Tuple[Any, Dict[str, Any] | None, str]:
+    """Issue read_wiki_structure, read_wiki_contents and ask_question concurrently."""
+    # Hosted DeepWiki expects repoName/topicName/questionText; include legacy names for compatibility
+    def _read(kind: str, name: str, args: Dict[str, Any], key: str = ""):
+        fetch = lambda: _call_text(client, name, args)
+        if cache is None:
+            return fetch()
+        # TOC and topic pages change rarely: serve from cache, revalidate in the background
+        return cache.get_or_fetch(server_url, repo, kind, key, fetch, refresh=refresh)
 
-    # 1) Gather structure (TOC)
-    client = MCPClient(server_url)
-    async with client:
-        # Hosted DeepWiki expects repoName; include both for compatibility
-        toc_obj: Any = await client.call_tool("read_wiki_structure", {"repo": repo, "repoName": repo})
-        toc_txt = _extract_text(toc_obj)
-        toc: Any
-        try:
-            toc = json.loads(toc_txt) if toc_txt.strip().startswith(("[", "{")) else toc_txt
-        except Exception:
-            toc = toc_txt
-
-        # 2) Optionally fetch specific topic content for grounding
-        page: Dict[str, Any] | None = None
-        if topic:
-            # Include both legacy and hosted param names
-            page_obj = await client.call_tool(
-                "read_wiki_contents",
-                {"repo": repo, "repoName": repo, "topic": topic, "topicName": topic},
-            )
-            page_txt = _extract_text(page_obj)
-            try:
-                page = json.loads(page_txt) if page_txt.strip().startswith(("{", "[")) else {"content": page_txt}
-            except Exception:
-                page = {"content": page_txt}
-
-        # 3) Ask DeepWiki its own grounded answer
-        # Include both legacy and hosted param names
-        ask_obj = await client.call_tool(
-            "ask_question",
-            {"repo": repo, "repoName": repo, "question": question, "questionText": question},
-        )
-        ask_txt = _extract_text(ask_obj)
+    calls = [
+        _read("structure", "read_wiki_structure", {"repo": repo, "repoName": repo}),
+        _call_text(client, "ask_question", {"repo": repo, "repoName": repo, "question": question, "questionText": question}),
+    ]
+    if topic:
+        calls.append(_read(
+            "contents", "read_wiki_contents", {"repo": repo, "repoName": repo, "topic": topic, "topicName": topic}, topic
+        ))
+    toc_txt, ask_txt, *rest = await asyncio.gather(*calls)
+    page_txt = rest[0] if rest else None
 
-    # 4) Build a summarization prompt for Gemini
+    toc = _parse_toc(toc_txt) if toc_txt is not None else ""
+    page = _parse_page(page_txt) if page_txt is not None else None
+    return toc, page, ask_txt or ""
+
+
+def _build_prompt(repo: str, question: str, topic: str | None, toc: Any, page: Dict[str, Any] | None, ask_txt: str) -> str:
     grounding = {
         "repo": repo,
         "question": question,
@@ -105,11 +128,14 @@ async def query_deepwiki(
         "page": page or {},
         "deepwiki_answer": ask_txt,
     }
-    prompt = (
+    with tracing.span("prompt.render", cat="client"):
+        # Only the question-relevant TOC entries and page sections, compact JSON, within a token budget
+        grounding_json = compact_grounding(grounding)
+    return (
         "You are a precise software explainer. Read the JSON grounding that contains a GitHub repo's docs "
         "structure, optional page content, and an AI-grounded answer from the DeepWiki MCP server. "
         "Write a concise, accurate, developer-focused explanation in Markdown that answers the user's question.\n\n"
-        "JSON grounding:\n" + json.dumps(grounding, indent=2) + "\n\n"
+        "JSON grounding:\n" + grounding_json + "\n\n"
         "Instructions:\n"
         "- Be factual; don't invent APIs.\n"
         "- Use short sections with headings and bullet points.\n"
@@ -117,18 +143,25 @@ async def query_deepwiki(
         "- End with a References section linking to the most relevant doc pages or repo files.\n"
     )
 
-    # 5) Generate explanation with Gemini
-    api_key = os.getenv("GOOGLE_API_KEY")
-    selected_model = model or os.getenv("GEMINI_MODEL") or "gemini-1.5-flash"
 
+async def _explain(
+    prompt: str, repo: str, question: str, ask_txt: str, model: str | None = None, priority: str = "interactive",
+    fallback: bool = True,
+) -> str:
+    """Gemini's explanation; on failure a local stub summary, or the error itself when fallback=False."""
+    selected_model = model or os.getenv("GEMINI_MODEL") or "gemini-1.5-flash"
     try:
-        mdl = genai.GenerativeModel(selected_model, system_instruction=(
-            "You are a precise, pragmatic technical writer for developers. Output must be Markdown."
-        ))
-        answer_md = mdl.generate_content(prompt).text or ""
+        return await get_gateway().generate(
+            prompt,
+            model=selected_model,
+            system_instruction="You are a precise, pragmatic technical writer for developers. Output must be Markdown.",
+            priority=priority,
+        )
     except Exception:
+        if not fallback:
+            raise
         # Fallback minimal summary so the flow still succeeds
-        answer_md = (
+        return (
             f"# Explanation for: {question}\n\n"
             f"This is a brief, local fallback summary grounded in available DeepWiki data for `{repo}`.\n\n"
             "## DeepWiki Answer (raw)\n"
@@ -136,6 +169,59 @@ async def query_deepwiki(
             "## Notes\n- Full LLM summarization unavailable (e.g., quota).\n"
         )
 
+
+async def query_deepwiki(
+    server_url: str,
+    repo: str,
+    question: str,
+    topic: str | None = None,
+    model: str | None = None,
+    out_file: str | None = None,
+    cache: WikiCache | None = None,
+    refresh: bool = False,
+) -> str:
+    """
+    - Uses DeepWiki MCP tools to gather repo docs and answer a question.
+    - Serves the TOC/topic page from `cache` when given (refresh=True bypasses it).
+    - Uses Gemini to produce a clear, grounded explanation (Markdown).
+    - Optionally saves to out_file and returns the markdown string.
+    """
+    load_dotenv()
+    with tracing.span("query_deepwiki", cat="client", repo=repo, topic=topic):
+        return await _query_deepwiki(
+            server_url, repo, question, topic=topic, model=model, out_file=out_file, cache=cache, refresh=refresh
+        )
+
+
+async def _query_deepwiki(
+    server_url: str,
+    repo: str,
+    question: str,
+    topic: str | None,
+    model: str | None,
+    out_file: str | None,
+    cache: WikiCache | None = None,
+    refresh: bool = False,
+) -> str:
+    # 1-3) Gather structure (TOC), optional topic page and DeepWiki's own answer
+    # concurrently on one session; a failed or slow grounding call is skipped.
+    client = MCPClient(server_url)
+    async with client:
+        toc, page, ask_txt = await _gather_grounding(
+            client, server_url, repo, question, topic, cache=cache, refresh=refresh
+        )
+
+        # 4) Build a summarization prompt for Gemini
+        prompt = _build_prompt(repo, question, topic, toc, page, ask_txt)
+
+        # 5) Generate explanation with Gemini (shared quota-aware gateway). Background revalidation of stale
+        # cache entries keeps using the session meanwhile; only what is still running afterwards is waited for.
+        try:
+            answer_md = await _explain(prompt, repo, question, ask_txt, model=model)
+        finally:
+            if cache is not None:
+                await cache.drain(timeout=CALL_TIMEOUTS["read_wiki_contents"])
+
     # 6) Optionally save
     if out_file:
         from pathlib import Path
@@ -154,7 +240,33 @@ async def _main():
     parser.add_argument("--topic", type=str, default=None, help="Optional topic/slug from wiki structure to ground on")
     parser.add_argument("--model", type=str, default=None, help="Gemini model (default: gemini-1.5-flash)")
     parser.add_argument("--out", type=str, default="deepwiki_answer.md", help="Output markdown file path")
+    parser.add_argument("--trace", type=str, default=None, help="Write Chrome-trace/Perfetto JSON spans to this file")
+    parser.add_argument("--refresh", action="store_true", help="Ignore cached wiki structure/pages and refetch them")
+    parser.add_argument("--no-cache", action="store_true", help="Do not read or write the local wiki cache")
+    parser.add_argument("--batch", type=str, default=None, help="JSONL/YAML file of {repo, question, topic} items")
+    parser.add_argument("--batch-out", type=str, default="deepwiki_batch", help="Output directory for batch answers")
+    parser.add_argument("--ask-concurrency", type=int, default=4, help="Max concurrent ask_question calls (batch)")
+    parser.add_argument("--llm-concurrency", type=int, default=2, help="Max concurrent Gemini calls (batch)")
     args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, format="%(message)s")
+    logging.getLogger("deepwiki_assistant").setLevel(logging.INFO)  # grounding size before/after
+    if args.trace:
+        tracing.enable(args.trace, process_name="deepwiki_client")
+
+    if args.batch:
+        from deepwiki_assistant.batch import load_items, run_batch
+
+        counts = await run_batch(
+            load_items(args.batch, default_server_url=args.server_url),
+            args.batch_out,
+            model=args.model,
+            ask_concurrency=args.ask_concurrency,
+            llm_concurrency=args.llm_concurrency,
+            cache=None if args.no_cache else WikiCache.default(),
+            refresh=args.refresh,
+        )
+        print(f"Batch done: {counts['ok']} ok, {counts['error']} failed, {counts['skipped']} skipped -> {args.batch_out}")
+        return
 
     # Interactive prompts for missing values
     repo = args.repo or input("Enter repo (owner/name): ").strip()
@@ -186,6 +298,8 @@ async def _main():
         topic=topic,
         model=args.model,
         out_file=args.out,
+        cache=None if args.no_cache else WikiCache.default(),
+        refresh=args.refresh,
     )
 
     # Print preview
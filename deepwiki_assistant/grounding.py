@@ -0,0 +1,221 @@
+"""
+Relevance-pruned grounding for the Gemini prompt.
+
+The raw grounding (full TOC, full topic page, DeepWiki answer) is mostly
+irrelevant to any single question on large repos. compact_grounding():
+- keeps the DeepWiki answer (the most targeted evidence), trimmed to its share;
+- keeps the page sections that lexically match the question, in page order;
+- keeps the matching TOC entries together with their ancestors and children;
+- serializes compactly (no indentation) and, if the result is still over the
+  token budget, shrinks the TOC, then the page, then the answer until it fits.
+"""
+
+import json
+import logging
+import os
+import re
+from typing import Any, Dict, List, Tuple
+
+from common.textsearch import idf, overlap_score, tokenize
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUDGET_TOKENS = int(os.getenv("DEEPWIKI_GROUNDING_TOKENS", "3000"))
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4) if text else 0
+
+
+def _trim(text: str, max_tokens: int) -> str:
+    limit = max(0, max_tokens) * 4
+    return text if len(text) <= limit else text[:limit].rstrip() + "…"
+
+
+# ---- TOC ----
+def _toc_lines(toc: str) -> List[Tuple[int, str]]:
+    """(indent, text) for each non-empty TOC line."""
+    out = []
+    for line in toc.splitlines():
+        if line.strip():
+            out.append((len(line) - len(line.lstrip()), line.rstrip()))
+    return out
+
+
+def _prune_toc_text(toc: str, q_terms: List[str], max_tokens: int) -> str:
+    lines = _toc_lines(toc)
+    if not lines:
+        return ""
+    docs = [tokenize(t) for _, t in lines]
+    weights = idf(docs)
+    scores = [overlap_score(q_terms, d, weights) for d in docs]
+
+    keep = set()
+    for i in sorted(range(len(lines)), key=lambda i: -scores[i]):
+        if scores[i] <= 0:
+            break
+        block = {i}
+        indent = lines[i][0]
+        # ancestors: nearest preceding lines with smaller indentation
+        cur = indent
+        for j in range(i - 1, -1, -1):
+            if lines[j][0] < cur:
+                block.add(j)
+                cur = lines[j][0]
+        # subtree: following lines indented deeper than the match
+        for j in range(i + 1, len(lines)):
+            if lines[j][0] <= indent:
+                break
+            block.add(j)
+        candidate = keep | block
+        if estimate_tokens("\n".join(lines[k][1] for k in sorted(candidate))) > max_tokens:
+            if keep:
+                break
+            candidate = block  # always keep the best match, trimmed below
+        keep = candidate
+    if not keep:
+        # Nothing matched: keep the top-level outline
+        top = min(ind for ind, _ in lines)
+        keep = {k for k, (ind, _) in enumerate(lines) if ind == top}
+    return _trim("\n".join(lines[k][1] for k in sorted(keep)), max_tokens)
+
+
+def _prune_toc(toc: Any, q_terms: List[str], max_tokens: int) -> Any:
+    if isinstance(toc, str):
+        return _prune_toc_text(toc, q_terms, max_tokens)
+    if isinstance(toc, list):
+        # Structured TOC: keep matching entries (with their whole subtree) in order
+        texts = [json.dumps(e, ensure_ascii=False) for e in toc]
+        docs = [tokenize(t) for t in texts]
+        weights = idf(docs)
+        ranked = sorted(range(len(toc)), key=lambda i: -overlap_score(q_terms, docs[i], weights))
+        keep: Dict[int, Any] = {}
+        used = 0
+        for i in ranked:
+            cost = estimate_tokens(texts[i])
+            if used + cost > max_tokens:
+                if keep:
+                    continue
+                # the best entry alone is over budget: keep a pruned copy of it
+                keep[i] = _prune_value(toc[i], q_terms, max_tokens)
+                used = _cost(keep[i])
+                continue
+            keep[i] = toc[i]
+            used += cost
+        return [keep[i] for i in sorted(keep)]
+    if isinstance(toc, dict):
+        return {k: _prune_toc(v, q_terms, max_tokens // max(1, len(toc))) for k, v in toc.items()}
+    return toc
+
+
+# ---- page ----
+_HEADING = re.compile(r"^#{1,6}\s", re.MULTILINE)
+
+
+def _sections(text: str) -> List[str]:
+    starts = [m.start() for m in _HEADING.finditer(text)]
+    if not starts or starts[0] != 0:
+        starts = [0] + starts
+    return [text[a:b].strip() for a, b in zip(starts, starts[1:] + [len(text)]) if text[a:b].strip()]
+
+
+def _prune_page_text(text: str, q_terms: List[str], max_tokens: int) -> str:
+    sections = _sections(text)
+    if not sections:
+        return ""
+    docs = [tokenize(s) for s in sections]
+    weights = idf(docs)
+    scores = [overlap_score(q_terms, d, weights) for d in docs]
+    keep = {0}  # the intro gives the model the page's framing
+    used = estimate_tokens(sections[0])
+    for i in sorted(range(1, len(sections)), key=lambda i: -scores[i]):
+        if scores[i] <= 0:
+            break
+        cost = estimate_tokens(sections[i])
+        if used + cost > max_tokens:
+            continue
+        keep.add(i)
+        used += cost
+    return _trim("\n\n".join(sections[i] for i in sorted(keep)), max_tokens)
+
+
+def _cost(value: Any) -> int:
+    return estimate_tokens(json.dumps(value, separators=(",", ":"), ensure_ascii=False))
+
+
+def _prune_value(value: Any, q_terms: List[str], max_tokens: int) -> Any:
+    """Relevant parts of a parsed page value (text, dict or list) in about max_tokens."""
+    if max_tokens <= 0:
+        return type(value)() if isinstance(value, (str, dict, list)) else None
+    if _cost(value) <= max_tokens:
+        return value
+    if isinstance(value, str):
+        return _prune_page_text(value, q_terms, max_tokens)
+    if isinstance(value, list):
+        texts = [json.dumps(v, ensure_ascii=False) for v in value]
+        docs = [tokenize(t) for t in texts]
+        weights = idf(docs)
+        ranked = sorted(range(len(value)), key=lambda i: -overlap_score(q_terms, docs[i], weights))
+        keep: Dict[int, Any] = {}
+        used = 0
+        for i in ranked:
+            cost = _cost(value[i])
+            if used + cost > max_tokens:
+                if keep:
+                    continue
+                keep[i] = _prune_value(value[i], q_terms, max_tokens)
+                cost = _cost(keep[i])
+            else:
+                keep[i] = value[i]
+            used += cost
+        return [keep[i] for i in sorted(keep)]
+    if isinstance(value, dict):
+        # Short fields (title, path, ...) stay as they are; long ones share what is left
+        costs = {k: _cost(v) for k, v in value.items()}
+        small = {k for k, c in costs.items() if c <= 50}
+        if sum(costs[k] for k in small) > max_tokens // 2:
+            small = set()
+        rest = max_tokens - sum(costs[k] for k in small)
+        big = [k for k in value if k not in small]
+        share = rest // max(1, len(big))
+        return {k: v if k in small else _prune_value(v, q_terms, share) for k, v in value.items()}
+    return value
+
+
+def _prune_page(page: Any, q_terms: List[str], max_tokens: int) -> Any:
+    if not page:
+        return {}
+    return _prune_value(page, q_terms, max_tokens)
+
+
+def compact_grounding(grounding: Dict[str, Any], budget_tokens: int = DEFAULT_BUDGET_TOKENS) -> str:
+    """Return the grounding as compact JSON holding only question-relevant TOC/page parts."""
+    before = len(json.dumps(grounding, indent=2, ensure_ascii=False))
+    q_terms = tokenize(f"{grounding.get('question', '')} {grounding.get('topic') or ''}")
+
+    answer = grounding.get("deepwiki_answer") or ""
+    answer_budget = budget_tokens // 2
+    answer = _trim(answer, answer_budget)
+    remaining = budget_tokens - estimate_tokens(answer) - 100  # keys, repo, question
+    page = _prune_page(grounding.get("page"), q_terms, int(remaining * 0.6))
+    remaining -= estimate_tokens(json.dumps(page, separators=(",", ":"), ensure_ascii=False))
+    toc = _prune_toc(grounding.get("toc"), q_terms, max(100, remaining))
+
+    compact = {**grounding, "toc": toc, "page": page, "deepwiki_answer": answer}
+    out = json.dumps(compact, separators=(",", ":"), ensure_ascii=False)
+    # The per-part shares are estimates; enforce the budget on the serialized result, least targeted part first
+    for key in ("toc", "page", "deepwiki_answer"):
+        over = estimate_tokens(out) - budget_tokens
+        if over <= 0:
+            break
+        target = max(0, _cost(compact[key]) - over)
+        if key == "deepwiki_answer":
+            compact[key] = _trim(compact[key], target - 1) if target > 1 else ""
+        else:
+            compact[key] = _prune_value(compact[key], q_terms, target)
+        out = json.dumps(compact, separators=(",", ":"), ensure_ascii=False)
+    logger.info(
+        "grounding: %d -> %d chars (~%d -> %d tokens, budget %d)",
+        before, len(out), estimate_tokens("x" * before), estimate_tokens(out), budget_tokens,
+    )
+    return out
@@ -0,0 +1,478 @@
+"""
+On-disk search index over a local repository checkout, used by local_server.py.
+
+Files are split into passages (Markdown by heading, source by top-level
+definition, at most MAX_CHUNK_LINES lines each) and indexed with BM25 over
+common.textsearch tokens. Each build writes a new generation directory:
+- lexicon.dat / lexicon.idx   sorted terms + (term, postings offset, df) records
+- postings.dat                (chunk id, tf) uint32 pairs, grouped by term
+- text.dat / lengths.dat      passage text and passage lengths in tokens
+- chunks.json                 passage metadata (path, title, lines, text offset)
+- structure.json              wiki pages derived from docs and source folders
+- vectors.npy (optional)      hashed TF-IDF vectors, needs NumPy
+- manifest.json               per-file mtime/size and passages, for incremental rebuilds
+Builds are incremental: unchanged files (same mtime and size) reuse their
+passages and term counts from the previous generation. CURRENT names the live
+generation and is replaced atomically, so a serving process never sees a half
+written index. RepoIndex memory-maps the binary files (and vectors.npy with
+mmap_mode="r"), so opening an index is cheap regardless of repo size.
+
+Build from the command line:
+    python -m deepwiki_assistant.index owner/name /path/to/checkout [--vectors]
+"""
+
+import json
+import math
+import mmap
+import os
+import re
+import shutil
+import struct
+import time
+import zlib
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from common.textsearch import tokenize
+
+try:
+    import numpy as np  # type: ignore
+except ImportError:  # pragma: no cover - vectors are optional
+    np = None  # type: ignore
+
+INDEX_VERSION = 1
+MAX_FILE_BYTES = 1_000_000
+MAX_CHUNK_LINES = 80
+MIN_CHUNK_LINES = 8
+MAX_CHUNK_CHARS = 8000
+VECTOR_DIM = 512
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+DOC_EXTS = {".md", ".markdown", ".rst", ".txt"}
+CODE_EXTS = {
+    ".py", ".pyi", ".js", ".jsx", ".ts", ".tsx", ".go", ".rs", ".java", ".kt", ".c", ".h", ".cc", ".cpp",
+    ".hpp", ".cs", ".rb", ".php", ".swift", ".scala", ".sh", ".toml", ".yaml", ".yml", ".cfg", ".ini",
+}
+SKIP_DIRS = {
+    ".git", ".hg", ".svn", "node_modules", "__pycache__", ".venv", "venv", "env", "build", "dist", "target",
+    ".mypy_cache", ".pytest_cache", ".ruff_cache", ".tox", ".nox", ".idea", ".vscode", "site-packages",
+}
+
+_LEX = struct.Struct("<IIII")  # term offset, term length, postings offset, df
+_POST = struct.Struct("<II")  # chunk id, term frequency
+_HEADING = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+_TOP_LEVEL_DEF = re.compile(
+    r"^(?:async\s+def|def|class|func|fn|pub\s+fn|pub\s+struct|impl|struct|interface|function|"
+    r"export\s+(?:default\s+)?(?:async\s+)?(?:function|class|const|interface|type))\b"
+)
+
+
+def default_index_dir() -> Path:
+    return Path(os.getenv("DEEPWIKI_INDEX_DIR") or Path.home() / ".cache" / "deepwiki_assistant" / "index")
+
+
+def vectors_available() -> bool:
+    return np is not None
+
+
+def slugify(text: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-") or "page"
+
+
+@dataclass
+class BuildStats:
+    files: int
+    chunks: int
+    reindexed: int
+    reused: int
+    removed: int
+    seconds: float
+    changed: bool
+
+
+# ---- chunking ----
+def _walk(root: Path) -> Iterable[Tuple[str, os.stat_result]]:
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d not in SKIP_DIRS and (not d.startswith(".") or d == ".github"))
+        for name in sorted(filenames):
+            ext = os.path.splitext(name)[1].lower()
+            if ext not in DOC_EXTS and ext not in CODE_EXTS:
+                continue
+            path = os.path.join(dirpath, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if st.st_size <= MAX_FILE_BYTES:
+                yield os.path.relpath(path, root).replace(os.sep, "/"), st
+
+
+def _chunk(rel: str, text: str) -> List[Tuple[str, int, int, int, str]]:
+    """Split a file into (title, heading level, first line, last line, text) passages."""
+    is_doc = os.path.splitext(rel)[1].lower() in DOC_EXTS
+    lines = text.splitlines()
+    chunks: List[Tuple[str, int, int, int, str]] = []
+    start, title, level = 0, rel, 0
+    in_fence = False
+
+    def flush(end: int) -> None:
+        body = "\n".join(lines[start:end]).strip()
+        if body:
+            chunks.append((title, level, start + 1, end, body[:MAX_CHUNK_CHARS]))
+
+    for i, line in enumerate(lines):
+        boundary = None
+        if is_doc:
+            if line.startswith("```"):
+                in_fence = not in_fence
+            m = None if in_fence else _HEADING.match(line)
+            if m:
+                boundary = (m.group(2) or rel, len(m.group(1)))
+        elif i - start >= MIN_CHUNK_LINES and _TOP_LEVEL_DEF.match(line):
+            boundary = (line.strip()[:120], 0)
+        if boundary is None and i - start >= MAX_CHUNK_LINES:
+            boundary = (title if title.endswith("(cont.)") else f"{title} (cont.)", 0)
+        if boundary is not None:
+            if i > start:
+                flush(i)
+            start, (title, level) = i, boundary
+        elif i == start and not is_doc and _TOP_LEVEL_DEF.match(line):
+            title = line.strip()[:120]
+    flush(len(lines))
+    return chunks
+
+
+def _read_text(path: Path) -> Optional[str]:
+    data = path.read_bytes()
+    if b"\x00" in data[:1024]:
+        return None  # binary
+    return data.decode("utf-8", errors="replace")
+
+
+# ---- structure ----
+def _structure(files: Dict[str, List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Wiki pages: one per document (with its headings), one per top-level source folder."""
+    pages: List[Dict[str, Any]] = []
+    docs = [r for r in files if os.path.splitext(r)[1].lower() in DOC_EXTS]
+    docs.sort(key=lambda r: (not r.lower().startswith("readme"), r.count("/"), r))
+    seen = set()
+    for rel in docs:
+        headings = [[c["level"], c["title"]] for c in files[rel] if c["level"]]
+        title = next((t for lvl, t in headings if lvl == 1), Path(rel).stem)
+        slug = slugify(os.path.splitext(rel)[0])
+        while slug in seen:
+            slug += "-1"
+        seen.add(slug)
+        pages.append({
+            "slug": slug, "title": title, "kind": "doc", "files": [rel],
+            "headings": [h for h in headings if 1 < h[0] <= 3],
+        })
+    groups: Dict[str, List[str]] = {}
+    for rel in files:
+        if os.path.splitext(rel)[1].lower() in CODE_EXTS:
+            groups.setdefault(rel.split("/", 1)[0] if "/" in rel else "", []).append(rel)
+    for folder, rels in sorted(groups.items()):
+        pages.append({
+            "slug": "src-" + slugify(folder or "root"),
+            "title": f"Source: {folder}/" if folder else "Source: top-level files",
+            "kind": "source", "files": sorted(rels), "headings": [],
+        })
+    return pages
+
+
+# ---- build ----
+def _hash_vector(tf: Dict[str, int], idf: Dict[str, float], dim: int = VECTOR_DIM) -> "np.ndarray":
+    vec = np.zeros(dim, dtype=np.float32)
+    for term, count in tf.items():
+        h = zlib.crc32(term.encode("utf-8"))
+        w = (1 + math.log(count)) * idf.get(term, 1.0)
+        vec[h % dim] += -w if h & 0x80000000 else w
+    norm = float(np.linalg.norm(vec))
+    return vec / norm if norm else vec
+
+
+def _bm25_idf(n: int, df: int) -> float:
+    return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+
+def repo_dir(index_dir: Path, repo: str) -> Path:
+    return Path(index_dir) / slugify(repo)
+
+
+def _current(base: Path) -> Optional[Path]:
+    try:
+        gen = (base / "CURRENT").read_text(encoding="utf-8").strip()
+    except OSError:
+        return None
+    return base / gen if gen and (base / gen).is_dir() else None
+
+
+def build_index(repo: str, root: str, index_dir: Optional[Path] = None, vectors: bool = False) -> BuildStats:
+    """(Re)build the index for repo from the checkout at root; returns early if nothing changed."""
+    t0 = time.perf_counter()
+    base = repo_dir(index_dir or default_index_dir(), repo)
+    base.mkdir(parents=True, exist_ok=True)
+    root_path = Path(root).resolve()
+    prev_dir = _current(base)
+
+    old_files: Dict[str, Dict[str, Any]] = {}
+    old_text = b""
+    if prev_dir is not None:
+        try:
+            manifest = json.loads((prev_dir / "manifest.json").read_text(encoding="utf-8"))
+            if manifest.get("version") == INDEX_VERSION and manifest.get("vectors", False) == (vectors and np is not None):
+                old_files = manifest["files"]
+                old_text = (prev_dir / "text.dat").read_bytes()
+        except (OSError, ValueError, KeyError):
+            old_files = {}
+
+    files: Dict[str, Dict[str, Any]] = {}
+    reindexed = reused = 0
+    for rel, st in _walk(root_path):
+        prev = old_files.get(rel)
+        if prev and prev["mtime_ns"] == st.st_mtime_ns and prev["size"] == st.st_size:
+            chunks = [{**c, "text": old_text[c["off"]:c["off"] + c["len"]].decode("utf-8")} for c in prev["chunks"]]
+            reused += 1
+        else:
+            try:
+                text = _read_text(root_path / rel)
+            except OSError:
+                continue
+            if text is None:
+                continue
+            chunks = [
+                {"title": title, "level": level, "start": a, "end": b, "text": body,
+                 "tf": dict(Counter(tokenize(f"{rel} {title} {body}")))}
+                for title, level, a, b, body in _chunk(rel, text)
+            ]
+            reindexed += 1
+        files[rel] = {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "chunks": chunks}
+
+    removed = len(set(old_files) - set(files))
+    if prev_dir is not None and old_files and not reindexed and not removed:
+        n_chunks = sum(len(f["chunks"]) for f in files.values())
+        return BuildStats(len(files), n_chunks, 0, reused, 0, time.perf_counter() - t0, changed=False)
+
+    gen = f"gen-{time.time_ns()}"
+    out = base / (gen + ".tmp")
+    out.mkdir()
+    postings: Dict[str, List[Tuple[int, int]]] = {}
+    meta: List[List[Any]] = []
+    lengths: List[int] = []
+    tfs: List[Dict[str, int]] = []
+    with open(out / "text.dat", "wb") as text_f:
+        off = 0
+        for rel in sorted(files):
+            for c in files[rel]["chunks"]:
+                data = c.pop("text").encode("utf-8")
+                text_f.write(data)
+                c["off"], c["len"] = off, len(data)
+                off += len(data)
+                cid = len(meta)
+                meta.append([rel, c["title"], c["level"], c["start"], c["end"], c["off"], c["len"]])
+                lengths.append(sum(c["tf"].values()))
+                tfs.append(c["tf"])
+                for term, count in c["tf"].items():
+                    postings.setdefault(term, []).append((cid, count))
+
+    terms = sorted(postings, key=lambda t: t.encode("utf-8"))
+    with open(out / "lexicon.dat", "wb") as lex_f, open(out / "lexicon.idx", "wb") as idx_f, \
+            open(out / "postings.dat", "wb") as post_f:
+        term_off = post_off = 0
+        for term in terms:
+            raw = term.encode("utf-8")
+            plist = postings[term]
+            lex_f.write(raw)
+            idx_f.write(_LEX.pack(term_off, len(raw), post_off, len(plist)))
+            post_f.write(b"".join(_POST.pack(cid, tf) for cid, tf in plist))
+            term_off += len(raw)
+            post_off += len(plist)
+    with open(out / "lengths.dat", "wb") as f:
+        f.write(struct.pack(f"<{len(lengths)}I", *lengths))
+
+    with_vectors = vectors and np is not None
+    if with_vectors:
+        n = len(meta)
+        idf = {t: _bm25_idf(n, len(p)) for t, p in postings.items()}
+        mat = np.zeros((n, VECTOR_DIM), dtype=np.float32)
+        for cid, tf in enumerate(tfs):
+            mat[cid] = _hash_vector(tf, idf)
+        np.save(out / "vectors.npy", mat)
+
+    (out / "chunks.json").write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+    (out / "structure.json").write_text(
+        json.dumps({"repo": repo, "root": str(root_path), "pages": _structure({r: f["chunks"] for r, f in files.items()})},
+                   ensure_ascii=False),
+        encoding="utf-8",
+    )
+    (out / "manifest.json").write_text(
+        json.dumps({"version": INDEX_VERSION, "repo": repo, "root": str(root_path), "vectors": with_vectors,
+                    "files": files}, ensure_ascii=False),
+        encoding="utf-8",
+    )
+    out.rename(base / gen)
+    tmp = base / "CURRENT.tmp"
+    tmp.write_text(gen, encoding="utf-8")
+    os.replace(tmp, base / "CURRENT")
+    # Older generations can go: open mmaps keep their inodes alive until unmapped
+    for old in base.iterdir():
+        if old.is_dir() and old.name != gen:
+            shutil.rmtree(old, ignore_errors=True)
+    return BuildStats(len(files), len(meta), reindexed, reused, removed, time.perf_counter() - t0, changed=True)
+
+
+# ---- read side ----
+def _map(path: Path) -> Any:
+    if not path.exists() or path.stat().st_size == 0:
+        return b""
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+@dataclass
+class Passage:
+    chunk_id: int
+    score: float
+    path: str
+    title: str
+    start: int
+    end: int
+    text: str
+
+
+class RepoIndex:
+    """Read-only, memory-mapped view of one index generation."""
+
+    def __init__(self, gen_dir: Path):
+        self.dir = gen_dir
+        self._lexicon = _map(gen_dir / "lexicon.dat")
+        self._lex_idx = _map(gen_dir / "lexicon.idx")
+        self._postings = _map(gen_dir / "postings.dat")
+        self._text = _map(gen_dir / "text.dat")
+        self._lengths = _map(gen_dir / "lengths.dat")
+        self.chunks: List[List[Any]] = json.loads((gen_dir / "chunks.json").read_text(encoding="utf-8"))
+        structure = json.loads((gen_dir / "structure.json").read_text(encoding="utf-8"))
+        self.repo: str = structure["repo"]
+        self.root: str = structure["root"]
+        self.pages: List[Dict[str, Any]] = structure["pages"]
+        self.n_terms = len(self._lex_idx) // _LEX.size
+        self.n_chunks = len(self.chunks)
+        self.avg_len = (sum(struct.unpack(f"<{self.n_chunks}I", self._lengths[:]))
+                        / self.n_chunks) if self.n_chunks else 1.0
+        self._by_path: Dict[str, List[int]] = {}
+        for cid, c in enumerate(self.chunks):
+            self._by_path.setdefault(c[0], []).append(cid)
+        vec_path = gen_dir / "vectors.npy"
+        self.vectors = np.load(vec_path, mmap_mode="r") if np is not None and vec_path.exists() else None
+
+    @classmethod
+    def open(cls, repo: str, index_dir: Optional[Path] = None) -> Optional["RepoIndex"]:
+        gen = _current(repo_dir(index_dir or default_index_dir(), repo))
+        return cls(gen) if gen is not None else None
+
+    # ---- lexicon ----
+    def _term(self, i: int) -> bytes:
+        off, length, _, _ = _LEX.unpack_from(self._lex_idx, i * _LEX.size)
+        return self._lexicon[off:off + length]
+
+    def _lookup(self, term: str) -> Optional[Tuple[int, int]]:
+        """(postings offset, df) for term, by binary search over the mapped lexicon."""
+        raw = term.encode("utf-8")
+        lo, hi = 0, self.n_terms
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._term(mid) < raw:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.n_terms and self._term(lo) == raw:
+            _, _, post_off, df = _LEX.unpack_from(self._lex_idx, lo * _LEX.size)
+            return post_off, df
+        return None
+
+    def _iter_postings(self, post_off: int, df: int) -> Iterable[Tuple[int, int]]:
+        return _POST.iter_unpack(self._postings[post_off * _POST.size:(post_off + df) * _POST.size])
+
+    def _length(self, cid: int) -> int:
+        return struct.unpack_from("<I", self._lengths, cid * 4)[0]
+
+    # ---- passages ----
+    def text(self, cid: int) -> str:
+        off, length = self.chunks[cid][5], self.chunks[cid][6]
+        return self._text[off:off + length].decode("utf-8", errors="replace")
+
+    def passage(self, cid: int, score: float = 0.0) -> Passage:
+        path, title, _, start, end, _, _ = self.chunks[cid]
+        return Passage(cid, score, path, title, start, end, self.text(cid))
+
+    def file_chunks(self, path: str) -> List[int]:
+        return self._by_path.get(path, [])
+
+    # ---- search ----
+    def _bm25(self, terms: Sequence[str]) -> Dict[int, float]:
+        found = [(t, hit) for t in dict.fromkeys(terms) if (hit := self._lookup(t)) is not None]
+        # Very common terms add little but cost a full postings scan; drop them when rarer terms exist
+        rare = [(t, hit) for t, hit in found if hit[1] <= self.n_chunks // 2]
+        scores: Dict[int, float] = {}
+        for _, (post_off, df) in rare or found:
+            idf = _bm25_idf(self.n_chunks, df)
+            for cid, tf in self._iter_postings(post_off, df):
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self._length(cid) / self.avg_len)
+                scores[cid] = scores.get(cid, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return scores
+
+    def search(self, query: str, k: int = 5, candidates: int = 100) -> List[Passage]:
+        terms = tokenize(query)
+        scores = self._bm25(terms)
+        if self.vectors is not None and terms and self.n_chunks:
+            # Blend BM25 with hashed-vector cosine; vector-only hits can still surface
+            tf = dict(Counter(terms))
+            idf = {t: _bm25_idf(self.n_chunks, hit[1]) for t in tf if (hit := self._lookup(t)) is not None}
+            qv = _hash_vector(tf, idf)
+            sims = self.vectors @ qv
+            pool = set(sorted(scores, key=scores.get, reverse=True)[:candidates])
+            pool.update(int(i) for i in np.argpartition(-sims, min(k, len(sims) - 1))[:k])
+            top = max(scores.values(), default=0.0) or 1.0
+            scores = {cid: 0.7 * scores.get(cid, 0.0) / top + 0.3 * max(float(sims[cid]), 0.0) for cid in pool}
+        best = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:k]
+        return [self.passage(cid, score) for cid, score in best if score > 0]
+
+    # ---- pages ----
+    def find_page(self, topic: str) -> Optional[Dict[str, Any]]:
+        """Resolve a topic by slug, title or file path, falling back to the closest title."""
+        wanted = slugify(topic)
+        for page in self.pages:
+            if page["slug"] == wanted or page["title"].lower() == topic.lower() or topic in page["files"]:
+                return page
+        q = set(tokenize(topic))
+        if not q:
+            return None
+        scored = [(len(q & set(tokenize(f"{p['title']} {p['slug']}"))), i) for i, p in enumerate(self.pages)]
+        best, i = max(scored, default=(0, -1))
+        return self.pages[i] if best else None
+
+
+def _main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build or update the local DeepWiki index for a repo checkout")
+    parser.add_argument("repo", help="Repo name used by clients, e.g. owner/name")
+    parser.add_argument("path", help="Path to the local checkout")
+    parser.add_argument("--index-dir", type=str, default=None, help="Index directory (default: DEEPWIKI_INDEX_DIR)")
+    parser.add_argument("--vectors", action="store_true", help="Also build hashed-vector embeddings (needs NumPy)")
+    args = parser.parse_args()
+    if args.vectors and np is None:
+        print("NumPy is not installed; building the BM25 index only.")
+    stats = build_index(args.repo, args.path, Path(args.index_dir) if args.index_dir else None, vectors=args.vectors)
+    print(
+        f"{args.repo}: {stats.files} files, {stats.chunks} passages "
+        f"({stats.reindexed} reindexed, {stats.reused} reused, {stats.removed} removed) in {stats.seconds:.2f}s"
+        + ("" if stats.changed else " — index already up to date")
+    )
+
+
+if __name__ == "__main__":
+    _main()
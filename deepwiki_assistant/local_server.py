@@ -0,0 +1,216 @@
+"""
+DeepWiki-compatible MCP server over local repository checkouts.
+
+Implements read_wiki_structure, read_wiki_contents and ask_question (accepting
+both the hosted names repoName/topicName/questionText and repo/topic/question),
+so deepwiki_assistant.client works against it unchanged:
+
+    python -m deepwiki_assistant.local_server --repo owner/name=/path/to/checkout
+    python -m deepwiki_assistant.client --server-url http://127.0.0.1:8020/mcp --repo owner/name --question "..."
+
+Repos are mapped with --repo (repeatable), DEEPWIKI_LOCAL_REPOS
+("owner/name=/path;other/repo=/path") or found under --root /
+DEEPWIKI_LOCAL_ROOT as <root>/<owner>/<name> or <root>/<name>. Indexes
+(see index.py) are built incrementally at startup or on first use, memory-mapped,
+and rescanned in the background every --rescan seconds while serving the old one.
+ask_question answers with the top retrieved passages; no LLM is involved.
+"""
+
+import asyncio
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from fastmcp import FastMCP
+
+from common import tracing
+from deepwiki_assistant.index import RepoIndex, build_index, default_index_dir, vectors_available
+
+mcp = FastMCP("DeepWiki Local Server")
+
+MAX_PAGE_CHARS = 40_000
+MAX_PASSAGE_CHARS = 1_500
+_FENCE_LANG = {".py": "python", ".js": "javascript", ".ts": "typescript", ".go": "go", ".rs": "rust", ".sh": "bash"}
+
+
+class _Repos:
+    """Repo name -> checkout path, and the currently served index for each repo."""
+
+    def __init__(self) -> None:
+        self.paths: Dict[str, str] = {}
+        self.root: Optional[str] = os.getenv("DEEPWIKI_LOCAL_ROOT")
+        self.index_dir: Path = default_index_dir()
+        self.vectors = False
+        self.rescan = 60.0
+        self._indexes: Dict[str, RepoIndex] = {}
+        self._scanned_at: Dict[str, float] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._rescans: Dict[str, asyncio.Task] = {}
+        for pair in filter(None, os.getenv("DEEPWIKI_LOCAL_REPOS", "").split(";")):
+            self.add(pair)
+
+    def add(self, pair: str) -> None:
+        name, sep, path = pair.partition("=")
+        if not sep:
+            raise SystemExit(f"Expected owner/name=/path, got {pair!r}")
+        self.paths[name.strip()] = os.path.expanduser(path.strip())
+
+    def resolve(self, repo: str) -> Tuple[str, str]:
+        repo = repo.strip().removeprefix("https://github.com/").rstrip("/")
+        if repo in self.paths:
+            return repo, self.paths[repo]
+        if self.root:
+            for cand in (Path(self.root) / repo, Path(self.root) / repo.split("/")[-1]):
+                if cand.is_dir():
+                    self.paths[repo] = str(cand)
+                    return repo, str(cand)
+        raise ValueError(f"Repository {repo!r} is not available locally. Known: {', '.join(sorted(self.paths)) or 'none'}")
+
+    def _build(self, repo: str, path: str) -> None:
+        stats = build_index(repo, path, self.index_dir, vectors=self.vectors)
+        self._scanned_at[repo] = time.monotonic()
+        if stats.changed or repo not in self._indexes:
+            index = RepoIndex.open(repo, self.index_dir)
+            if index is not None:
+                self._indexes[repo] = index
+            print(f"[index] {repo}: {stats.files} files, {stats.chunks} passages "
+                  f"({stats.reindexed} reindexed, {stats.reused} reused) in {stats.seconds:.2f}s")
+
+    async def get(self, repo: str) -> RepoIndex:
+        name, path = self.resolve(repo)
+        index = self._indexes.get(name)
+        if index is None:
+            async with self._locks.setdefault(name, asyncio.Lock()):
+                if name not in self._indexes:
+                    with tracing.span("index.build", cat="server", repo=name):
+                        await asyncio.to_thread(self._build, name, path)
+            return self._indexes[name]
+        if self.rescan > 0 and time.monotonic() - self._scanned_at.get(name, 0.0) > self.rescan \
+                and name not in self._rescans:
+            # Keep serving the mapped index; swap in the new generation when the rescan finishes
+            task = asyncio.create_task(asyncio.to_thread(self._build, name, path))
+            self._rescans[name] = task
+            task.add_done_callback(lambda t, n=name: self._rescans.pop(n, None))
+        return index
+
+
+REPOS = _Repos()
+
+
+def _pick(*values: Optional[str]) -> str:
+    for v in values:
+        if v and v.strip():
+            return v.strip()
+    raise ValueError("Missing required argument")
+
+
+def _fence(path: str) -> str:
+    return _FENCE_LANG.get(os.path.splitext(path)[1], "")
+
+
+@mcp.tool(
+    name="read_wiki_structure",
+    description="Get the list of documentation pages (topics) for a locally indexed GitHub repository.",
+)
+async def read_wiki_structure(repoName: Optional[str] = None, repo: Optional[str] = None) -> str:
+    name = _pick(repoName, repo)
+    with tracing.tool_span("tool.read_wiki_structure", repo=name):
+        index = await REPOS.get(name)
+        lines: List[str] = [f"Available pages for {index.repo} (local index: {index.n_chunks} passages):", ""]
+        for page in index.pages:
+            lines.append(f"- {page['slug']}: {page['title']}")
+            for level, heading in page["headings"]:
+                lines.append("  " * (level - 1) + f"- {heading}")
+            if page["kind"] == "source":
+                lines.extend(f"  - {f}" for f in page["files"][:30])
+                if len(page["files"]) > 30:
+                    lines.append(f"  - … {len(page['files']) - 30} more files")
+        return "\n".join(lines)
+
+
+@mcp.tool(
+    name="read_wiki_contents",
+    description="Read one documentation page (by slug or title from read_wiki_structure) of a locally indexed repository.",
+)
+async def read_wiki_contents(
+    repoName: Optional[str] = None,
+    topicName: Optional[str] = None,
+    repo: Optional[str] = None,
+    topic: Optional[str] = None,
+) -> str:
+    name, wanted = _pick(repoName, repo), _pick(topicName, topic)
+    with tracing.tool_span("tool.read_wiki_contents", repo=name, topic=wanted):
+        index = await REPOS.get(name)
+        page = index.find_page(wanted)
+        if page is None:
+            raise ValueError(f"No page matching {wanted!r} in {index.repo}; see read_wiki_structure.")
+        if page["kind"] == "doc":
+            parts = [f"_Source: `{page['files'][0]}`_"]
+            parts.extend(index.text(cid) for cid in index.file_chunks(page["files"][0]))
+        else:
+            parts = [f"# {page['title']}"]
+            for path in page["files"]:
+                ids = index.file_chunks(path)
+                if ids:
+                    head = index.text(ids[0])[:MAX_PASSAGE_CHARS]
+                    parts.append(f"## `{path}`\n\n```{_fence(path)}\n{head}\n```")
+        return "\n\n".join(parts)[:MAX_PAGE_CHARS]
+
+
+@mcp.tool(
+    name="ask_question",
+    description="Ask a question about a locally indexed repository; answers with the most relevant doc and source passages.",
+)
+async def ask_question(
+    repoName: Optional[str] = None,
+    questionText: Optional[str] = None,
+    repo: Optional[str] = None,
+    question: Optional[str] = None,
+    top_k: int = 5,
+) -> str:
+    name, q = _pick(repoName, repo), _pick(questionText, question)
+    with tracing.tool_span("tool.ask_question", repo=name, question=q):
+        index = await REPOS.get(name)
+        t0 = time.perf_counter()
+        with tracing.span("index.search", cat="server"):
+            passages = index.search(q, k=top_k)
+        ms = (time.perf_counter() - t0) * 1000
+        if not passages:
+            return f"No passages in {index.repo} matched the question ({ms:.1f} ms)."
+        parts = [f"Most relevant passages in {index.repo} for: {q} ({len(passages)} passages, {ms:.1f} ms)"]
+        for n, p in enumerate(passages, 1):
+            text = p.text if len(p.text) <= MAX_PASSAGE_CHARS else p.text[:MAX_PASSAGE_CHARS] + "\n…"
+            body = text if p.path.endswith((".md", ".markdown", ".rst", ".txt")) else f"```{_fence(p.path)}\n{text}\n```"
+            parts.append(f"### {n}. `{p.path}` lines {p.start}-{p.end} — {p.title}\n\n{body}")
+        return "\n\n".join(parts)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="DeepWiki-compatible MCP server over local checkouts")
+    parser.add_argument("--repo", action="append", default=[], help="owner/name=/path/to/checkout (repeatable)")
+    parser.add_argument("--root", type=str, default=None, help="Directory holding checkouts as <owner>/<name> or <name>")
+    parser.add_argument("--index-dir", type=str, default=None, help="Index directory (default: DEEPWIKI_INDEX_DIR)")
+    parser.add_argument("--vectors", action="store_true", help="Blend hashed-vector similarity into ranking (needs NumPy)")
+    parser.add_argument("--rescan", type=float, default=60.0, help="Seconds between background re-index checks (0 = never)")
+    parser.add_argument("--port", type=int, default=8020)
+    parser.add_argument("--trace", type=str, default=None, help="Write Chrome-trace/Perfetto JSON spans to this file")
+    args = parser.parse_args()
+    for pair in args.repo:
+        REPOS.add(pair)
+    REPOS.root = args.root or REPOS.root
+    REPOS.index_dir = Path(args.index_dir) if args.index_dir else REPOS.index_dir
+    REPOS.vectors = args.vectors
+    if args.vectors and not vectors_available():
+        print("NumPy is not installed; ranking with BM25 only.")
+    REPOS.rescan = args.rescan
+    if args.trace:
+        tracing.enable(args.trace, process_name="deepwiki_local_server")
+    else:
+        tracing.enable_from_env(process_name="deepwiki_local_server")
+    # Index (or refresh) the configured repos up front so the first question is fast
+    for repo_name, repo_path in list(REPOS.paths.items()):
+        REPOS._build(repo_name, repo_path)
+    asyncio.run(mcp.run_http_async(host="127.0.0.1", port=args.port))
@@ -0,0 +1,238 @@
+"""
+Pool of warm stdio MCP server subprocesses.
+
+client.py spawns `python -m mcp_demo.server` for every run and pays the
+interpreter start, imports and initialize handshake each time. StdioServerPool
+keeps N initialized sessions open instead:
+- call_tool() goes to the ready worker with the fewest outstanding requests;
+- a worker whose process dies (failed call or failed health-check ping) is
+  restarted with backoff; a call that hit a dead worker is retried once on
+  another worker (set retry_on_crash=False for non-idempotent tools);
+- stats() reports per-worker outstanding/calls/errors/restarts and pool totals.
+
+    async with StdioServerPool(demo_server_params(), size=4) as pool:
+        result = await pool.call_tool("add", {"a": 2, "b": 3})
+"""
+
+import asyncio
+import sys
+import time
+from datetime import timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from mcp.client.session import ClientSession
+from mcp.client.stdio import StdioServerParameters, stdio_client
+from mcp.shared.exceptions import McpError
+
+
+def demo_server_params() -> StdioServerParameters:
+    """Parameters for `python -m mcp_demo.server`, same as client.py uses."""
+    return StdioServerParameters(
+        command=sys.executable,
+        args=["-m", "mcp_demo.server"],
+        cwd=str(Path(__file__).resolve().parent.parent),
+    )
+
+
+class WorkerUnavailableError(RuntimeError):
+    """The worker's process or stdio connection went away during a call."""
+
+
+def _is_connection_error(exc: BaseException) -> bool:
+    if isinstance(exc, McpError):
+        # Tool/protocol errors (bad params, request timeout) leave the worker healthy
+        return "connection closed" in str(exc).lower()
+    return not isinstance(exc, (asyncio.TimeoutError, asyncio.CancelledError))
+
+
+class _Worker:
+    def __init__(self, index: int, params: StdioServerParameters):
+        self.index = index
+        self.params = params
+        self.session: Optional[ClientSession] = None
+        self.ready = asyncio.Event()
+        self.outstanding = 0
+        self.calls = 0
+        self.errors = 0
+        self.restarts = 0
+        self.started_at = 0.0
+        self.last_error: Optional[str] = None
+        self._down = asyncio.Event()
+        self._closing = False
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run(), name=f"stdio-worker-{self.index}")
+
+    async def _run(self) -> None:
+        backoff = 0.5
+        while not self._closing:
+            try:
+                # The stdio transport and session must be entered and exited in this task
+                async with stdio_client(self.params) as (read, write):
+                    async with ClientSession(read, write) as session:
+                        await session.initialize()
+                        self.session = session
+                        self.started_at = time.monotonic()
+                        self.ready.set()
+                        backoff = 0.5
+                        await self._down.wait()
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+            finally:
+                self.session = None
+                self.ready.clear()
+            if self._closing:
+                break
+            self.restarts += 1
+            self._down.clear()
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 10.0)
+
+    def mark_down(self, reason: str) -> None:
+        self.last_error = reason
+        self.ready.clear()
+        self._down.set()
+
+    async def close(self) -> None:
+        self._closing = True
+        self._down.set()
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(self._task, timeout=5)
+            except (asyncio.TimeoutError, Exception):
+                self._task.cancel()
+
+
+class StdioServerPool:
+    def __init__(
+        self,
+        params: StdioServerParameters,
+        size: int = 4,
+        call_timeout: float = 60.0,
+        health_interval: float = 5.0,
+        retry_on_crash: bool = True,
+    ):
+        self.params = params
+        self.size = size
+        self.call_timeout = call_timeout
+        self.health_interval = health_interval
+        self.retry_on_crash = retry_on_crash
+        self.workers: List[_Worker] = [_Worker(i, params) for i in range(size)]
+        self._health_task: Optional[asyncio.Task] = None
+        self._retries = 0
+        self._rr = 0
+
+    async def start(self, timeout: float = 30.0) -> "StdioServerPool":
+        """Spawn all workers and wait until every one has finished initialize."""
+        try:
+            for w in self.workers:
+                w.start()
+            await asyncio.wait_for(asyncio.gather(*(w.ready.wait() for w in self.workers)), timeout=timeout)
+        except BaseException:
+            # __aexit__ doesn't run when __aenter__ raises: stop the workers that did start
+            await self.close()
+            raise
+        if self.health_interval > 0:
+            self._health_task = asyncio.create_task(self._health_loop())
+        return self
+
+    async def close(self) -> None:
+        if self._health_task is not None:
+            self._health_task.cancel()
+        await asyncio.gather(*(w.close() for w in self.workers))
+
+    async def __aenter__(self) -> "StdioServerPool":
+        return await self.start()
+
+    async def __aexit__(self, *exc: Any) -> None:
+        await self.close()
+
+    async def _pick(self, exclude: Optional[_Worker] = None) -> _Worker:
+        """Ready worker with the fewest outstanding requests (round-robin among ties)."""
+        while True:
+            ready = [w for w in self.workers if w.ready.is_set() and w.session is not None and w is not exclude]
+            if ready:
+                self._rr += 1
+                n = len(ready)
+                return min((ready[(self._rr + i) % n] for i in range(n)), key=lambda w: w.outstanding)
+            # Everyone is restarting: wait for the first worker to come back
+            waiters = [asyncio.create_task(w.ready.wait()) for w in self.workers if w is not exclude]
+            try:
+                await asyncio.wait_for(asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED), self.call_timeout)
+            finally:
+                for t in waiters:
+                    t.cancel()
+            exclude = None
+
+    async def _call(self, worker: _Worker, name: str, arguments: Optional[Dict[str, Any]], timeout: float) -> Any:
+        session = worker.session
+        if session is None:
+            raise WorkerUnavailableError(f"worker {worker.index} is restarting")
+        worker.outstanding += 1
+        worker.calls += 1
+        try:
+            return await session.call_tool(name, arguments or {}, read_timeout_seconds=timedelta(seconds=timeout))
+        except Exception as e:
+            worker.errors += 1
+            if _is_connection_error(e):
+                worker.mark_down(f"{type(e).__name__}: {e}")
+                raise WorkerUnavailableError(f"worker {worker.index} failed: {e}") from e
+            raise
+        finally:
+            worker.outstanding -= 1
+
+    async def call_tool(self, name: str, arguments: Optional[Dict[str, Any]] = None,
+                        timeout: Optional[float] = None) -> Any:
+        """Call a tool on the least-loaded worker; returns the mcp CallToolResult."""
+        timeout = timeout or self.call_timeout
+        worker = await self._pick()
+        try:
+            return await self._call(worker, name, arguments, timeout)
+        except WorkerUnavailableError:
+            if not self.retry_on_crash:
+                raise
+            self._retries += 1
+            return await self._call(await self._pick(exclude=worker), name, arguments, timeout)
+
+    async def list_tools(self) -> Any:
+        worker = await self._pick()
+        return await worker.session.list_tools()  # type: ignore[union-attr]
+
+    async def _health_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.health_interval)
+            for w in self.workers:
+                if w.session is None or not w.ready.is_set():
+                    continue
+                try:
+                    await asyncio.wait_for(w.session.send_ping(), timeout=min(5.0, self.health_interval))
+                except Exception as e:
+                    w.mark_down(f"health check failed: {type(e).__name__}: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        workers = [
+            {
+                "index": w.index,
+                "ready": w.ready.is_set(),
+                "outstanding": w.outstanding,
+                "calls": w.calls,
+                "errors": w.errors,
+                "restarts": w.restarts,
+                "uptime_s": round(now - w.started_at, 1) if w.ready.is_set() else 0.0,
+                "last_error": w.last_error,
+            }
+            for w in self.workers
+        ]
+        return {
+            "size": self.size,
+            "ready": sum(1 for w in workers if w["ready"]),
+            "outstanding": sum(w["outstanding"] for w in workers),
+            "calls": sum(w["calls"] for w in workers),
+            "errors": sum(w["errors"] for w in workers),
+            "restarts": sum(w["restarts"] for w in workers),
+            "retries": self._retries,
+            "workers": workers,
+        }
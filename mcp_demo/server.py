@@ -1,10 +1,11 @@
 import asyncio
 import os
 from mcp.server import FastMCP
-import google.generativeai as genai
 from dotenv import load_dotenv
 from pathlib import Path
 
+from common.llm_gateway import get_gateway
+
 mcp = FastMCP(name="demo-server")
 
 
@@ -39,17 +40,16 @@ async def gemini_complete(prompt: str, model: str = "gemini-1.5-flash") -> str:
     if not api_key:
         raise RuntimeError("GOOGLE_API_KEY is not set in environment")
 
-    # Configure the client once per call (simple and safe). You could move to startup if desired.
-    genai.configure(api_key=api_key)
-    model_client = genai.GenerativeModel(model)
+    # Shared gateway: rate limits, retries with backoff, and a concurrency cap.
+    # The caller picked the model explicitly, so don't silently switch to another one.
+    # Identical concurrent prompts (e.g. many clients sending the same request) share one upstream call.
+    return await get_gateway().generate(prompt, model=model, fallback_model=None, coalesce=True)
 
-    def _run_sync():
-        resp = model_client.generate_content(prompt)
-        # The SDK can return candidates; `.text` extracts primary text
-        return getattr(resp, "text", "") or ""
 
-    # Run blocking SDK call in a background thread
-    return await asyncio.to_thread(_run_sync)
+@mcp.tool()
+async def llm_stats() -> dict:
+    """Counters from the shared Gemini gateway (calls, retries, throttled, failed, queue/rate waits)."""
+    return get_gateway().stats()
 
 
 async def main() -> None:
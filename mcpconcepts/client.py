@@ -14,4 +14,10 @@ async def main():
         text_result = await text_client.call_tool("reverse", {"text": "hello"})
         print("Text Result:", text_result.content[0].text)
 
+        # Batch tools: many items per round trip (JSON lists, or packed base64 via mcpconcepts.packing)
+        batch_result = await math_client.call_tool("multiply_batch", {"a": [1, 2, 3], "b": [4, 5, 6]})
+        print("Batch Math Result:", batch_result.content[0].text)
+        batch_text = await text_client.call_tool("reverse_batch", {"texts": ["hello", "world"]})
+        print("Batch Text Result:", batch_text.content[0].text)
+
 asyncio.run(main())
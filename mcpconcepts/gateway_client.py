@@ -0,0 +1,37 @@
+import asyncio
+import json
+
+from fastmcp import Client
+
+# One connection to the gateway (mcpconcepts/gateway_server.py) instead of one per backend server.
+# Tools are namespaced by backend: math_multiply, text_reverse, resources_check_resource, ...
+GATEWAY_URL = "http://127.0.0.1:8100/mcp"
+
+
+async def main():
+    async with Client(GATEWAY_URL) as client:
+        tools = await client.list_tools()
+        print("Tools:", ", ".join(t.name for t in tools))
+
+        math_result = await client.call_tool("math_multiply", {"a": 6, "b": 7})
+        print("Math Result:", math_result.content[0].text)
+
+        text_result = await client.call_tool("text_reverse", {"text": "hello"})
+        print("Text Result:", text_result.content[0].text)
+
+        # Backend calls run concurrently over the gateway's pooled sessions
+        products = await asyncio.gather(*(client.call_tool("math_multiply", {"a": i, "b": i}) for i in range(10)))
+        print("Squares:", [r.content[0].text for r in products])
+
+        # Resources are namespaced as <scheme>://<backend>/<path>
+        for r in await client.list_resources():
+            print("Resource:", r.uri)
+        hello = await client.read_resource("res://resources/hello.txt")
+        print("res://resources/hello.txt:", hello[0].text.strip())
+
+        stats = await client.call_tool("gateway_stats", {})
+        print("\nGateway stats:", json.dumps(json.loads(stats.content[0].text)["backends"], indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,395 @@
+"""
+Aggregating MCP gateway: one endpoint in front of several backend MCP servers.
+
+Agents connect once to http://127.0.0.1:8100/mcp instead of to every server.
+- Backend tools and prompts appear as "<backend>_<name>" (e.g. math_multiply),
+  resources as "<scheme>://<backend>/<path>" (e.g. res://resources/hello.txt).
+- Each backend has a small pool of persistent sessions; calls go to the session
+  with the fewest in-flight requests, under a per-backend concurrency limit.
+- list_tools / list_resources / list_prompts fan out to all healthy backends
+  concurrently and the merged catalog is cached (--catalog-ttl). It is
+  refreshed early when a backend reports a list change or comes back up.
+- Sessions are pinged every --health-interval seconds. A backend with no live
+  session is marked down and left out of the catalog; its calls fail fast.
+  Its sessions reconnect with backoff.
+- The gateway_stats tool reports per-backend health, load, errors and latency.
+
+Backends: --backend name=url (repeatable) or MCP_GATEWAY_BACKENDS
+("math=http://127.0.0.1:8000/mcp,text=http://127.0.0.1:8001/mcp"); by default
+the mcpconcepts servers on ports 8000-8003.
+
+    python -m mcpconcepts.gateway_server --port 8100
+"""
+
+import asyncio
+import base64
+import json
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import mcp.types as types
+import uvicorn
+from fastmcp import Client
+from mcp.server.lowlevel import Server
+from mcp.server.lowlevel.helper_types import ReadResourceContents
+from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
+from mcp.shared.exceptions import McpError
+from pydantic import AnyUrl
+from starlette.applications import Starlette
+from starlette.routing import Mount
+
+DEFAULT_BACKENDS = {
+    "math": "http://127.0.0.1:8000/mcp",
+    "text": "http://127.0.0.1:8001/mcp",
+    "prompts": "http://127.0.0.1:8002/mcp",
+    "resources": "http://127.0.0.1:8003/mcp",
+}
+LIST_CHANGED = (
+    types.ToolListChangedNotification,
+    types.ResourceListChangedNotification,
+    types.PromptListChangedNotification,
+)
+
+
+class BackendUnavailableError(RuntimeError):
+    """The backend has no live session (down or reconnecting)."""
+
+
+class _Session:
+    """One persistent client session to a backend, reconnected with backoff when it drops."""
+
+    def __init__(self, backend: "Backend", index: int):
+        self.backend = backend
+        self.index = index
+        self.client: Optional[Client] = None
+        self.ready = asyncio.Event()
+        self.in_flight = 0
+        self._down = asyncio.Event()
+        self._closing = False
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run(), name=f"gateway-{self.backend.name}-{self.index}")
+
+    async def _run(self) -> None:
+        backoff = 0.5
+        while not self._closing:
+            try:
+                client = Client(self.backend.url, message_handler=self.backend.on_message)
+                async with client:
+                    self.client = client
+                    self.ready.set()
+                    self.backend.on_session_up()
+                    backoff = 0.5
+                    await self._down.wait()
+            except Exception as e:
+                self.backend.last_error = f"{type(e).__name__}: {e}"
+            finally:
+                self.client = None
+                self.ready.clear()
+            if self._closing:
+                break
+            self._down.clear()
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 15.0)
+
+    def mark_down(self, reason: str) -> None:
+        self.backend.last_error = reason
+        self.ready.clear()
+        self._down.set()
+
+    async def close(self) -> None:
+        self._closing = True
+        self._down.set()
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(self._task, timeout=5)
+            except Exception:
+                self._task.cancel()
+
+
+class Backend:
+    def __init__(self, gateway: "Gateway", name: str, url: str, pool_size: int, max_concurrency: int,
+                 call_timeout: float):
+        self.gateway = gateway
+        self.name = name
+        self.url = url
+        self.call_timeout = call_timeout
+        self.sem = asyncio.Semaphore(max_concurrency)
+        self.max_concurrency = max_concurrency
+        self.sessions = [_Session(self, i) for i in range(pool_size)]
+        self.calls = 0
+        self.errors = 0
+        self.last_error: Optional[str] = None
+        self.latencies: Deque[float] = deque(maxlen=200)
+
+    @property
+    def healthy(self) -> bool:
+        return any(s.ready.is_set() for s in self.sessions)
+
+    def on_session_up(self) -> None:
+        self.gateway.invalidate()  # a (re)connected backend may bring new tools
+
+    async def on_message(self, message: Any) -> None:
+        if isinstance(getattr(message, "root", message), LIST_CHANGED):
+            self.gateway.invalidate()
+
+    def _pick(self) -> _Session:
+        ready = [s for s in self.sessions if s.ready.is_set() and s.client is not None]
+        if not ready:
+            raise BackendUnavailableError(f"backend {self.name} is unavailable ({self.last_error or 'connecting'})")
+        return min(ready, key=lambda s: s.in_flight)
+
+    async def request(self, fn_name: str, *args: Any, timeout: Optional[float] = None) -> Any:
+        """Run client.<fn_name>(*args) on the least-busy session, under this backend's limit."""
+        async with self.sem:
+            session = self._pick()
+            session.in_flight += 1
+            self.calls += 1
+            started = time.monotonic()
+            try:
+                return await asyncio.wait_for(getattr(session.client, fn_name)(*args), timeout or self.call_timeout)
+            except Exception as e:
+                self.errors += 1
+                if not isinstance(e, (asyncio.TimeoutError, McpError)):  # protocol errors leave the session usable
+                    session.mark_down(f"{type(e).__name__}: {e}")
+                raise
+            finally:
+                session.in_flight -= 1
+                self.latencies.append(time.monotonic() - started)
+
+    async def catalog(self, timeout: float) -> Dict[str, List[Any]]:
+        async def _list(fn_name: str) -> List[Any]:
+            try:
+                return list(await self.request(fn_name, timeout=timeout))
+            except BackendUnavailableError:
+                raise
+            except Exception:
+                return []  # e.g. a server without prompts
+
+        tools, resources, prompts = await asyncio.gather(_list("list_tools"), _list("list_resources"), _list("list_prompts"))
+        return {"tools": tools, "resources": resources, "prompts": prompts}
+
+    async def health_check(self) -> None:
+        for s in self.sessions:
+            if s.client is None or not s.ready.is_set():
+                continue
+            try:
+                await asyncio.wait_for(s.client.ping(), timeout=5)
+            except Exception as e:
+                s.mark_down(f"health check failed: {type(e).__name__}: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        lat = sorted(self.latencies)
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "sessions_ready": sum(1 for s in self.sessions if s.ready.is_set()),
+            "in_flight": sum(s.in_flight for s in self.sessions),
+            "max_concurrency": self.max_concurrency,
+            "calls": self.calls,
+            "errors": self.errors,
+            "p50_ms": round(lat[len(lat) // 2] * 1000, 2) if lat else None,
+            "last_error": self.last_error,
+        }
+
+
+def _ns_uri(ns: str, uri: str) -> str:
+    scheme, sep, rest = uri.partition("://")
+    return f"{scheme}://{ns}/{rest}" if sep else f"{ns}/{uri}"
+
+
+class Gateway:
+    def __init__(self, backends: Dict[str, str], pool_size: int = 2, max_concurrency: int = 16,
+                 call_timeout: float = 60.0, catalog_ttl: float = 30.0, health_interval: float = 10.0):
+        self.backends = {
+            name: Backend(self, name, url, pool_size, max_concurrency, call_timeout) for name, url in backends.items()
+        }
+        self.catalog_ttl = catalog_ttl
+        self.health_interval = health_interval
+        self._merged: Optional[Dict[str, Any]] = None
+        self._merged_at = 0.0
+        self._catalog_lock = asyncio.Lock()
+        self._health_task: Optional[asyncio.Task] = None
+        self.catalog_refreshes = 0
+
+    async def start(self) -> None:
+        for b in self.backends.values():
+            for s in b.sessions:
+                s.start()
+        # Don't block startup on a dead backend; give the live ones a moment to connect
+        waits = [s.ready.wait() for b in self.backends.values() for s in b.sessions]
+        await asyncio.wait([asyncio.ensure_future(w) for w in waits], timeout=5)
+        if self.health_interval > 0:
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def close(self) -> None:
+        if self._health_task is not None:
+            self._health_task.cancel()
+        await asyncio.gather(*(s.close() for b in self.backends.values() for s in b.sessions))
+
+    async def _health_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.health_interval)
+            was = {n: b.healthy for n, b in self.backends.items()}
+            await asyncio.gather(*(b.health_check() for b in self.backends.values()))
+            if any(b.healthy != was[n] for n, b in self.backends.items()):
+                self.invalidate()
+
+    def invalidate(self) -> None:
+        self._merged = None
+
+    async def catalog(self) -> Dict[str, Any]:
+        """Merged, namespaced catalog of all healthy backends (cached for catalog_ttl seconds)."""
+        if self._merged is not None and time.monotonic() - self._merged_at < self.catalog_ttl:
+            return self._merged
+        async with self._catalog_lock:
+            if self._merged is not None and time.monotonic() - self._merged_at < self.catalog_ttl:
+                return self._merged
+            live = [b for b in self.backends.values() if b.healthy]
+            results = await asyncio.gather(*(b.catalog(timeout=10) for b in live), return_exceptions=True)
+            merged: Dict[str, Any] = {"tools": [], "resources": [], "prompts": [], "routes": {}, "uris": {}}
+            for b, res in zip(live, results):
+                if isinstance(res, BaseException):
+                    continue
+                for t in res["tools"]:
+                    name = f"{b.name}_{t.name}"
+                    merged["routes"][name] = (b.name, t.name)
+                    merged["tools"].append(t.model_copy(update={"name": name, "description": f"[{b.name}] {t.description or ''}"}))
+                for p in res["prompts"]:
+                    name = f"{b.name}_{p.name}"
+                    merged["routes"][name] = (b.name, p.name)
+                    merged["prompts"].append(p.model_copy(update={"name": name}))
+                for r in res["resources"]:
+                    uri = _ns_uri(b.name, str(r.uri))
+                    merged["uris"][uri] = (b.name, str(r.uri))
+                    merged["resources"].append(r.model_copy(update={"uri": AnyUrl(uri)}))
+            self._merged, self._merged_at = merged, time.monotonic()
+            self.catalog_refreshes += 1
+            return merged
+
+    async def _route(self, table: str, key: str) -> Tuple[Backend, str]:
+        cat = await self.catalog()
+        if key not in cat[table]:
+            self.invalidate()  # maybe a backend added it since the last refresh
+            cat = await self.catalog()
+        if key not in cat[table]:
+            raise ValueError(f"Unknown {'resource' if table == 'uris' else 'tool or prompt'}: {key}")
+        backend, original = cat[table][key]
+        return self.backends[backend], original
+
+    async def call_tool(self, name: str, arguments: Dict[str, Any]) -> List[Any]:
+        if name == "gateway_stats":
+            return [types.TextContent(type="text", text=json.dumps(self.stats(), indent=2))]
+        backend, original = await self._route("routes", name)
+        result = await backend.request("call_tool_mcp", original, arguments or {})
+        if getattr(result, "isError", False):
+            raise RuntimeError(" ".join(getattr(c, "text", "") for c in result.content) or f"{name} failed")
+        return list(result.content)
+
+    async def read_resource(self, uri: str) -> List[ReadResourceContents]:
+        backend, original = await self._route("uris", uri)
+        contents = await backend.request("read_resource", original)
+        out = []
+        for c in contents:
+            if getattr(c, "text", None) is not None:
+                out.append(ReadResourceContents(content=c.text, mime_type=c.mimeType))
+            else:
+                out.append(ReadResourceContents(content=base64.b64decode(c.blob), mime_type=c.mimeType))
+        return out
+
+    async def get_prompt(self, name: str, arguments: Optional[Dict[str, str]]) -> types.GetPromptResult:
+        backend, original = await self._route("routes", name)
+        return await backend.request("get_prompt_mcp", original, arguments or {})
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backends": {n: b.stats() for n, b in self.backends.items()},
+            "catalog_age_s": round(time.monotonic() - self._merged_at, 1) if self._merged else None,
+            "catalog_refreshes": self.catalog_refreshes,
+        }
+
+
+STATS_TOOL = types.Tool(
+    name="gateway_stats",
+    description="Gateway health and load: per-backend sessions, in-flight calls, errors and latency.",
+    inputSchema={"type": "object", "properties": {}},
+)
+
+
+def build_app(gateway: Gateway) -> Starlette:
+    server = Server("MCP Gateway")
+
+    @server.list_tools()
+    async def _list_tools() -> List[types.Tool]:
+        return [STATS_TOOL, *(await gateway.catalog())["tools"]]
+
+    @server.call_tool()
+    async def _call_tool(name: str, arguments: Dict[str, Any]) -> List[Any]:
+        return await gateway.call_tool(name, arguments)
+
+    @server.list_resources()
+    async def _list_resources() -> List[types.Resource]:
+        return (await gateway.catalog())["resources"]
+
+    @server.read_resource()
+    async def _read_resource(uri: AnyUrl) -> List[ReadResourceContents]:
+        return await gateway.read_resource(str(uri))
+
+    @server.list_prompts()
+    async def _list_prompts() -> List[types.Prompt]:
+        return (await gateway.catalog())["prompts"]
+
+    @server.get_prompt()
+    async def _get_prompt(name: str, arguments: Optional[Dict[str, str]]) -> types.GetPromptResult:
+        return await gateway.get_prompt(name, arguments)
+
+    manager = StreamableHTTPSessionManager(app=server)
+
+    async def handle(scope, receive, send) -> None:
+        await manager.handle_request(scope, receive, send)
+
+    @asynccontextmanager
+    async def lifespan(app):
+        async with manager.run():
+            await gateway.start()
+            try:
+                yield
+            finally:
+                await gateway.close()
+
+    return Starlette(routes=[Mount("/mcp", app=handle)], lifespan=lifespan)
+
+
+def _parse_backends(pairs: List[str]) -> Dict[str, str]:
+    backends: Dict[str, str] = {}
+    for pair in pairs:
+        name, sep, url = pair.partition("=")
+        if not sep or not name.strip() or not url.strip():
+            raise SystemExit(f"Expected name=url, got {pair!r}")
+        backends[name.strip()] = url.strip()
+    return backends
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Aggregating MCP gateway over several backend servers")
+    parser.add_argument("--backend", action="append", default=[], help="name=url of a backend (repeatable)")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--pool-size", type=int, default=2, help="Persistent sessions per backend")
+    parser.add_argument("--max-concurrency", type=int, default=16, help="In-flight calls per backend")
+    parser.add_argument("--call-timeout", type=float, default=60.0, help="Per-call timeout (s)")
+    parser.add_argument("--catalog-ttl", type=float, default=30.0, help="Seconds to cache the merged catalog")
+    parser.add_argument("--health-interval", type=float, default=10.0, help="Seconds between backend pings (0 = off)")
+    args = parser.parse_args()
+
+    env_pairs = [p for p in os.getenv("MCP_GATEWAY_BACKENDS", "").split(",") if p.strip()]
+    backends = _parse_backends(args.backend or env_pairs) or dict(DEFAULT_BACKENDS)
+    gateway = Gateway(backends, pool_size=args.pool_size, max_concurrency=args.max_concurrency,
+                      call_timeout=args.call_timeout, catalog_ttl=args.catalog_ttl,
+                      health_interval=args.health_interval)
+    uvicorn.run(build_app(gateway), host="127.0.0.1", port=args.port, log_level="warning")
@@ -1,5 +1,8 @@
 from fastmcp import FastMCP
 import asyncio
+from typing import List, Optional, Union
+
+from mcpconcepts.packing import DTYPES, np, pack_array, unpack_array
 
 mcp = FastMCP("Math Server")
 
@@ -7,5 +10,61 @@ mcp = FastMCP("Math Server")
 def multiply(a: int, b: int) -> int:
     return a * b
 
+@mcp.tool
+def multiply_batch(
+    a: Optional[List[Union[int, float]]] = None,
+    b: Optional[List[Union[int, float]]] = None,
+    a_b64: Optional[str] = None,
+    b_b64: Optional[str] = None,
+    dtype: str = "int64",
+) -> dict:
+    """Element-wise a * b for equal-length arrays, in one call.
+
+    Pass JSON lists (a, b) or packed base64 arrays (a_b64, b_b64, see
+    mcpconcepts/packing.py). Packed input gets packed output ({"result_b64", "dtype", "count"}),
+    JSON input gets {"result": [...]}. int64 products wrap around on overflow.
+    JSON lists holding any float are multiplied as float64 whatever dtype says.
+    """
+    binary = a_b64 is not None or b_b64 is not None
+    if binary:
+        if a_b64 is None or b_b64 is None:
+            raise ValueError("Pass both a_b64 and b_b64")
+        xs, ys = unpack_array(a_b64, dtype), unpack_array(b_b64, dtype)
+    else:
+        if a is None or b is None:
+            raise ValueError("Pass both a and b (or a_b64 and b_b64)")
+        xs, ys = a, b
+        if dtype.startswith("int") and any(isinstance(v, float) for v in (*xs, *ys)):
+            dtype = "float64"  # an integer dtype would truncate (or, without NumPy, wrap) the floats
+    if len(xs) != len(ys):
+        raise ValueError(f"Length mismatch: {len(xs)} vs {len(ys)}")
+
+    if np is not None:
+        if dtype not in DTYPES:
+            raise ValueError(f"Unsupported dtype {dtype!r}")
+        kind = DTYPES[dtype][0]
+        with np.errstate(over="ignore"):
+            out = np.multiply(np.asarray(xs, dtype=kind), np.asarray(ys, dtype=kind))
+    else:
+        out = [x * y for x, y in zip(xs, ys)]
+        if dtype.startswith("int"):
+            bits = 32 if dtype == "int32" else 64
+            out = [((v + (1 << (bits - 1))) % (1 << bits)) - (1 << (bits - 1)) for v in out]
+        else:
+            out = [float(v) for v in out]
+
+    if binary:
+        return {"result_b64": pack_array(out, dtype), "dtype": dtype, "count": len(out)}
+    return {"result": out.tolist() if hasattr(out, "tolist") else out}
+
 if __name__ == "__main__":
-    asyncio.run(mcp.run_http_async(host="127.0.0.1", port=8000))
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Math MCP server")
+    parser.add_argument("--transport", choices=["http", "stdio"], default="http", help="Serve over streamable HTTP or stdio")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+    if args.transport == "stdio":
+        asyncio.run(mcp.run_stdio_async())
+    else:
+        asyncio.run(mcp.run_http_async(host="127.0.0.1", port=args.port))
@@ -0,0 +1,69 @@
+"""
+Compact binary payloads for the batch tools.
+
+Numbers and strings in JSON cost several bytes each plus parsing, so the batch
+tools also accept/return base64 strings of packed data:
+- arrays: little-endian values of `dtype` (int32, int64, float32, float64);
+- string lists: uint32 count, uint32 byte length per string, then the UTF-8 bytes.
+NumPy is used when installed; the array module is the fallback.
+"""
+
+import base64
+import struct
+import sys
+from array import array
+from typing import Any, List, Sequence
+
+try:
+    import numpy as np  # type: ignore
+except ImportError:  # pragma: no cover - optional
+    np = None  # type: ignore
+
+# dtype -> (numpy dtype, array typecode)
+DTYPES = {"int32": ("<i4", "i"), "int64": ("<i8", "q"), "float32": ("<f4", "f"), "float64": ("<f8", "d")}
+
+
+def _check(dtype: str) -> None:
+    if dtype not in DTYPES:
+        raise ValueError(f"Unsupported dtype {dtype!r}; use one of {', '.join(DTYPES)}")
+
+
+def pack_array(values: Any, dtype: str = "int64") -> str:
+    _check(dtype)
+    if np is not None:
+        return base64.b64encode(np.asarray(values, dtype=DTYPES[dtype][0]).tobytes()).decode("ascii")
+    arr = array(DTYPES[dtype][1], values)
+    if sys.byteorder == "big":
+        arr.byteswap()
+    return base64.b64encode(arr.tobytes()).decode("ascii")
+
+
+def unpack_array(data: str, dtype: str = "int64") -> Any:
+    """NumPy array (or array.array without NumPy) from a pack_array() payload."""
+    _check(dtype)
+    raw = base64.b64decode(data)
+    if np is not None:
+        return np.frombuffer(raw, dtype=DTYPES[dtype][0])
+    arr = array(DTYPES[dtype][1])
+    arr.frombytes(raw)
+    if sys.byteorder == "big":
+        arr.byteswap()
+    return arr
+
+
+def pack_strings(texts: Sequence[str]) -> str:
+    encoded = [t.encode("utf-8") for t in texts]
+    header = struct.pack(f"<I{len(encoded)}I", len(encoded), *(len(e) for e in encoded))
+    return base64.b64encode(header + b"".join(encoded)).decode("ascii")
+
+
+def unpack_strings(data: str) -> List[str]:
+    raw = base64.b64decode(data)
+    (count,) = struct.unpack_from("<I", raw, 0)
+    lengths = struct.unpack_from(f"<{count}I", raw, 4)
+    out: List[str] = []
+    pos = 4 + 4 * count
+    for n in lengths:
+        out.append(raw[pos:pos + n].decode("utf-8"))
+        pos += n
+    return out
@@ -1,5 +1,10 @@
 import asyncio
+import hashlib
+import json
+from typing import Any, Dict, Optional, Set
+
 from fastmcp import Client
+from mcp import types
 
 SERVER_URL = "http://127.0.0.1:8003/mcp"
 HELLO_URI = "res://hello.txt"
@@ -21,23 +26,93 @@ def _extract_text_from_resource(res_read) -> str:
     return contents[0].text
 
 
+class ResourceCache:
+    """
+    Local cache of resource contents keyed by URI.
+
+    Subscribed resources are served from the cache until the server sends
+    resources/updated for them. Other resources are revalidated with the
+    server's check_resource tool: one small call that compares content hashes
+    instead of transferring the content again.
+    """
+
+    def __init__(self):
+        self.client: Optional[Client] = None
+        self.entries: Dict[str, Dict[str, Any]] = {}  # uri -> {"text", "sha256"}
+        self.subscribed: Set[str] = set()
+        self.stale: Set[str] = set()
+        self.stats = {"hits": 0, "revalidated": 0, "reads": 0, "invalidations": 0}
+
+    async def on_message(self, message: Any) -> None:
+        """fastmcp message_handler: invalidate entries on resources/updated."""
+        root = getattr(message, "root", message)
+        if isinstance(root, types.ResourceUpdatedNotification):
+            uri = str(root.params.uri)
+            self.stale.add(uri)
+            self.stats["invalidations"] += 1
+            print(f"  (server: {uri} changed)")
+
+    async def load_versions(self) -> None:
+        """Mark cached entries stale when list_resources reports a different hash in _meta."""
+        for r in await self.client.list_resources():
+            meta = getattr(r, "meta", None) or {}
+            if "sha256" in meta and str(r.uri) in self.entries and self.entries[str(r.uri)]["sha256"] != meta["sha256"]:
+                self.stale.add(str(r.uri))
+
+    async def subscribe(self, uri: str) -> None:
+        await self.client.session.subscribe_resource(uri)
+        self.subscribed.add(uri)
+
+    async def _read(self, uri: str) -> str:
+        text = _extract_text_from_resource(await self.client.read_resource(uri))
+        # The server hashes the same text, so the local digest is what check_resource compares against
+        self.entries[uri] = {"text": text, "sha256": hashlib.sha256(text.encode("utf-8")).hexdigest()}
+        self.stale.discard(uri)
+        self.stats["reads"] += 1
+        return text
+
+    async def get(self, uri: str) -> str:
+        entry = self.entries.get(uri)
+        if entry is None or uri in self.stale:
+            return await self._read(uri)
+        if uri in self.subscribed:
+            self.stats["hits"] += 1
+            return entry["text"]
+        check = json.loads((await self.client.call_tool(
+            "check_resource", {"uri": uri, "sha256": entry["sha256"]}
+        )).content[0].text)
+        self.stats["revalidated"] += 1
+        if check["changed"]:
+            return await self._read(uri)
+        self.stats["hits"] += 1
+        return entry["text"]
+
+
 async def main():
-    client = Client(SERVER_URL)
+    cache = ResourceCache()
+    client = Client(SERVER_URL, message_handler=cache.on_message)
+    cache.client = client
     async with client:
-        # List resources
+        # List resources (with version metadata)
         res_list = await client.list_resources()
-        print("Resources:", [getattr(r, "uri", str(r)) for r in res_list])
+        for r in res_list:
+            print("Resource:", getattr(r, "uri", str(r)), getattr(r, "meta", None) or {})
 
         # Read static text resource
-        hello_read = await client.read_resource(HELLO_URI)
-        hello_text = _extract_text_from_resource(hello_read)
+        hello_text = await cache.get(HELLO_URI)
         print(f"\nRead {HELLO_URI}:\n{hello_text}")
 
-        # Read dynamic time resource
-        time_read = await client.read_resource(TIME_URI)
-        time_text = _extract_text_from_resource(time_read)
+        # Read dynamic time resource, then follow its updates via notifications instead of polling
+        await cache.subscribe(TIME_URI)
+        time_text = await cache.get(TIME_URI)
         print(f"\nRead {TIME_URI}:\n{time_text}")
 
+        for _ in range(3):
+            await asyncio.sleep(3)
+            print(f"{TIME_URI}: {await cache.get(TIME_URI)}   {HELLO_URI}: {(await cache.get(HELLO_URI)).strip()}")
+        await cache.load_versions()
+        print("\nCache stats:", cache.stats)
+
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -1,13 +1,111 @@
 from fastmcp import FastMCP
+from fastmcp.server.middleware import Middleware, MiddlewareContext
 import asyncio
-from datetime import datetime
+import hashlib
+import json
+import os
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, Set
+
+from pydantic import AnyUrl
+
+# Simple MCP server exposing one static and one dynamic resource.
+# Every resource has a content hash and a version number:
+# - list_resources carries them in each resource's _meta ({"sha256", "version", "updated_at"});
+# - check_resource(uri, sha256) revalidates without transferring the content;
+# - subscribers get resources/updated notifications when a resource changes.
+
+HELLO_URI = "res://hello.txt"
+TIME_URI = "res://time.json"
+# res://time.json is a snapshot refreshed every TIME_INTERVAL seconds (not regenerated per read)
+TIME_INTERVAL = float(os.getenv("TIME_RESOURCE_INTERVAL", "5"))
+
+_CONTENT: Dict[str, str] = {}
+_VERSIONS: Dict[str, Dict[str, Any]] = {}
+_SUBSCRIBERS: Dict[str, Set[Any]] = {}
+
+
+def _publish(uri: str, content: str) -> bool:
+    """Store new content for uri; bumps the version and returns True if it changed."""
+    digest = hashlib.sha256(content.encode("utf-8")).hexdigest()
+    current = _VERSIONS.get(uri)
+    if current is not None and current["sha256"] == digest:
+        return False
+    _CONTENT[uri] = content
+    _VERSIONS[uri] = {
+        "sha256": digest,
+        "version": (current["version"] + 1) if current else 1,
+        "updated_at": datetime.now(timezone.utc).isoformat(),
+    }
+    return True
+
+
+def _time_snapshot() -> str:
+    now = datetime.now(timezone.utc).replace(tzinfo=None).isoformat() + "Z"
+    return f'{{"utc":"{now}"}}'
+
+
+_publish(HELLO_URI, "Hello from a static FastMCP resource!\n")
+_publish(TIME_URI, _time_snapshot())
+
+
+async def _notify(uri: str) -> None:
+    for session in list(_SUBSCRIBERS.get(uri, ())):
+        try:
+            await session.send_resource_updated(AnyUrl(uri))
+        except Exception:
+            _SUBSCRIBERS[uri].discard(session)  # client went away
+
+
+async def _tick_time() -> None:
+    while True:
+        await asyncio.sleep(TIME_INTERVAL)
+        if _publish(TIME_URI, _time_snapshot()):
+            await _notify(TIME_URI)
+
+
+@asynccontextmanager
+async def _lifespan(server):
+    task = asyncio.create_task(_tick_time())
+    try:
+        yield
+    finally:
+        task.cancel()
+
+
+mcp = FastMCP("Simple Resources Server", lifespan=_lifespan)
+
+
+class VersionMetadata(Middleware):
+    """Adds {"sha256", "version", "updated_at"} to each listed resource's _meta."""
+
+    async def on_list_resources(self, context: MiddlewareContext, call_next):
+        resources = await call_next(context)
+        out = []
+        for r in resources:
+            info = _VERSIONS.get(str(r.uri))
+            out.append(r.model_copy(update={"meta": {**(getattr(r, "meta", None) or {}), **info}}) if info else r)
+        return out
+
+
+mcp.add_middleware(VersionMetadata())
+
+
+# Resource subscriptions live on the low-level server; registering them advertises resources.subscribe
+@mcp._mcp_server.subscribe_resource()
+async def _subscribe(uri: AnyUrl) -> None:
+    _SUBSCRIBERS.setdefault(str(uri), set()).add(mcp._mcp_server.request_context.session)
+
+
+@mcp._mcp_server.unsubscribe_resource()
+async def _unsubscribe(uri: AnyUrl) -> None:
+    _SUBSCRIBERS.get(str(uri), set()).discard(mcp._mcp_server.request_context.session)
 
-# Simple MCP server exposing one static and one dynamic resource
-mcp = FastMCP("Simple Resources Server")
 
 # Static resource: always returns the same text
 @mcp.resource(
-    "res://hello.txt",
+    HELLO_URI,
     name="Hello Text",
     title="Hello Text Resource",
     description="A simple static text resource",
@@ -15,21 +113,40 @@ mcp = FastMCP("Simple Resources Server")
 )
 
 def hello_text() -> str:
-    return "Hello from a static FastMCP resource!\n"
+    return _CONTENT[HELLO_URI]
 
-# Dynamic resource: JSON body with current UTC time
+# Dynamic resource: JSON body with the server time (refreshed every TIME_INTERVAL seconds)
 @mcp.resource(
-    "res://time.json",
+    TIME_URI,
     name="Current Time",
     title="Current Time Resource",
-    description="Returns the current server time as JSON",
+    description=(
+        f"Server time as JSON, refreshed every {TIME_INTERVAL:g} s; subscribe for updates "
+        "or compare sha256 with check_resource"
+    ),
     mime_type="application/json",
 )
 
 def current_time() -> str:
-    now = datetime.utcnow().isoformat() + "Z"
-    return f'{{"utc":"{now}"}}'
+    return _CONTENT[TIME_URI]
+
+# Cheap revalidation: compare a cached hash without transferring the content
+@mcp.tool
+def check_resource(uri: str, sha256: str = "") -> str:
+    """Return {"changed", "sha256", "version", "updated_at"} for uri; changed is False when sha256 matches."""
+    info = _VERSIONS.get(uri)
+    if info is None:
+        raise ValueError(f"Unknown resource {uri}")
+    return json.dumps({"changed": sha256 != info["sha256"], **info})
 
 if __name__ == "__main__":
-    # Use a different port than other examples to avoid conflicts
-    asyncio.run(mcp.run_http_async(host="127.0.0.1", port=8003))
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Simple resources MCP server")
+    parser.add_argument("--transport", choices=["http", "stdio"], default="http", help="Serve over streamable HTTP or stdio")
+    parser.add_argument("--port", type=int, default=8003)  # different port than other examples to avoid conflicts
+    args = parser.parse_args()
+    if args.transport == "stdio":
+        asyncio.run(mcp.run_stdio_async())
+    else:
+        asyncio.run(mcp.run_http_async(host="127.0.0.1", port=args.port))
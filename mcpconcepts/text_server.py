@@ -1,5 +1,8 @@
 from fastmcp import FastMCP
 import asyncio
+from typing import List, Optional
+
+from mcpconcepts.packing import pack_strings, unpack_strings
 
 mcp = FastMCP("Text Server")
 
@@ -7,6 +10,29 @@ mcp = FastMCP("Text Server")
 def reverse(text: str) -> str:
     return text[::-1]
 
+@mcp.tool
+def reverse_batch(texts: Optional[List[str]] = None, texts_b64: Optional[str] = None) -> dict:
+    """Reverse many strings in one call.
+
+    Pass a JSON list (texts) or a packed base64 string list (texts_b64, see
+    mcpconcepts/packing.py). Packed input gets packed output ({"result_b64", "count"}),
+    JSON input gets {"result": [...]}.
+    """
+    if texts_b64 is not None:
+        out = [t[::-1] for t in unpack_strings(texts_b64)]
+        return {"result_b64": pack_strings(out), "count": len(out)}
+    if texts is None:
+        raise ValueError("Pass texts or texts_b64")
+    return {"result": [t[::-1] for t in texts]}
+
 if __name__ == "__main__":
-    asyncio.run(mcp.run_http_async(host="127.0.0.1", port=8001))
+    import argparse
 
+    parser = argparse.ArgumentParser(description="Text MCP server")
+    parser.add_argument("--transport", choices=["http", "stdio"], default="http", help="Serve over streamable HTTP or stdio")
+    parser.add_argument("--port", type=int, default=8001)
+    args = parser.parse_args()
+    if args.transport == "stdio":
+        asyncio.run(mcp.run_stdio_async())
+    else:
+        asyncio.run(mcp.run_http_async(host="127.0.0.1", port=args.port))
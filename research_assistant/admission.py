@@ -0,0 +1,195 @@
+"""
+Admission control and memory accounting for the research server.
+
+A page fetch holds the response body, a BeautifulSoup tree (several times the
+HTML size) and the extracted text at once. Admission keeps a burst of large
+pages from running the worker out of memory:
+- at most max_inflight fetch/parse jobs run at once;
+- up to max_queue more wait for a slot, each for at most queue_timeout
+  seconds (or the caller's deadline, if sooner). Past that, callers get an
+  immediate ServerBusy instead of piling up;
+- a job reserves an estimate of its peak memory (body size x PARSE_OVERHEAD)
+  against a byte budget. The first reservation (from Content-Length, or the
+  first chunk) waits while the budget is taken. Growth as the body arrives is
+  granted at once, so two half-read pages can't wait on each other forever;
+  the overshoot only holds back new jobs until it is returned. A page larger
+  than the whole budget is clamped to it and so runs alone.
+Limits are per process; with the pre-fork server each worker has its own.
+
+ToolMemory records tracemalloc peaks per tool when RA_TRACEMALLOC=1. The
+peak is global to the process, so when calls overlap a tool's figure is an
+upper bound (it includes what concurrent calls allocated at the same time).
+
+Configuration (env): RA_MAX_INFLIGHT (default 8), RA_MAX_QUEUE (32),
+RA_QUEUE_TIMEOUT (seconds, 10), RA_MEMORY_BUDGET (bytes, 256 MB),
+RA_TRACEMALLOC (0/1).
+"""
+
+import asyncio
+import os
+import time
+import tracemalloc
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, Optional
+
+PARSE_OVERHEAD = 8  # soup tree + text per byte of HTML, roughly
+
+
+class ServerBusy(RuntimeError):
+    """Too many requests are queued; the caller should retry later."""
+
+
+class Admission:
+    def __init__(self, max_inflight: int = 8, max_queue: int = 32, queue_timeout: float = 10.0,
+                 max_bytes: int = 256_000_000):
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.max_bytes = max_bytes
+        self._slots = asyncio.Semaphore(max_inflight)
+        self._bytes_free = asyncio.Condition()
+        self.inflight = 0
+        self.waiting = 0
+        self.reserved = 0
+        self.counts = {"admitted": 0, "rejected_queue_full": 0, "rejected_timeout": 0, "byte_waits": 0,
+                       "clamped": 0}
+        self.peak_reserved = 0
+        self.queue_wait_s = 0.0
+
+    @classmethod
+    def from_env(cls) -> "Admission":
+        return cls(
+            max_inflight=int(os.getenv("RA_MAX_INFLIGHT", "8")),
+            max_queue=int(os.getenv("RA_MAX_QUEUE", "32")),
+            queue_timeout=float(os.getenv("RA_QUEUE_TIMEOUT", "10")),
+            max_bytes=int(os.getenv("RA_MEMORY_BUDGET", "256000000")),
+        )
+
+    @asynccontextmanager
+    async def slot(self, timeout: Optional[float] = None, wait: bool = True) -> AsyncIterator["Reservation"]:
+        """One fetch/parse job. Raises ServerBusy when the queue is full or the wait times out."""
+        if self._slots.locked():
+            if not wait or self.waiting >= self.max_queue:
+                self.counts["rejected_queue_full"] += 1
+                raise ServerBusy(f"server busy: {self.inflight} fetches running, {self.waiting} queued; retry later")
+        self.waiting += 1
+        started = time.monotonic()
+        try:
+            limit = self.queue_timeout if timeout is None else min(self.queue_timeout, timeout)
+            if self._slots.locked():
+                await asyncio.wait_for(self._slots.acquire(), timeout=max(0.0, limit))
+            else:
+                await self._slots.acquire()
+        except asyncio.TimeoutError:
+            self.counts["rejected_timeout"] += 1
+            raise ServerBusy(f"server busy: no fetch slot within {limit:.1f}s; retry later") from None
+        finally:
+            self.waiting -= 1
+            self.queue_wait_s += time.monotonic() - started
+        self.inflight += 1
+        self.counts["admitted"] += 1
+        reservation = Reservation(self)
+        try:
+            yield reservation
+        finally:
+            await reservation.release()
+            self.inflight -= 1
+            self._slots.release()
+
+    async def _reserve(self, nbytes: int, wait: bool = True) -> None:
+        async with self._bytes_free:
+            if wait and self.reserved + nbytes > self.max_bytes:
+                self.counts["byte_waits"] += 1
+                await self._bytes_free.wait_for(lambda: self.reserved + nbytes <= self.max_bytes)
+            self.reserved += nbytes
+            self.peak_reserved = max(self.peak_reserved, self.reserved)
+
+    async def _release(self, nbytes: int) -> None:
+        if not nbytes:
+            return
+        async with self._bytes_free:
+            self.reserved -= nbytes
+            self._bytes_free.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counts,
+            "inflight": self.inflight,
+            "queued": self.waiting,
+            "max_inflight": self.max_inflight,
+            "max_queue": self.max_queue,
+            "reserved_bytes": self.reserved,
+            "peak_reserved_bytes": self.peak_reserved,
+            "budget_bytes": self.max_bytes,
+            "queue_wait_s_total": round(self.queue_wait_s, 3),
+        }
+
+
+class Reservation:
+    """Bytes a job holds against the budget; grown with reserve() and returned when its slot ends."""
+
+    def __init__(self, admission: Admission):
+        self._admission = admission
+        self.nbytes = 0
+
+    async def reserve(self, nbytes: int) -> None:
+        """Hold at least nbytes in total; only the first reservation waits for the budget."""
+        if nbytes > self._admission.max_bytes:
+            if self.nbytes < self._admission.max_bytes:
+                self._admission.counts["clamped"] += 1
+            nbytes = self._admission.max_bytes
+        extra = nbytes - self.nbytes
+        if extra > 0:
+            await self._admission._reserve(extra, wait=self.nbytes == 0)
+            self.nbytes += extra
+
+    async def release(self) -> None:
+        nbytes, self.nbytes = self.nbytes, 0
+        await self._admission._release(nbytes)
+
+
+class ToolMemory:
+    """Per-tool tracemalloc peaks (no-op unless enabled)."""
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._active = 0
+        self.tools: Dict[str, Dict[str, int]] = {}
+        if enabled and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @classmethod
+    def from_env(cls) -> "ToolMemory":
+        return cls(enabled=os.getenv("RA_TRACEMALLOC", "0") == "1")
+
+    @contextmanager
+    def track(self, tool: str) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+        if self._active == 0:
+            tracemalloc.reset_peak()
+        self._active += 1
+        start, _ = tracemalloc.get_traced_memory()
+        try:
+            yield
+        finally:
+            self._active -= 1
+            _, peak = tracemalloc.get_traced_memory()
+            used = max(0, peak - start)
+            entry = self.tools.setdefault(tool, {"calls": 0, "peak_bytes_max": 0, "peak_bytes_last": 0,
+                                                 "peak_bytes_total": 0})
+            entry["calls"] += 1
+            entry["peak_bytes_last"] = used
+            entry["peak_bytes_total"] += used
+            entry["peak_bytes_max"] = max(entry["peak_bytes_max"], used)
+
+    def stats(self) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+        current, peak = tracemalloc.get_traced_memory()
+        tools = {
+            name: {**e, "peak_bytes_avg": e["peak_bytes_total"] // max(1, e["calls"])}
+            for name, e in self.tools.items()
+        }
+        return {"traced_current_bytes": current, "traced_peak_bytes": peak, "tools": tools}
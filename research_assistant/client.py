@@ -1,11 +1,11 @@
 import asyncio
 import json
+import uuid
 from typing import List, Dict, Any
 
 from fastmcp import Client
 import os
 from dotenv import load_dotenv
-import google.generativeai as genai
 import argparse
 from semantic_kernel import Kernel
 from semantic_kernel.functions import kernel_function
@@ -15,7 +15,13 @@ try:
 except Exception:  # pragma: no cover
     KernelArguments = None  # type: ignore
 
+from common import tracing
+from common.llm_gateway import get_gateway
+
 SERVER_URL = "http://127.0.0.1:8010/mcp"
+# Pages fetched per run, and the corpus score at which a stored page counts as covering a source
+MAX_PAGES = 5
+CORPUS_MIN_SCORE = 0.35
 
 load_dotenv()
 
@@ -55,69 +61,92 @@ def _safe_print_preview(text: str, limit: int = 800) -> None:
         # Fallback: replace un-encodable characters
         print(preview.encode("cp1252", errors="replace").decode("cp1252"), "\n...\n")
 
-async def research(topic: str, max_results: int = 5, insecure_ssl: bool = False) -> Dict[str, Any]:
+async def research(topic: str, max_results: int = 5, insecure_ssl: bool = False, use_corpus: bool = True) -> Dict[str, Any]:
+    with tracing.span("research", cat="client", topic=topic):
+        return await _research(topic, max_results=max_results, insecure_ssl=insecure_ssl, use_corpus=use_corpus)
+
+
+def _parse_json_result(res: Any, expected: type) -> Any:
+    """Tool result as a Python object of the expected type (list/dict), or None."""
+    parsed = None
+    # direct result attribute used by some clients
+    direct = getattr(res, "result", None)
+    if isinstance(direct, (list, dict)):
+        parsed = direct
+    if parsed is None:
+        txt = _extract_text_from_result(res)
+        if txt and txt.strip().startswith(("[", "{")):
+            try:
+                parsed = json.loads(txt)
+            except Exception:
+                parsed = None
+    if parsed is None and isinstance(res, (list, dict)):
+        parsed = res
+    return parsed if isinstance(parsed, expected) else None
+
+
+async def _corpus_hits(client: Client, topic: str, session_id: str) -> Dict[str, Dict[str, Any]]:
+    """URLs the server's local corpus already covers well for topic (added to the session as evidence)."""
+    try:
+        res = await tracing.call_tool(client, "search_corpus", {"query": topic, "k": 8, "session_id": session_id})
+    except Exception:
+        return {}  # corpus disabled on the server
+    covered: Dict[str, Dict[str, Any]] = {}
+    for h in _parse_json_result(res, list) or []:
+        if h.get("score", 0) >= CORPUS_MIN_SCORE and h.get("url") not in covered:
+            covered[h["url"]] = {"title": h.get("title"), "url": h["url"], "snippet": (h.get("text") or "")[:200],
+                                 "handle": h.get("handle") or ""}
+    return covered
+
+
+async def _research(topic: str, max_results: int = 5, insecure_ssl: bool = False, use_corpus: bool = True) -> Dict[str, Any]:
     client = Client(SERVER_URL)
+    # Tool calls tagged with this id collect their evidence on the server for research_summarize
+    session_id = uuid.uuid4().hex
     async with client:
-        # 1) search
-        search_res = await client.call_tool("search_web", {"query": topic, "max_results": max_results})
-        # Try to parse either JSON string content or direct Python object
-        results: List[Dict[str, Any]]
-        parsed = None
-        # direct result attribute used by some clients
-        direct = getattr(search_res, "result", None)
-        if isinstance(direct, (list, dict)):
-            parsed = direct
-        if parsed is None:
-            search_txt = _extract_text_from_result(search_res)
-            if search_txt and search_txt.strip().startswith(("[", "{")):
-                try:
-                    parsed = json.loads(search_txt)
-                except Exception:
-                    parsed = None
-        if parsed is None and isinstance(search_res, (list, dict)):
-            parsed = search_res
-        if not isinstance(parsed, list):
-            raise RuntimeError("search_web returned unexpected shape; expected list of results")
-        results = parsed  # type: ignore[assignment]
-
-        # 2) fetch a few top links
+        # 1) local corpus first: pages earlier runs already fetched
+        covered = await _corpus_hits(client, topic, session_id) if use_corpus else {}
+        results: List[Dict[str, Any]] = list(covered.values())
+
+        # 2) search the web only when the corpus doesn't cover enough sources
+        if len(covered) < MAX_PAGES:
+            search_res = await tracing.call_tool(
+                client, "search_web", {"query": topic, "max_results": max_results, "session_id": session_id}
+            )
+            parsed = _parse_json_result(search_res, list)
+            if parsed is None:
+                raise RuntimeError("search_web returned unexpected shape; expected list of results")
+            results = parsed + [r for url, r in covered.items() if all(p.get("url") != url for p in parsed)]
+
+        # 3) fetch top links the corpus doesn't cover (by handle: the server keeps the text for the session)
         pages: List[Dict[str, Any]] = []
-        for i, r in enumerate(results[: min(5, len(results))]):
+        for i, r in enumerate(results[: min(MAX_PAGES, len(results))]):
             url = r.get("url")
-            if not url:
+            if not url or url in covered:
                 continue
+            if len(pages) + len(covered) >= MAX_PAGES:
+                break
             # First attempt respects global insecure flag; on cert failure retry once with insecure=True
             try:
-                page = await client.call_tool("fetch_url", {"url": url, "max_chars": 8000, "insecure": insecure_ssl})
+                page = await tracing.call_tool(client, "fetch_url", {"url": url, "max_chars": 8000, "insecure": insecure_ssl, "inline": False, "session_id": session_id})
             except Exception as e:
                 msg = str(e)
                 if "CERTIFICATE_VERIFY_FAILED" in msg or "self-signed certificate" in msg:
                     try:
-                        page = await client.call_tool("fetch_url", {"url": url, "max_chars": 8000, "insecure": True})
+                        page = await tracing.call_tool(client, "fetch_url", {"url": url, "max_chars": 8000, "insecure": True, "inline": False, "session_id": session_id})
                     except Exception:
                         continue
                 else:
                     continue
-            page_parsed = None
-            direct_p = getattr(page, "result", None)
-            if isinstance(direct_p, dict):
-                page_parsed = direct_p
+            page_parsed = _parse_json_result(page, dict)
             if page_parsed is None:
-                page_txt = _extract_text_from_result(page)
-                if page_txt and page_txt.strip().startswith(("[", "{")):
-                    try:
-                        page_parsed = json.loads(page_txt)
-                    except Exception:
-                        page_parsed = None
-            if page_parsed is None and isinstance(page, dict):
-                page_parsed = page
-            if not isinstance(page_parsed, dict):
                 continue
             page_obj = page_parsed
             pages.append({"rank": i + 1, "url": url, **page_obj})
 
-        # 3) get prompt template
-        prompt_tpl = await client.get_prompt("research_summarize", {"topic": topic, "findings_json": json.dumps({"results": results, "pages": pages})})
+        # 4) get prompt template; the server assembles the deduplicated evidence from the session
+        with tracing.span("prompt.render", cat="client"):
+            prompt_tpl = await client.get_prompt("research_summarize", {"topic": topic, "session_id": session_id})
         # Extract prompt text robustly across content shapes
         msg0 = prompt_tpl.messages[0]
         content_field = getattr(msg0, "content", None)
@@ -130,6 +159,7 @@ async def research(topic: str, max_results: int = 5, insecure_ssl: bool = False)
             "prompt": prompt_text,
             "results": results,
             "pages": pages,
+            "corpus_sources": list(covered.values()),
         }
 
 
@@ -142,17 +172,17 @@ class SaveSkills:
         return str(out_path)
 
 
-async def research_and_summarize(topic: str, max_results: int = 5, out_file: str | None = None, insecure_ssl: bool = False) -> str:
-    data = await research(topic, max_results=max_results, insecure_ssl=insecure_ssl)
+async def research_and_summarize(topic: str, max_results: int = 5, out_file: str | None = None, insecure_ssl: bool = False,
+                                 use_corpus: bool = True) -> str:
+    data = await research(topic, max_results=max_results, insecure_ssl=insecure_ssl, use_corpus=use_corpus)
     results = data["results"]
     pages = data["pages"]
     prompt = data["prompt"]
 
-    # Use Gemini to produce a clean markdown report (inline config)
+    # Use Gemini (via the shared quota-aware gateway) to produce a clean markdown report
     api_key = os.getenv("GOOGLE_API_KEY")
     if not api_key:
         raise RuntimeError("GOOGLE_API_KEY is not set in environment/.env")
-    genai.configure(api_key=api_key)
     system_instruction = (
         "You are a precise research writer. Produce a clean, accurate, and up-to-date report in Markdown. "
         "Use clear headings, bullet lists, short paragraphs, and add a Sources section at the end. "
@@ -166,93 +196,106 @@ async def research_and_summarize(topic: str, max_results: int = 5, out_file: str
         or getattr(globals().get("_ARGS", None), "model", None)
         or "gemini-1.5-flash"
     )
-    model = genai.GenerativeModel(preferred_model, system_instruction=system_instruction)
     try:
-        report_md = model.generate_content(prompt).text or ""
+        report_md = await get_gateway().generate(
+            prompt,
+            model=preferred_model,
+            system_instruction=system_instruction,
+            fallback_model="gemini-1.5-flash",
+            # Start flash in parallel if the preferred model is slow to produce a first token
+            hedge=True,
+        )
     except Exception:
-        # Second try: switch to flash if not already
-        try:
-            if preferred_model != "gemini-1.5-flash":
-                model2 = genai.GenerativeModel("gemini-1.5-flash", system_instruction=system_instruction)
-                report_md = model2.generate_content(prompt).text or ""
-            else:
-                raise RuntimeError("Already using fallback model")
-        except Exception:
-            # Fallback: build a structured markdown summary locally so the run still succeeds
-            overview = (
-                f"This brief summarizes public information related to '{topic}'. It aggregates top search "
-                "results and quick page extracts as a snapshot."
-            )
-            lines = [
-                f"# Research Brief: {topic}",
-                "",
-                "## Overview",
-                overview,
-                "",
-                "## Key Findings (titles)",
-            ]
-            for r in results[: max_results]:
-                title = r.get("title") or r.get("snippet") or r.get("url", "")
-                url = r.get("url", "")
-                if title:
-                    lines.append(f"- {title} ({url})")
-            lines.append("")
-            lines.append("## Extracted Page Previews")
-            for p in pages:
-                title = p.get("title") or "(no title)"
-                url = p.get("url", "")
-                preview = (p.get("text") or "").strip()[:500]
-                lines.append(f"- {title} — {url}\n  \n  {preview}…")
-            lines.append("")
-            lines.append("## Sources")
-            for r in results[: max_results]:
-                src = r.get("url", "")
-                if src:
-                    lines.append(f"- {src}")
-            lines.append("")
-            lines.append(
-                "_Note: Gemini summarization was unavailable (e.g., quota). This is a locally constructed summary from search results and page previews._"
-            )
-            report_md = "\n".join(lines)
+        # Fallback: build a structured markdown summary locally so the run still succeeds
+        overview = (
+            f"This brief summarizes public information related to '{topic}'. It aggregates top search "
+            "results and quick page extracts as a snapshot."
+        )
+        lines = [
+            f"# Research Brief: {topic}",
+            "",
+            "## Overview",
+            overview,
+            "",
+            "## Key Findings (titles)",
+        ]
+        for r in results[: max_results]:
+            title = r.get("title") or r.get("snippet") or r.get("url", "")
+            url = r.get("url", "")
+            if title:
+                lines.append(f"- {title} ({url})")
+        lines.append("")
+        lines.append("## Extracted Page Previews")
+        for p in pages:
+            title = p.get("title") or "(no title)"
+            url = p.get("url", "")
+            preview = (p.get("text") or p.get("preview") or "").strip()[:500]
+            lines.append(f"- {title} — {url}\n  \n  {preview}…")
+        lines.append("")
+        lines.append("## Sources")
+        for r in results[: max_results]:
+            src = r.get("url", "")
+            if src:
+                lines.append(f"- {src}")
+        lines.append("")
+        lines.append(
+            "_Note: Gemini summarization was unavailable (e.g., quota). This is a locally constructed summary from search results and page previews._"
+        )
+        report_md = "\n".join(lines)
 
     # Save via Semantic Kernel if available; fallback to direct write
     if out_file:
-        saved = False
-        try:
-            kernel = Kernel()
-            kernel.add_plugin(SaveSkills(), plugin_name="io")
-            # Preferred: pass KernelArguments if available
-            if KernelArguments is not None:
+        with tracing.span("save.semantic_kernel", cat="client", out_file=out_file):
+            await _save_report(report_md, out_file)
+        # Sidecar manifest (sources, validators, section citations) for later --refresh runs
+        from research_assistant.refresh import write_manifest
+
+        # Corpus-covered sources are cited too. Their handle (the page version the corpus holds) lets the first
+        # refresh tell whether the page changed; with no validators that refresh still fetches them in full
+        fetched = {p["url"] for p in pages}
+        sources = pages + [{"url": c["url"], "title": c.get("title"), "handle": c.get("handle")}
+                           for c in data.get("corpus_sources", []) if c["url"] not in fetched]
+        write_manifest(out_file, topic, report_md, sources, results)
+
+    return report_md
+
+
+async def _save_report(report_md: str, out_file: str) -> None:
+    """Save via Semantic Kernel if available; fallback to direct write."""
+    saved = False
+    try:
+        kernel = Kernel()
+        kernel.add_plugin(SaveSkills(), plugin_name="io")
+        # Preferred: pass KernelArguments if available
+        if KernelArguments is not None:
+            try:
+                await kernel.invoke("io", "save_markdown", KernelArguments(content=report_md, filename=out_file))
+                saved = True
+            except Exception:
+                # Try function object style
                 try:
-                    await kernel.invoke("io", "save_markdown", KernelArguments(content=report_md, filename=out_file))
+                    func = getattr(kernel, "get_function")("io", "save_markdown")
+                    await kernel.invoke(func, KernelArguments(content=report_md, filename=out_file))
                     saved = True
                 except Exception:
-                    # Try function object style
-                    try:
-                        func = getattr(kernel, "get_function")("io", "save_markdown")
-                        await kernel.invoke(func, KernelArguments(content=report_md, filename=out_file))
-                        saved = True
-                    except Exception:
-                        saved = False
-            if not saved:
-                # Older SK versions: use dict arguments
+                    saved = False
+        if not saved:
+            # Older SK versions: use dict arguments
+            try:
+                await kernel.invoke("io", "save_markdown", arguments={"content": report_md, "filename": out_file})
+                saved = True
+            except Exception:
                 try:
-                    await kernel.invoke("io", "save_markdown", arguments={"content": report_md, "filename": out_file})
+                    func = getattr(kernel, "get_function")("io", "save_markdown")
+                    await kernel.invoke(func, arguments={"content": report_md, "filename": out_file})
                     saved = True
                 except Exception:
-                    try:
-                        func = getattr(kernel, "get_function")("io", "save_markdown")
-                        await kernel.invoke(func, arguments={"content": report_md, "filename": out_file})
-                        saved = True
-                    except Exception:
-                        saved = False
-        except Exception:
-            saved = False
-        if not saved:
-            from pathlib import Path
-            Path(out_file).write_text(report_md, encoding="utf-8")
-
-    return report_md
+                    saved = False
+    except Exception:
+        saved = False
+    if not saved:
+        from pathlib import Path
+        Path(out_file).write_text(report_md, encoding="utf-8")
 
 
 if __name__ == "__main__":
@@ -261,11 +304,33 @@ if __name__ == "__main__":
     parser.add_argument("--max-results", type=int, default=6, help="Max search results")
     parser.add_argument("--out", type=str, default="research_report.md", help="Output markdown file path")
     parser.add_argument("--insecure-ssl", action="store_true", help="Disable SSL verification for fetch_url (not recommended)")
+    parser.add_argument("--refresh", action="store_true",
+                        help="Update an existing --out report: recheck its sources and rewrite only affected sections")
+    parser.add_argument("--no-corpus", action="store_true", help="Skip the server's local corpus; search and fetch everything")
     parser.add_argument("--model", type=str, default=None, help="Gemini model name (e.g., gemini-1.5-flash or gemini-1.5-pro)")
+    parser.add_argument("--trace", type=str, default=None, help="Write Chrome-trace/Perfetto JSON spans to this file")
     args = parser.parse_args()
+    if args.trace:
+        tracing.enable(args.trace, process_name="research_client")
     # Make args accessible for model selection
     _ARGS = args
 
+    if args.refresh:
+        from research_assistant.refresh import load_manifest, refresh_report
+
+        if load_manifest(args.out) is None:
+            raise SystemExit(f"Nothing to refresh: {args.out} has no manifest. Run once without --refresh.")
+
+        async def _refresh():
+            stats = await refresh_report(
+                SERVER_URL, args.out, topic=args.topic, max_results=args.max_results,
+                insecure_ssl=bool(args.insecure_ssl or os.getenv("RA_INSECURE_SSL") == "1"), model=args.model,
+            )
+            print(f"Refreshed {args.out}: {json.dumps(stats)}")
+
+        asyncio.run(_refresh())
+        raise SystemExit(0)
+
     topic_arg = args.topic or input("Enter research topic: ").strip()
     if not topic_arg:
         raise SystemExit("Topic is required.")
@@ -276,6 +341,7 @@ if __name__ == "__main__":
             max_results=args.max_results,
             out_file=args.out,
             insecure_ssl=bool(args.insecure_ssl or os.getenv("RA_INSECURE_SSL") == "1"),
+            use_corpus=not args.no_corpus,
         )
         _safe_print_preview(md, 800)
 
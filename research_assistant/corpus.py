@@ -0,0 +1,311 @@
+"""
+Local corpus of every page the research server has fetched, across sessions.
+
+fetch_url feeds each extracted page in here (in the background). search_corpus
+then returns the stored passages closest to a query in milliseconds, so a
+research run can start from what earlier runs already read and go to the web
+only for what is missing.
+
+Layout of the corpus directory:
+- corpus.sqlite3   documents (url, content hash, title) and passages (url,
+                   title, zlib-compressed text, live flag)
+- vectors.f16      one row per passage: hashed term-frequency vector
+                   (common.textsearch tokens, VECTOR_DIM buckets, unit
+                   length), float16, appended and memory-mapped for reading
+- sigs.u16         one row per passage: LSH_TABLES random-hyperplane
+                   signatures of LSH_BITS bits each
+- df.npy           per-bucket document frequencies, for query-side IDF
+Row i of vectors.f16 / sigs.u16 is passage id i.
+
+Search is approximate nearest neighbour. Passages sharing a signature with
+the query in any LSH table are candidates and are re-ranked by exact cosine
+against the IDF-weighted query. With too few candidates it falls back to a
+scan of all vectors, which is still one matrix product. A page whose content
+changed gets new passages and its old ones are marked dead.
+
+Writers take a file lock, so several pre-fork workers can feed the same
+corpus. Needs NumPy; without it (or with RA_CORPUS=off) the corpus is
+disabled.
+
+Configuration (env): RA_CORPUS_DIR (default ~/.cache/research_assistant/corpus),
+RA_CORPUS=off to disable.
+
+    python -m research_assistant.corpus "query text"     # search from the shell
+"""
+
+import hashlib
+import math
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from common.textsearch import tokenize
+
+try:
+    import numpy as np  # type: ignore
+except ImportError:  # pragma: no cover - the corpus is optional
+    np = None  # type: ignore
+
+try:
+    import fcntl  # type: ignore
+except ImportError:  # pragma: no cover - Windows: single-process locking only
+    fcntl = None  # type: ignore
+
+VECTOR_DIM = 512
+LSH_TABLES = 8
+LSH_BITS = 12
+LSH_SEED = 20240611
+PASSAGE_CHARS = 1500
+MIN_CANDIDATES = 50
+
+
+def corpus_available() -> bool:
+    return np is not None
+
+
+def _passages(text: str, size: int = PASSAGE_CHARS) -> List[str]:
+    """Split whitespace-normalized page text into ~size-char passages at sentence ends."""
+    out: List[str] = []
+    start = 0
+    while start < len(text):
+        end = min(len(text), start + size)
+        if end < len(text):
+            cut = text.rfind(". ", start + size // 2, end)
+            end = cut + 1 if cut != -1 else end
+        passage = text[start:end].strip()
+        if passage:
+            out.append(passage)
+        start = end
+    return out
+
+
+def _hash_tf(terms: List[str]) -> "np.ndarray":
+    vec = np.zeros(VECTOR_DIM, dtype=np.float32)
+    for term, count in Counter(terms).items():
+        h = zlib.crc32(term.encode("utf-8"))
+        w = 1 + math.log(count)
+        vec[h % VECTOR_DIM] += -w if h & 0x80000000 else w
+    return vec
+
+
+def _unit(vec: "np.ndarray") -> "np.ndarray":
+    norm = float(np.linalg.norm(vec))
+    return vec / norm if norm else vec
+
+
+class Corpus:
+    def __init__(self, path: str):
+        if np is None:
+            raise RuntimeError("the research corpus needs NumPy")
+        self.dir = Path(path)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self._vec_path = self.dir / "vectors.f16"
+        self._sig_path = self.dir / "sigs.u16"
+        self._df_path = self.dir / "df.npy"
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid = 0
+        self._planes = np.random.default_rng(LSH_SEED).standard_normal(
+            (LSH_TABLES, LSH_BITS, VECTOR_DIM)
+        ).astype(np.float32)
+        self._weights = (1 << np.arange(LSH_BITS)).astype(np.uint32)
+        self._rows = 0
+        self._version = -1
+        self._vectors: Any = None
+        self._sigs: Any = None
+        self._live: Any = None
+        self._df: Any = None
+        self.searches = 0
+        self.added_pages = 0
+
+    @classmethod
+    def from_env(cls) -> Optional["Corpus"]:
+        if os.getenv("RA_CORPUS", "").lower() in ("off", "none", "0") or np is None:
+            return None
+        path = os.getenv("RA_CORPUS_DIR") or str(Path.home() / ".cache" / "research_assistant" / "corpus")
+        return cls(path)
+
+    # ---- storage ----
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(str(self.dir / "corpus.sqlite3"), timeout=10, check_same_thread=False,
+                                   isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS docs (url TEXT PRIMARY KEY, sha256 TEXT, title TEXT, added_at REAL)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS passages ("
+                " id INTEGER PRIMARY KEY, url TEXT NOT NULL, title TEXT, text BLOB NOT NULL, live INTEGER NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS passages_url ON passages (url)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    @contextmanager
+    def _write_lock(self) -> Iterator[None]:
+        with self._lock, open(self.dir / "corpus.lock", "a") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _signatures(self, vecs: "np.ndarray") -> "np.ndarray":
+        """(n, VECTOR_DIM) -> (n, LSH_TABLES) uint16 bucket ids."""
+        bits = np.einsum("tbd,nd->ntb", self._planes, vecs) > 0
+        return (bits.astype(np.uint32) * self._weights).sum(axis=2).astype(np.uint16)
+
+    def add(self, url: str, title: str, text: str) -> int:
+        """Add or replace the page at url; returns the number of new passages (0 when unchanged)."""
+        sha = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        db = self._db()
+        row = db.execute("SELECT sha256 FROM docs WHERE url=?", (url,)).fetchone()
+        if row is not None and row[0] == sha:
+            return 0
+        passages = _passages(text)
+        if not passages:
+            return 0
+        vecs = np.stack([_unit(_hash_tf(tokenize(f"{title} {p}"))) for p in passages]).astype(np.float32)
+        sigs = self._signatures(vecs)
+        with self._write_lock():
+            first = os.path.getsize(self._vec_path) // (VECTOR_DIM * 2) if self._vec_path.exists() else 0
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                dead = [r[0] for r in db.execute("SELECT id FROM passages WHERE url=? AND live=1", (url,))]
+                db.execute("UPDATE passages SET live=0 WHERE url=?", (url,))
+                db.executemany(
+                    "INSERT INTO passages (id, url, title, text, live) VALUES (?, ?, ?, ?, 1)",
+                    [(first + i, url, title, zlib.compress(p.encode("utf-8"), 6)) for i, p in enumerate(passages)],
+                )
+                db.execute("INSERT OR REPLACE INTO docs (url, sha256, title, added_at) VALUES (?, ?, ?, ?)",
+                           (url, sha, title, time.time()))
+                db.execute("INSERT INTO meta (key, value) VALUES ('version', 1) "
+                           "ON CONFLICT(key) DO UPDATE SET value=value+1")
+                with open(self._vec_path, "ab") as f:
+                    f.write(vecs.astype(np.float16).tobytes())
+                with open(self._sig_path, "ab") as f:
+                    f.write(sigs.tobytes())
+                df = np.load(self._df_path) if self._df_path.exists() else np.zeros(VECTOR_DIM, dtype=np.int64)
+                df += (vecs != 0).sum(axis=0)
+                if dead:
+                    # Replaced passages no longer count, or df would outgrow the live passage count
+                    old = np.memmap(self._vec_path, dtype=np.float16, mode="r", shape=(first, VECTOR_DIM))
+                    df -= (old[np.asarray(dead, dtype=np.int64)] != 0).sum(axis=0)
+                    del old
+                    np.maximum(df, 0, out=df)
+                # Readers don't lock: replace the file atomically instead of rewriting it in place
+                tmp = self._df_path.with_suffix(".tmp.npy")
+                np.save(tmp, df)
+                os.replace(tmp, self._df_path)
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        self.added_pages += 1
+        return len(passages)
+
+    def _refresh(self) -> None:
+        """Re-map the matrices when other writers (or this one) appended rows."""
+        db = self._db()
+        row = db.execute("SELECT value FROM meta WHERE key='version'").fetchone()
+        version = row[0] if row else 0
+        if version == self._version:
+            return
+        self._version = version
+        # Rows appended by a writer that has not committed yet have no live passages and stay masked out.
+        # Readers take no lock, so a writer may be between its two appends: map only rows both files hold.
+        vec_rows = os.path.getsize(self._vec_path) // (VECTOR_DIM * 2) if self._vec_path.exists() else 0
+        sig_rows = os.path.getsize(self._sig_path) // (LSH_TABLES * 2) if self._sig_path.exists() else 0
+        rows = min(vec_rows, sig_rows)
+        live_rows = db.execute("SELECT id FROM passages WHERE live=1").fetchall()
+        self._rows = rows
+        if rows == 0:
+            self._vectors = self._sigs = self._live = None
+            return
+        self._vectors = np.memmap(self._vec_path, dtype=np.float16, mode="r", shape=(rows, VECTOR_DIM))
+        self._sigs = np.memmap(self._sig_path, dtype=np.uint16, mode="r", shape=(rows, LSH_TABLES))
+        live = np.zeros(rows, dtype=bool)
+        ids = np.fromiter((r[0] for r in live_rows), dtype=np.int64)
+        live[ids[ids < rows]] = True
+        self._live = live
+        self._df = np.load(self._df_path) if self._df_path.exists() else np.zeros(VECTOR_DIM, dtype=np.int64)
+
+    # ---- search ----
+    def search(self, query: str, k: int = 5, max_chars: int = PASSAGE_CHARS, per_url: int = 2) -> List[Dict[str, Any]]:
+        """Top-k live passages for query: [{"url", "title", "text", "score", "id", "sha256"}], best first.
+
+        sha256 is the hash of the page text the passage came from (the same text PageStore hashes).
+        """
+        self.searches += 1
+        with self._lock:
+            self._refresh()
+            vectors, sigs, live, df = self._vectors, self._sigs, self._live, self._df
+        if vectors is None or not live.any():
+            return []
+        n_docs = max(1, int(live.sum()))
+        df = np.minimum(df, n_docs)  # df.npy may be a commit ahead of (or behind) the live mask
+        idf = np.log(1 + (n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+        q = _unit(_hash_tf(tokenize(query)) * idf)
+        if not q.any():
+            return []
+        qsig = self._signatures(q[None, :])[0]
+        candidates = np.flatnonzero((np.asarray(sigs) == qsig).any(axis=1) & live)
+        if len(candidates) < max(MIN_CANDIDATES, k * 4):
+            candidates = np.flatnonzero(live)  # too few LSH hits: exact scan
+        scores = np.asarray(vectors[candidates], dtype=np.float32) @ q
+        order = candidates[np.argsort(-scores)]
+        by_id = dict(zip(candidates.tolist(), scores.tolist()))
+        out: List[Dict[str, Any]] = []
+        seen: Counter = Counter()
+        db = self._db()
+        for pid in order.tolist():
+            if by_id[pid] <= 0 or len(out) >= k:
+                break
+            row = db.execute(
+                "SELECT p.url, p.title, p.text, d.sha256 FROM passages p LEFT JOIN docs d ON d.url = p.url"
+                " WHERE p.id=? AND p.live=1", (pid,)
+            ).fetchone()
+            if row is None or seen[row[0]] >= per_url:
+                continue
+            seen[row[0]] += 1
+            out.append({
+                "url": row[0], "title": row[1] or "", "id": pid, "score": round(by_id[pid], 4),
+                "text": zlib.decompress(row[2]).decode("utf-8")[:max_chars], "sha256": row[3] or "",
+            })
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        db = self._db()
+        return {
+            "path": str(self.dir),
+            "docs": db.execute("SELECT COUNT(*) FROM docs").fetchone()[0],
+            "passages": db.execute("SELECT COUNT(*) FROM passages WHERE live=1").fetchone()[0],
+            "rows": self._rows,
+            "searches": self.searches,
+            "added_pages": self.added_pages,
+        }
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Search the local research corpus")
+    parser.add_argument("query")
+    parser.add_argument("-k", type=int, default=5)
+    args = parser.parse_args()
+    corpus = Corpus.from_env()
+    if corpus is None:
+        raise SystemExit("corpus disabled (RA_CORPUS=off or NumPy missing)")
+    started = time.perf_counter()
+    hits = corpus.search(args.query, k=args.k, max_chars=300)
+    print(json.dumps(hits, indent=2, ensure_ascii=False))
+    print(f"{len(hits)} hits in {(time.perf_counter() - started) * 1000:.1f} ms; {corpus.stats()}")
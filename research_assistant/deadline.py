@@ -0,0 +1,120 @@
+"""
+Request deadlines and cancellation for server tools.
+
+A tool call gets one time budget from whichever of these is shortest:
+- the tool's own timeout argument (seconds);
+- the caller's MCP request metadata: "deadline_ms" (relative budget) or
+  "deadline" (absolute Unix time in seconds);
+- the server default.
+Every later step (connect, SSL retry, reading the body, parsing) uses only
+what is left of that budget, never a fresh timeout of its own.
+
+run_until() runs the tool's work as a task. It cancels the task when the
+deadline passes or the HTTP client disconnects; the latter is polled through
+the Starlette request of the current MCP call. A notifications/cancelled
+from the client cancels the handler itself, and that cancellation reaches
+the same task.
+"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+DISCONNECT_POLL_S = 0.25
+
+
+class DeadlineExceeded(TimeoutError):
+    """The caller's time budget ran out before the work finished."""
+
+
+class ClientGone(ConnectionError):
+    """The caller disconnected; nobody is waiting for the result."""
+
+
+class Deadline:
+    def __init__(self, seconds: float):
+        self.budget = seconds
+        self.at = time.monotonic() + seconds
+
+    @classmethod
+    def for_request(cls, timeout: float = 0.0, default: float = 20.0) -> "Deadline":
+        budgets = [default]
+        if timeout and timeout > 0:
+            budgets.append(timeout)
+        from_meta = _meta_budget()
+        if from_meta is not None:
+            budgets.append(from_meta)
+        return cls(min(budgets))
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.at
+
+    def remaining(self) -> float:
+        """Seconds left; raises DeadlineExceeded when there are none."""
+        left = self.at - time.monotonic()
+        if left <= 0:
+            raise DeadlineExceeded(f"deadline of {self.budget:.1f}s exceeded")
+        return left
+
+
+def _meta_budget() -> Optional[float]:
+    """Budget in seconds from the current MCP request's _meta, if the caller sent one."""
+    try:
+        from fastmcp.server.dependencies import get_context
+
+        meta = get_context().request_context.meta
+    except Exception:
+        return None
+    if meta is None:
+        return None
+    extra = getattr(meta, "model_extra", None) or {}
+    if extra.get("deadline_ms") is not None:
+        return max(0.0, float(extra["deadline_ms"]) / 1000)
+    if extra.get("deadline") is not None:
+        return max(0.0, float(extra["deadline"]) - time.time())
+    return None
+
+
+def disconnect_probe() -> Optional[Callable[[], Awaitable[bool]]]:
+    """request.is_disconnected of the current HTTP MCP call (None for stdio or outside a request)."""
+    try:
+        from fastmcp.server.dependencies import get_context
+
+        request = get_context().request_context.request
+    except Exception:
+        return None
+    return getattr(request, "is_disconnected", None)
+
+
+def _consume(task: "asyncio.Task[Any]") -> None:
+    if not task.cancelled():
+        task.exception()  # abandoned task: don't log "exception was never retrieved"
+
+
+async def run_until(work: Awaitable[T], deadline: Deadline,
+                    disconnected: Optional[Callable[[], Awaitable[bool]]] = None) -> T:
+    """Await work, cancelling it when the deadline passes or the client disconnects."""
+    task = asyncio.ensure_future(work)
+    try:
+        while True:
+            left = deadline.at - time.monotonic()
+            if left <= 0:
+                raise DeadlineExceeded(f"deadline of {deadline.budget:.1f}s exceeded")
+            wait = min(left, DISCONNECT_POLL_S) if disconnected is not None else left
+            done, _ = await asyncio.wait({task}, timeout=wait)
+            if done:
+                return task.result()
+            if disconnected is not None:
+                try:
+                    gone = await disconnected()
+                except Exception:
+                    gone = False
+                if gone:
+                    raise ClientGone("client disconnected")
+    finally:
+        if not task.done():
+            task.cancel()
+            task.add_done_callback(_consume)
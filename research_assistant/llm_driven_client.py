@@ -6,11 +6,14 @@ from typing import Any, Dict, List
 from dotenv import load_dotenv
 import re
 
-import google.generativeai as genai
 from fastmcp import Client as MCPClient
 from semantic_kernel import Kernel
 from semantic_kernel.functions import kernel_function
 
+from common import tracing
+from common.llm_gateway import get_gateway
+from research_assistant.memory import ConversationMemory
+
 SERVER_URL = "http://127.0.0.1:8010/mcp"
 load_dotenv()
 
@@ -21,7 +24,7 @@ class LLM:
         api_key = os.getenv("GOOGLE_API_KEY")
         if not api_key:
             raise RuntimeError("GOOGLE_API_KEY not set in .env")
-        genai.configure(api_key=api_key)
+        self.gateway = get_gateway()
         self.model = model or os.getenv("GEMINI_MODEL") or "gemini-1.5-flash"
 
     async def ask(self, query: str) -> str:
@@ -37,9 +40,14 @@ class LLM:
             "If no tool is needed, just answer normally."
         )
 
-        mdl = genai.GenerativeModel(self.model, system_instruction=system_instruction)
-        res = mdl.generate_content(query).text
-        return res or ""
+        return await self.gateway.generate(
+            query, model=self.model, system_instruction=system_instruction, priority="interactive"
+        )
+
+    async def complete(self, prompt: str) -> str:
+        """Plain completion without the tool-routing instruction (used for memory compaction)."""
+        # Background work: queue behind interactive turns
+        return await self.gateway.generate(prompt, model=self.model, priority="batch", max_retries=1)
 
 
 class MCPTools:
@@ -64,7 +72,7 @@ class MCPTools:
 
     async def search_web(self, query: str, max_results: int = 5) -> List[Dict[str, Any]]:
         async with MCPClient(self.server_url) as client:
-            res = await client.call_tool("search_web", {"query": query, "max_results": max_results})
+            res = await tracing.call_tool(client, "search_web", {"query": query, "max_results": max_results})
             raw = self._unwrap_result(res)
             if isinstance(raw, str):
                 try:
@@ -79,7 +87,7 @@ class MCPTools:
 
     async def fetch_url(self, url: str, max_chars: int = 4000) -> Dict[str, Any]:
         async with MCPClient(self.server_url) as client:
-            res = await client.call_tool("fetch_url", {"url": url, "max_chars": max_chars})
+            res = await tracing.call_tool(client, "fetch_url", {"url": url, "max_chars": max_chars})
             raw = self._unwrap_result(res)
             if isinstance(raw, str):
                 try:
@@ -94,13 +102,46 @@ class MCPTools:
 
 
 class SimpleAgent:
-    def __init__(self, server_url: str = SERVER_URL, model: str | None = None):
+    def __init__(self, server_url: str = SERVER_URL, model: str | None = None, memory_tokens: int = 1500):
         self.llm = LLM(model)
         self.tools = MCPTools(server_url)
+        # Bounded multi-turn memory; old turns are compacted in the background
+        self.memory = ConversationMemory(self.llm.complete, max_tokens=memory_tokens)
+
+    def _with_context(self, prompt: str) -> str:
+        context = self.memory.render()
+        if not context:
+            return prompt
+        return f"{context}\n\nCurrent request:\n{prompt}"
+
+    async def _search_web(self, query: str, max_results: int = 5) -> List[Dict[str, Any]]:
+        key = f"{query.strip().lower()}|{max_results}"
+        cached = self.memory.recall_tool_result("search_web", key)
+        if cached is not None:
+            return cached
+        results = await self.tools.search_web(query, max_results=max_results)
+        if results:
+            self.memory.remember_tool_result("search_web", key, results)
+        return results
+
+    async def _fetch_url(self, url: str, max_chars: int = 4000) -> Dict[str, Any]:
+        cached = self.memory.recall_tool_result("fetch_url", url)
+        if cached is not None and len(cached.get("text") or "") >= min(max_chars, cached.get("length") or 0):
+            return cached
+        page = await self.tools.fetch_url(url, max_chars=max_chars)
+        if page:
+            self.memory.remember_tool_result("fetch_url", url, page)
+        return page
 
     async def run(self, user_query: str) -> str:
-        # Step 1: LLM decides what to do
-        decision = await self.llm.ask(user_query)
+        with tracing.span("simple_agent.run", cat="client"):
+            reply = await self._run(user_query)
+        self.memory.add_turn(user_query, reply)
+        return reply
+
+    async def _run(self, user_query: str) -> str:
+        # Step 1: LLM decides what to do (with conversation context for follow-ups)
+        decision = await self.llm.ask(self._with_context(user_query))
 
         # --- Clean JSON output from Gemini (strip ```json ... ```) ---
         cleaned = re.sub(r"```(?:json)?", "", decision, flags=re.IGNORECASE).strip("` \n")
@@ -109,14 +150,14 @@ class SimpleAgent:
             action = json.loads(cleaned)
         except Exception:
             # Fallback: ask to produce a concise paragraph directly
-            fallback = await self.llm.ask(
+            fallback = await self.llm.ask(self._with_context(
                 "Write a concise paragraph explaining the topic in simple terms: " + user_query
-            )
+            ))
             return fallback
 
         # Step 2: Handle actions
         if action.get("action") == "search_web":
-            results = await self.tools.search_web(**action["args"])
+            results = await self._search_web(**action["args"])
 
             # Extract snippets + titles for context
             snippets = []
@@ -128,10 +169,10 @@ class SimpleAgent:
 
             if not snippets:
                 # Graceful fallback: answer directly as a paragraph
-                direct = await self.llm.ask(
+                direct = await self.llm.ask(self._with_context(
                     "Write a concise paragraph explaining the topic in simple terms: "
                     + user_query
-                )
+                ))
                 return direct
 
             # Ask LLM to turn snippets into a paragraph
@@ -149,7 +190,7 @@ class SimpleAgent:
 
             summaries = []
             for u in urls:
-                page = await self.tools.fetch_url(**u)
+                page = await self._fetch_url(**u)
                 content = (page.get("text") or "")[:1500]
                 summary = await self.llm.ask(
                     f"Summarize this webpage into a clear paragraph:\n\n{content}"
@@ -164,10 +205,24 @@ class SimpleAgent:
 
 # ------------------ Main ------------------
 async def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="LLM-driven research agent")
+    parser.add_argument("--trace", type=str, default=None, help="Write Chrome-trace/Perfetto JSON spans to this file")
+    args = parser.parse_args()
+    if args.trace:
+        tracing.enable(args.trace, process_name="llm_driven_client")
+
     agent = SimpleAgent()
-    query = input("Ask me something: ")
-    reply = await agent.run(query)
-    print(reply)
+    # Multi-turn loop; an empty line (or "exit") ends the session
+    while True:
+        # input() blocks; run it in a thread so background summarization keeps going
+        query = (await asyncio.to_thread(input, "Ask me something: ")).strip()
+        if not query or query.lower() in ("exit", "quit"):
+            break
+        reply = await agent.run(query)
+        print(reply)
+    await agent.memory.wait_idle()
 
 
 if __name__ == "__main__":
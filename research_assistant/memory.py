@@ -0,0 +1,154 @@
+import asyncio
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 chars per token) used for budgeting prompts."""
+    return max(1, len(text) // 4) if text else 0
+
+
+def _truncate_tokens(text: str, max_tokens: int) -> str:
+    limit = max(0, max_tokens) * 4
+    if len(text) <= limit:
+        return text
+    return text[:limit].rstrip() + "…"
+
+
+@dataclass
+class Turn:
+    user: str
+    assistant: str
+
+    def render(self) -> str:
+        return f"User: {self.user}\nAssistant: {self.assistant}"
+
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.render())
+
+
+class ConversationMemory:
+    """
+    Multi-turn memory with a strict token budget.
+    - The newest turns are kept verbatim (recent window).
+    - Turns that fall out of the window are folded into a running summary by a
+      background task, so the context rendered for each prompt stays flat.
+      Until the new summary lands they are still rendered (newest first, in
+      whatever budget the summary and recent turns leave), so a follow-up asked
+      mid-compaction does not lose them.
+    - Tool results (search snippets, page texts) are kept in a small LRU cache
+      so follow-up turns can reuse them without another MCP round trip.
+    """
+
+    def __init__(
+        self,
+        summarize: Callable[[str], Awaitable[str]],
+        max_tokens: int = 1500,
+        summary_share: float = 0.35,
+        max_turn_tokens: int = 300,
+        tool_cache_entries: int = 32,
+    ):
+        self._summarize = summarize
+        self.max_tokens = max_tokens
+        self.summary_tokens = int(max_tokens * summary_share)
+        self.recent_tokens = max_tokens - self.summary_tokens
+        self.max_turn_tokens = max_turn_tokens
+        self.summary = ""
+        self._recent: List[Turn] = []
+        self._pending: List[Turn] = []
+        self._summarizing: List[Turn] = []  # batch handed to the summarizer, not yet in self.summary
+        self._compactor: Optional[asyncio.Task] = None
+        self._tool_cache: "OrderedDict[Tuple[str, str], Any]" = OrderedDict()
+        self._tool_cache_entries = tool_cache_entries
+
+    # ---- turns ----
+    def add_turn(self, user: str, assistant: str) -> None:
+        turn = Turn(
+            _truncate_tokens(user.strip(), self.max_turn_tokens // 3),
+            _truncate_tokens(assistant.strip(), self.max_turn_tokens),
+        )
+        self._recent.append(turn)
+        # Spill the oldest turns out of the recent window once it is over budget
+        while len(self._recent) > 1 and sum(t.tokens for t in self._recent) > self.recent_tokens:
+            self._pending.append(self._recent.pop(0))
+        if self._pending and (self._compactor is None or self._compactor.done()):
+            self._compactor = asyncio.create_task(self._compact())
+
+    async def _compact(self) -> None:
+        while self._pending:
+            batch, self._pending = self._pending, []
+            self._summarizing = batch
+            transcript = "\n\n".join(t.render() for t in batch)
+            prompt = (
+                "Update the running summary of a conversation between a user and a research assistant.\n"
+                f"Keep it under {self.summary_tokens * 3 // 4} words. Keep facts, names, URLs and open questions; "
+                "drop pleasantries.\n\n"
+                f"Current summary:\n{self.summary or '(empty)'}\n\n"
+                f"New turns:\n{transcript}\n\n"
+                "Updated summary:"
+            )
+            try:
+                updated = (await self._summarize(prompt)).strip()
+            except Exception:
+                updated = ""
+            if not updated:
+                # Extractive fallback: keep the question and first sentence of each answer
+                parts = [self.summary] if self.summary else []
+                for t in batch:
+                    parts.append(f"- {t.user} -> {t.assistant.split('. ')[0]}")
+                updated = "\n".join(parts)
+            # Keep the newest facts when the summary itself is over budget
+            limit = self.summary_tokens * 4
+            self.summary = updated if len(updated) <= limit else "…" + updated[-limit:]
+            self._summarizing = []
+
+    async def wait_idle(self) -> None:
+        """Wait for any background compaction to finish."""
+        if self._compactor is not None:
+            await asyncio.gather(self._compactor, return_exceptions=True)
+
+    def render(self) -> str:
+        """Render the memory as prompt context; never exceeds max_tokens."""
+        in_flight = self._summarizing + self._pending
+        if not self.summary and not self._recent and not in_flight:
+            return ""
+        lines: List[str] = []
+        summary = _truncate_tokens(self.summary, self.summary_tokens) if self.summary else ""
+        if summary:
+            lines.append("Conversation summary:\n" + summary)
+        # Newest turns first until the recent budget is used up
+        kept: List[str] = []
+        used = 0
+        for t in reversed(self._recent):
+            if used + t.tokens > self.recent_tokens:
+                break
+            kept.insert(0, t.render())
+            used += t.tokens
+        # Turns still being summarized fill what is left of the overall budget
+        spare = self.max_tokens - used - estimate_tokens(summary)
+        earlier: List[str] = []
+        for t in reversed(in_flight):
+            if t.tokens > spare:
+                break
+            earlier.insert(0, t.render())
+            spare -= t.tokens
+        if earlier:
+            lines.append("Earlier turns (being summarized):\n" + "\n\n".join(earlier))
+        if kept:
+            lines.append("Recent turns:\n" + "\n\n".join(kept))
+        return "\n\n".join(lines)
+
+    # ---- tool results ----
+    def remember_tool_result(self, tool: str, key: str, value: Any) -> None:
+        self._tool_cache[(tool, key)] = value
+        self._tool_cache.move_to_end((tool, key))
+        while len(self._tool_cache) > self._tool_cache_entries:
+            self._tool_cache.popitem(last=False)
+
+    def recall_tool_result(self, tool: str, key: str) -> Any:
+        value = self._tool_cache.get((tool, key))
+        if value is not None:
+            self._tool_cache.move_to_end((tool, key))
+        return value
@@ -0,0 +1,128 @@
+"""
+Fetched pages addressed by content hash, so page text crosses the wire once.
+
+fetch_url stores each extracted page here and returns a handle
+(res://page/{sha256}) with a short preview. Clients pass handles around, for
+example in the findings of the research_summarize prompt. The server resolves
+handles locally, and clients read slices through the resources
+res://page/{sha256} and res://page/{sha256}/{start}/{end}.
+
+Pages live in a byte-bounded in-process LRU. When the shared store is
+available (store.py), pages are also written there, so a handle created by one
+pre-fork worker resolves in the others.
+
+Configuration (env): RA_PAGE_STORE_BYTES (in-process budget, default 64 MB),
+RA_PAGE_TTL (shared-store lifetime in seconds, default 3600).
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from research_assistant.store import SharedStore
+
+HANDLE_PREFIX = "res://page/"
+PREVIEW_CHARS = 300
+
+
+def handle_for(sha256: str) -> str:
+    return f"{HANDLE_PREFIX}{sha256}"
+
+
+def sha_from_handle(handle: str) -> str:
+    """Accept a full handle, a range URI under it or a bare hash; return the hash."""
+    if handle.startswith(HANDLE_PREFIX):
+        handle = handle[len(HANDLE_PREFIX):]
+    return handle.split("/", 1)[0]
+
+
+class PageStore:
+    def __init__(self, max_bytes: int = 64_000_000, shared: Optional[SharedStore] = None, ttl: float = 3600.0):
+        self.max_bytes = max_bytes
+        self.shared = shared
+        self.ttl = ttl
+        self._pages: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls, shared: Optional[SharedStore]) -> "PageStore":
+        return cls(
+            max_bytes=int(os.getenv("RA_PAGE_STORE_BYTES", "64000000")),
+            shared=shared,
+            ttl=float(os.getenv("RA_PAGE_TTL", "3600")),
+        )
+
+    @staticmethod
+    def _size(page: Dict[str, Any]) -> int:
+        return len(page["text"].encode("utf-8")) + len(page.get("title") or "") + len(page.get("url") or "")
+
+    def _remember(self, sha: str, page: Dict[str, Any]) -> None:
+        with self._lock:
+            if sha in self._pages:
+                return
+            self._pages[sha] = page
+            self._bytes += self._size(page)
+            while self._bytes > self.max_bytes and len(self._pages) > 1:
+                _, old = self._pages.popitem(last=False)
+                self._bytes -= self._size(old)
+
+    def put(self, text: str, title: str = "", url: str = "", length: Optional[int] = None) -> str:
+        """Store a page; returns its handle. Identical text always yields the same handle."""
+        sha = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        with self._lock:
+            if sha in self._pages:
+                self._pages.move_to_end(sha)
+                return handle_for(sha)
+        page = {"title": title, "url": url, "text": text, "length": len(text) if length is None else length}
+        self._remember(sha, page)
+        if self.shared is not None:
+            self.shared.put("page", sha, json.dumps(page), self.ttl)
+        return handle_for(sha)
+
+    def get(self, handle: str) -> Optional[Dict[str, Any]]:
+        sha = sha_from_handle(handle)
+        with self._lock:
+            page = self._pages.get(sha)
+            if page is not None:
+                self._pages.move_to_end(sha)
+        if page is None and self.shared is not None:
+            raw = self.shared.get("page", sha)
+            if raw is not None:
+                page = json.loads(raw)
+                self._remember(sha, page)
+        if page is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return page
+
+    def read(self, handle: str, start: int = 0, end: Optional[int] = None) -> str:
+        """Text of the page in [start, end); raises KeyError for unknown or expired handles."""
+        page = self.get(handle)
+        if page is None:
+            raise KeyError(f"Unknown or expired page handle: {handle}")
+        return page["text"][max(0, start):end]
+
+    def describe(self, handle: str, max_chars: Optional[int] = None) -> Dict[str, Any]:
+        """The fetch_url payload for a stored page: handle and preview, plus text when max_chars is given."""
+        page = self.get(handle)
+        if page is None:
+            raise KeyError(f"Unknown or expired page handle: {handle}")
+        out = {
+            "title": page["title"],
+            "handle": handle_for(sha_from_handle(handle)),
+            "preview": page["text"][:PREVIEW_CHARS],
+            "length": page["length"],
+        }
+        if max_chars is not None:
+            out["text"] = page["text"][:max_chars]
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        return {"pages": len(self._pages), "bytes": self._bytes, "hits": self.hits, "misses": self.misses}
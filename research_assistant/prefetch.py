@@ -0,0 +1,166 @@
+"""
+Speculative prefetch of search results.
+
+Clients nearly always call fetch_url on the top few results right after
+search_web. With prefetch on, search_web starts background fetch-and-extract
+jobs for the top k URLs. A later fetch_url for one of them joins the running
+job or takes the warm result instead of starting from scratch.
+
+Guard rails:
+- at most max_jobs jobs run at once. Further URLs are not prefetched (they
+  are skipped, not queued);
+- unclaimed warm pages may hold at most max_bytes; beyond that, nothing new
+  is scheduled;
+- jobs and warm pages unclaimed after ttl seconds are cancelled or dropped
+  and counted as waste.
+
+Prefetch state is per process. Under the pre-fork server, a fetch_url that
+lands on another worker still benefits once the job has finished, because
+the extracted page is in the shared store by then.
+
+Configuration (env): RA_PREFETCH_K (URLs per search, default 0 = off),
+RA_PREFETCH_MAX_JOBS (default 8), RA_PREFETCH_BYTES (default 20 MB),
+RA_PREFETCH_TTL (seconds, default 120).
+"""
+
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+# fetch(url) -> (page handle, extracted text bytes, response validators {"etag", "last_modified"})
+FetchFn = Callable[[str], Awaitable[Tuple[str, int, Dict[str, str]]]]
+Claimed = Tuple[str, Dict[str, str]]  # (page handle, response validators)
+
+
+class Prefetcher:
+    def __init__(self, fetch: FetchFn, k: int = 0, max_jobs: int = 8, max_bytes: int = 20_000_000,
+                 ttl: float = 120.0):
+        self.fetch = fetch
+        self.k = k
+        self.max_jobs = max_jobs
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._jobs: Dict[str, Tuple[asyncio.Task, float]] = {}  # url -> (task, started)
+        self._warm: Dict[str, Tuple[Claimed, int, float]] = {}  # url -> ((handle, validators), bytes, ready at)
+        self._warm_bytes = 0
+        self.counts = {
+            "scheduled": 0, "skipped_budget": 0, "hits_warm": 0, "hits_joined": 0, "misses": 0,
+            "failed": 0, "cancelled": 0, "wasted_pages": 0, "wasted_bytes": 0, "useful_bytes": 0,
+        }
+
+    @classmethod
+    def from_env(cls, fetch: FetchFn) -> "Prefetcher":
+        return cls(
+            fetch,
+            k=int(os.getenv("RA_PREFETCH_K", "0")),
+            max_jobs=int(os.getenv("RA_PREFETCH_MAX_JOBS", "8")),
+            max_bytes=int(os.getenv("RA_PREFETCH_BYTES", "20000000")),
+            ttl=float(os.getenv("RA_PREFETCH_TTL", "120")),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.k > 0
+
+    def schedule(self, urls: Iterable[str]) -> int:
+        """Start jobs for the first k new URLs; returns how many were started."""
+        if not self.enabled:
+            return 0
+        self._sweep()
+        started = 0
+        for url in list(urls)[: self.k]:
+            if not url or url in self._jobs or url in self._warm:
+                continue
+            if len(self._jobs) >= self.max_jobs or self._warm_bytes >= self.max_bytes:
+                self.counts["skipped_budget"] += 1
+                continue
+            task = asyncio.create_task(self._run(url), name=f"prefetch {url}")
+            self._jobs[url] = (task, time.monotonic())
+            self.counts["scheduled"] += 1
+            started += 1
+        return started
+
+    async def _run(self, url: str) -> Optional[Claimed]:
+        try:
+            handle, nbytes, validators = await self.fetch(url)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.counts["failed"] += 1
+            return None
+        finally:
+            self._jobs.pop(url, None)
+        self._warm[url] = ((handle, validators), nbytes, time.monotonic())
+        self._warm_bytes += nbytes
+        return handle, validators
+
+    async def claim(self, url: str) -> Optional[Claimed]:
+        """(handle, validators) of a prefetched page (waiting for a running job), or None when there is none."""
+        if not self.enabled:
+            return None
+        self._sweep()
+        if url in self._warm:
+            self.counts["hits_warm"] += 1
+            return self._take(url)
+        job = self._jobs.get(url)
+        if job is None:
+            self.counts["misses"] += 1
+            return None
+        try:
+            # shield: a caller that gives up must not cancel the job for others
+            claimed = await asyncio.shield(job[0])
+        except asyncio.CancelledError:
+            if job[0].cancelled():
+                return None
+            raise
+        if claimed is None:
+            return None  # failed; the caller fetches itself and sees the real error
+        self.counts["hits_joined"] += 1
+        self._take(url)
+        return claimed
+
+    def _take(self, url: str) -> Optional[Claimed]:
+        entry = self._warm.pop(url, None)
+        if entry is None:
+            return None
+        claimed, nbytes, _ = entry
+        self._warm_bytes -= nbytes
+        self.counts["useful_bytes"] += nbytes
+        return claimed
+
+    def _sweep(self) -> None:
+        now = time.monotonic()
+        for url, (_, nbytes, ready) in list(self._warm.items()):
+            if now - ready > self.ttl:
+                del self._warm[url]
+                self._warm_bytes -= nbytes
+                self.counts["wasted_pages"] += 1
+                self.counts["wasted_bytes"] += nbytes
+        for url, (task, started) in list(self._jobs.items()):
+            if now - started > self.ttl:
+                task.cancel()
+                self._jobs.pop(url, None)
+                self.counts["cancelled"] += 1
+
+    def cancel_all(self) -> None:
+        for task, _ in self._jobs.values():
+            task.cancel()
+        self.counts["cancelled"] += len(self._jobs)
+        self._jobs.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        self._sweep()
+        c = self.counts
+        hits = c["hits_warm"] + c["hits_joined"]
+        settled = c["useful_bytes"] + c["wasted_bytes"]
+        return {
+            "k": self.k,
+            **c,
+            "in_flight": len(self._jobs),
+            "warm_pages": len(self._warm),
+            "warm_bytes": self._warm_bytes,
+            # share of fetch_url calls served by prefetch, and share of prefetched bytes that were used
+            "hit_rate": round(hits / (hits + c["misses"]), 3) if hits + c["misses"] else None,
+            "use_rate": round(c["useful_bytes"] / settled, 3) if settled else None,
+        }
@@ -0,0 +1,278 @@
+"""
+Pre-fork supervisor: N research server worker processes behind one port.
+
+The supervisor binds the listening socket once and starts workers. Each worker
+runs uvicorn on that shared socket, so the kernel spreads connections across
+them. Details:
+- Every worker is a fresh interpreter (python -m research_assistant.prefork
+  --worker ...) that inherits the socket and imports the server module and all
+  of its helpers from scratch. Nothing is shared with the supervisor's own
+  imports.
+- Workers serve the streamable HTTP app in stateless mode. Streamable HTTP
+  sessions live in the memory of the worker that created them, and a client's
+  next request may land on a different worker, so no request depends on
+  server-side session state. Caches live in the shared SQLite store
+  (store.py), not in worker memory.
+- A worker reports ready only once uvicorn has run the app's lifespan startup
+  and is serving on the socket.
+- A crashed worker is restarted. If it crashed within CRASH_WINDOW seconds
+  of starting, its slot backs off exponentially (1 s, 2 s, 4 s ... up to
+  10 s). The main loop schedules the restart, so other slots and signals
+  are still handled in the meantime.
+- SIGHUP performs a graceful reload:
+  1. New workers are started. They import the server code fresh, so code
+     changes (in the server and in its helper modules) are picked up.
+  2. Once every new worker reports ready, the old workers get SIGTERM. They
+     stop accepting, finish their in-flight calls (up to `grace` seconds) and
+     exit. The socket is never closed, so no connection is refused.
+  3. If the new workers fail to start, the old ones keep serving.
+- SIGTERM/SIGINT stop all workers gracefully.
+Needs fd inheritance (Linux/macOS). Elsewhere, serve() runs a single process.
+
+    python -m research_assistant.server --workers 4
+    kill -HUP <supervisor pid>    # reload
+"""
+
+import argparse
+import asyncio
+import importlib
+import os
+import select
+import signal
+import socket
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional, Set
+
+from common import tracing
+
+CRASH_WINDOW = 5.0  # a worker exiting sooner than this after start counts as a crash loop
+MAX_BACKOFF = 10.0
+
+
+def _log(msg: str) -> None:
+    print(f"[prefork {os.getpid()}] {msg}", file=sys.stderr, flush=True)
+
+
+def _bind(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    return sock
+
+
+def _worker(module: str, sock_fd: int, ready_fd: int, slot: int, grace: float, trace: Optional[str]) -> None:
+    """Body of a worker process; never returns."""
+    code = 0
+    try:
+        import uvicorn
+
+        # One trace file per worker (--trace or MCP_TRACE), so workers never write over each other
+        trace = trace or os.getenv("MCP_TRACE")
+        if trace:
+            root, ext = os.path.splitext(trace)
+            tracing.enable(f"{root}.w{slot}.{os.getpid()}{ext or '.json'}", process_name=f"research_server_w{slot}")
+        sock = socket.socket(fileno=sock_fd)
+        app = importlib.import_module(module).create_app()
+        server = uvicorn.Server(uvicorn.Config(
+            app, lifespan="on", log_level="warning", timeout_graceful_shutdown=int(grace),
+        ))
+
+        async def _serve() -> None:
+            task = asyncio.create_task(server.serve(sockets=[sock]))
+            # server.started is set after lifespan startup, once the socket is being served
+            while not server.started:
+                if task.done():
+                    await task
+                    raise RuntimeError("server exited during startup")
+                await asyncio.sleep(0.05)
+            os.write(ready_fd, b"r")
+            os.close(ready_fd)
+            await task
+
+        asyncio.run(_serve())
+    except BaseException as e:  # noqa: BLE001 - report and exit non-zero
+        _log(f"worker {slot} failed: {type(e).__name__}: {e}")
+        code = 1
+    finally:
+        try:
+            tracing.flush()
+        except Exception:
+            pass
+        os._exit(code)
+
+
+class Supervisor:
+    def __init__(self, module: str, host: str, port: int, workers: int, grace: float = 30.0,
+                 trace: Optional[str] = None):
+        self.module = module
+        self.host = host
+        self.port = port
+        self.n = workers
+        self.grace = grace
+        self.trace = trace
+        self.sock: Optional[socket.socket] = None
+        self.procs: Dict[int, subprocess.Popen] = {}  # pid -> process, every worker not yet reaped
+        self.slots: Dict[int, int] = {}  # pid -> slot, live workers of the current generation
+        self.retiring: Set[int] = set()
+        self.started: Dict[int, float] = {}  # pid -> time it reported ready
+        self.backoff: Dict[int, float] = {}  # slot -> delay before its next restart
+        self.restart_at: Dict[int, float] = {}  # slot -> when to restart it
+        self._reload = False
+        self._stop = False
+
+    def _spawn(self, slot: int) -> Optional[int]:
+        """Start one worker and wait until it serves; returns its pid or None."""
+        r, w = os.pipe()
+        cmd: List[str] = [
+            sys.executable, "-m", "research_assistant.prefork", "--worker", self.module,
+            "--sock-fd", str(self.sock.fileno()), "--ready-fd", str(w),  # type: ignore[union-attr]
+            "--slot", str(slot), "--grace", str(self.grace),
+        ]
+        if self.trace:
+            cmd += ["--trace", self.trace]
+        try:
+            proc = subprocess.Popen(cmd, pass_fds=(self.sock.fileno(), w))  # type: ignore[union-attr]
+        finally:
+            os.close(w)
+        self.procs[proc.pid] = proc
+        try:
+            # EOF (worker died) also makes the pipe readable, so a failed start is noticed at once
+            ready, _, _ = select.select([r], [], [], 60)
+            ok = bool(ready) and os.read(r, 1) == b"r"
+        except InterruptedError:
+            ok = False
+        finally:
+            os.close(r)
+        if not ok:
+            _log(f"worker {slot} (pid {proc.pid}) did not start")
+            self._kill(proc.pid, signal.SIGKILL)
+            return None
+        self.started[proc.pid] = time.monotonic()
+        return proc.pid
+
+    def _kill(self, pid: int, sig: int) -> None:
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            pass
+
+    def _reap(self) -> None:
+        now = time.monotonic()
+        for pid, proc in list(self.procs.items()):
+            status = proc.poll()
+            if status is None:
+                continue
+            del self.procs[pid]
+            started = self.started.pop(pid, None)
+            if pid in self.retiring:
+                self.retiring.discard(pid)
+                continue
+            slot = self.slots.pop(pid, None)
+            if slot is None or self._stop:
+                continue
+            if started is not None and now - started >= CRASH_WINDOW:
+                self.backoff.pop(slot, None)  # ran fine for a while: restart at once
+            else:
+                self.backoff[slot] = min(MAX_BACKOFF, self.backoff.get(slot, 0.5) * 2)
+            delay = self.backoff.get(slot, 0.0)
+            _log(f"worker {slot} (pid {pid}) exited with status {status}; restarting in {delay:.0f}s")
+            self.restart_at[slot] = now + delay
+
+    def _restart_due(self) -> None:
+        now = time.monotonic()
+        for slot, at in list(self.restart_at.items()):
+            if at > now:
+                continue
+            del self.restart_at[slot]
+            pid = self._spawn(slot)
+            if pid is None:
+                self.backoff[slot] = min(MAX_BACKOFF, self.backoff.get(slot, 0.5) * 2)
+                self.restart_at[slot] = time.monotonic() + self.backoff[slot]
+            else:
+                self.slots[pid] = slot
+
+    def _do_reload(self) -> None:
+        _log("reloading")
+        fresh: Dict[int, int] = {}
+        for slot in range(self.n):
+            pid = self._spawn(slot)
+            if pid is None:
+                # New code doesn't start: keep the old generation serving
+                for p in fresh:
+                    self._kill(p, signal.SIGTERM)
+                    self.retiring.add(p)
+                _log("reload aborted; previous workers keep serving")
+                return
+            fresh[pid] = slot
+        old = list(self.slots)
+        self.slots = fresh
+        self.restart_at.clear()  # the new generation fills every slot
+        self.backoff.clear()
+        for pid in old:
+            self.retiring.add(pid)
+            self._kill(pid, signal.SIGTERM)  # uvicorn drains in-flight requests, then exits
+        _log(f"reloaded: {len(fresh)} new workers, {len(old)} draining")
+
+    def _shutdown(self) -> None:
+        for pid in self.procs:
+            self._kill(pid, signal.SIGTERM)
+        deadline = time.monotonic() + self.grace + 5
+        for proc in self.procs.values():
+            try:
+                proc.wait(timeout=max(0.0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
+
+    def run(self) -> None:
+        self.sock = _bind(self.host, self.port)
+        signal.signal(signal.SIGHUP, lambda *_: setattr(self, "_reload", True))
+        signal.signal(signal.SIGTERM, lambda *_: setattr(self, "_stop", True))
+        signal.signal(signal.SIGINT, lambda *_: setattr(self, "_stop", True))
+        for slot in range(self.n):
+            pid = self._spawn(slot)
+            if pid is not None:
+                self.slots[pid] = slot
+        if not self.slots:
+            self._shutdown()
+            raise SystemExit("no worker could start")
+        _log(f"serving http://{self.host}:{self.port}/mcp with {len(self.slots)} workers (SIGHUP to reload)")
+        try:
+            while not self._stop:
+                if self._reload:
+                    self._reload = False
+                    self._do_reload()
+                self._reap()
+                self._restart_due()
+                time.sleep(0.2)
+        finally:
+            self._shutdown()
+            self.sock.close()
+
+
+def serve(module: str, host: str = "127.0.0.1", port: int = 8010, workers: int = 2, grace: float = 30.0,
+          trace: Optional[str] = None) -> None:
+    """Serve module.create_app() from `workers` processes on one port."""
+    if os.name != "posix":
+        _log("socket inheritance is not available on this platform; serving from a single process")
+        import uvicorn
+
+        uvicorn.run(importlib.import_module(module).create_app(), host=host, port=port, log_level="warning")
+        return
+    Supervisor(module, host, port, workers, grace, trace).run()
+
+
+if __name__ == "__main__":
+    # Worker entry point; started by Supervisor._spawn, not meant to be run by hand
+    parser = argparse.ArgumentParser(description="Pre-fork server worker")
+    parser.add_argument("--worker", required=True, help="Module providing create_app()")
+    parser.add_argument("--sock-fd", type=int, required=True)
+    parser.add_argument("--ready-fd", type=int, required=True)
+    parser.add_argument("--slot", type=int, default=0)
+    parser.add_argument("--grace", type=float, default=30.0)
+    parser.add_argument("--trace", type=str, default=None)
+    args = parser.parse_args()
+    _worker(args.worker, args.sock_fd, args.ready_fd, args.slot, args.grace, args.trace)
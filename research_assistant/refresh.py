@@ -0,0 +1,313 @@
+"""
+Incremental refresh of a saved research report.
+
+A full run (client.py --out report.md) also writes report.md.manifest.json
+next to the report. For every fetched source it records the page handle and
+HTTP validators (ETag / Last-Modified). For every "## " section it records
+which sources the section cites, taken from its [n] citations and the Sources
+list.
+
+client.py --refresh then:
+1. re-checks every source with a conditional fetch_url (If-None-Match /
+   If-Modified-Since). Unchanged pages come back as 304 with no body and no
+   parsing. Sources the report took from the server's local corpus have no
+   validators yet, so their first refresh is a full fetch, compared by
+   content hash with the corpus copy the report used. A source with nothing
+   to compare against (an older manifest) is recorded as a baseline and
+   counted as unchanged;
+2. runs one search_web for the topic to find sources the report doesn't know
+   yet, and fetches at most max_new of them;
+3. rewrites only the sections that cite a changed source or are the closest
+   match for a new source (one LLM call per affected section), adds new
+   sources to the Sources list, and leaves every other section untouched.
+With no changes and no new sources, a refresh makes no LLM calls and costs one
+search plus one conditional request per source.
+"""
+
+import datetime
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from fastmcp import Client
+
+from common import tracing
+from common.llm_gateway import get_gateway
+from common.textsearch import idf, overlap_score, tokenize
+
+MANIFEST_VERSION = 1
+SECTION_EVIDENCE_CHARS = 4000
+
+_URL = re.compile(r"https?://[^\s)>\]]+")
+_CITE = re.compile(r"\[(\d+)\]")
+_SOURCE_NUM = re.compile(r"^\s*(?:[-*]\s*)?(?:\[(\d+)\]|(\d+)[.)])")
+
+
+def manifest_path(out_file: str) -> Path:
+    p = Path(out_file)
+    return p.with_name(p.name + ".manifest.json")
+
+
+def split_sections(md: str) -> List[Tuple[str, str]]:
+    """[(heading, raw text)] split at "## " lines; the part before the first one has heading ""."""
+    sections: List[Tuple[str, str]] = []
+    heading = ""
+    lines: List[str] = []
+    for line in md.splitlines(keepends=True):
+        if line.startswith("## "):
+            sections.append((heading, "".join(lines)))
+            heading, lines = line[3:].strip(), []
+        lines.append(line)
+    sections.append((heading, "".join(lines)))
+    return [s for s in sections if s[0] or s[1].strip()]
+
+
+def _is_sources(heading: str) -> bool:
+    return heading.strip().lower() in ("sources", "references")
+
+
+def _citations(sections: List[Tuple[str, str]]) -> Dict[int, str]:
+    """Citation number -> URL from the Sources section ("1. Title - url", "[1] Title (url)", ...)."""
+    out: Dict[int, str] = {}
+    for heading, text in sections:
+        if not _is_sources(heading):
+            continue
+        for i, line in enumerate(l for l in text.splitlines()[1:] if _URL.search(l)):
+            m = _SOURCE_NUM.match(line)
+            n = int(m.group(1) or m.group(2)) if m else i + 1
+            out[n] = _URL.search(line).group(0).rstrip(".,;")  # type: ignore[union-attr]
+    return out
+
+
+def _cited_urls(text: str, citations: Dict[int, str]) -> Set[str]:
+    urls = {citations[int(n)] for n in _CITE.findall(text) if int(n) in citations}
+    urls.update(u.rstrip(".,;") for u in _URL.findall(text))
+    return urls
+
+
+def _sha(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def build_manifest(topic: str, report_md: str, pages: List[Dict[str, Any]],
+                   results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    sections = split_sections(report_md)
+    citations = _citations(sections)
+    now = datetime.datetime.utcnow().isoformat() + "Z"
+    sources = {
+        p["url"]: {
+            "title": p.get("title") or "",
+            "handle": p.get("handle") or "",
+            "etag": p.get("etag") or "",
+            "last_modified": p.get("last_modified") or "",
+            "checked_at": now,
+        }
+        for p in pages if p.get("url")
+    }
+    return {
+        "version": MANIFEST_VERSION,
+        "topic": topic,
+        "updated_at": now,
+        "sources": sources,
+        "known_urls": sorted({r["url"] for r in results if r.get("url")} | set(sources)),
+        "sections": [
+            {"heading": h, "sha256": _sha(t), "sources": sorted(_cited_urls(t, citations))}
+            for h, t in sections
+        ],
+    }
+
+
+def write_manifest(out_file: str, topic: str, report_md: str, pages: List[Dict[str, Any]],
+                   results: List[Dict[str, Any]]) -> Path:
+    path = manifest_path(out_file)
+    path.write_text(json.dumps(build_manifest(topic, report_md, pages, results), indent=2), encoding="utf-8")
+    return path
+
+
+def load_manifest(out_file: str) -> Optional[Dict[str, Any]]:
+    path = manifest_path(out_file)
+    if not path.exists() or not Path(out_file).exists():
+        return None
+    manifest = json.loads(path.read_text(encoding="utf-8"))
+    return manifest if manifest.get("version") == MANIFEST_VERSION else None
+
+
+def _tool_json(res: Any) -> Any:
+    content = getattr(res, "content", None) or []
+    txt = getattr(content[0], "text", "") if content else ""
+    return json.loads(txt) if txt else None
+
+
+async def _page_text(client: Client, handle: str, chars: int = SECTION_EVIDENCE_CHARS) -> str:
+    """First chars of a stored page, read by handle instead of fetching the text again."""
+    try:
+        contents = await client.read_resource(f"{handle}/0/{chars}")
+        return getattr(contents[0], "text", "") if contents else ""
+    except Exception:
+        return ""
+
+
+async def _rewrite_section(topic: str, heading: str, text: str, evidence: List[Dict[str, Any]],
+                           model: Optional[str]) -> Optional[str]:
+    ev = "\n\n".join(f"[{e['n']}] {e['title']} ({e['url']})\n{e['text']}" for e in evidence)
+    prompt = (
+        f"Below is the section \"{heading}\" of a Markdown research report on: {topic}\n"
+        "Some of its sources changed or new sources appeared. Update the section with the evidence: "
+        "keep what still holds, correct what changed, add what is new. Keep the heading line, the style "
+        "and the existing [n] citations; cite the evidence with the numbers given. Return only the section.\n\n"
+        f"Current section:\n{text}\n\nEvidence:\n{ev}\n"
+    )
+    try:
+        out = await get_gateway().generate(
+            prompt,
+            model=model or os.getenv("GEMINI_MODEL") or "gemini-1.5-flash",
+            system_instruction="You are a precise research writer editing one section of a Markdown report.",
+            fallback_model="gemini-1.5-flash",
+        )
+    except Exception:
+        return None
+    out = out.strip()
+    if not out:
+        return None
+    if not out.startswith("## "):
+        out = f"## {heading}\n\n{out}"
+    return out + "\n\n"
+
+
+async def refresh_report(server_url: str, out_file: str, topic: Optional[str] = None, max_results: int = 6,
+                         insecure_ssl: bool = False, max_new: int = 3, model: Optional[str] = None) -> Dict[str, Any]:
+    """Refresh out_file in place; returns counters. Needs a manifest from an earlier full run."""
+    manifest = load_manifest(out_file)
+    if manifest is None:
+        raise FileNotFoundError(f"No report/manifest to refresh at {out_file}; run once without --refresh")
+    topic = topic or manifest["topic"]
+    report_md = Path(out_file).read_text(encoding="utf-8")
+    sections = split_sections(report_md)
+    citations = _citations(sections)
+    stats = {"checked": 0, "not_modified": 0, "baselined": 0, "changed": 0, "failed": 0, "new": 0,
+             "sections_rewritten": 0, "llm_calls": 0}
+    changed: Dict[str, Dict[str, Any]] = {}
+    new: Dict[str, Dict[str, Any]] = {}
+    now = datetime.datetime.utcnow().isoformat() + "Z"
+
+    with tracing.span("refresh", cat="client", topic=topic):
+        async with Client(server_url) as client:
+            # 1) conditional re-check of every known source
+            for url, src in manifest["sources"].items():
+                stats["checked"] += 1
+                # With a handle, the server compares the fetched text against it even when there are no validators
+                conditional = bool(src.get("handle") or src.get("etag") or src.get("last_modified"))
+                try:
+                    res = _tool_json(await tracing.call_tool(client, "fetch_url", {
+                        "url": url, "inline": False, "insecure": insecure_ssl, "known_handle": src.get("handle", ""),
+                        "etag": src.get("etag", ""), "last_modified": src.get("last_modified", ""),
+                    }))
+                except Exception:
+                    stats["failed"] += 1
+                    continue
+                src["checked_at"] = now
+                src.update({k: res[k] for k in ("etag", "last_modified") if res.get(k)})
+                if conditional and not res.get("changed"):
+                    stats["not_modified"] += 1
+                    continue
+                if not conditional:
+                    # Nothing to compare against: this fetch becomes the baseline for the next refresh
+                    stats["baselined"] += 1
+                    src.update(handle=res["handle"], title=res.get("title") or src.get("title", ""))
+                    continue
+                stats["changed"] += 1
+                src.update(handle=res["handle"], title=res.get("title") or src.get("title", ""))
+                changed[url] = src
+
+            # 2) one search for sources the report doesn't know yet
+            known = set(manifest.get("known_urls", [])) | set(manifest["sources"])
+            try:
+                results = _tool_json(await tracing.call_tool(
+                    client, "search_web", {"query": topic, "max_results": max_results}
+                )) or []
+            except Exception:
+                results = []
+            for r in results:
+                url = r.get("url")
+                if not url or url in known:
+                    continue
+                known.add(url)
+                if len(new) >= max_new:
+                    continue
+                try:
+                    res = _tool_json(await tracing.call_tool(
+                        client, "fetch_url", {"url": url, "inline": False, "insecure": insecure_ssl}
+                    ))
+                except Exception:
+                    continue
+                new[url] = {"title": res.get("title") or r.get("title") or "", "handle": res["handle"],
+                            "etag": res.get("etag", ""), "last_modified": res.get("last_modified", ""),
+                            "checked_at": now}
+            stats["new"] = len(new)
+
+            # 3) sections to rewrite: those citing a changed source, and the best match for each new one
+            body = [i for i, (h, _) in enumerate(sections) if h and not _is_sources(h)]
+            affected: Dict[int, Set[str]] = {}
+            for i in body:
+                hit = _cited_urls(sections[i][1], citations) & set(changed)
+                if hit:
+                    affected.setdefault(i, set()).update(hit)
+            next_n = max(citations, default=0) + 1
+            numbers = {url: n for n, url in citations.items()}
+            for url in new:
+                numbers[url] = next_n
+                next_n += 1
+            if new and body:
+                docs = [tokenize(sections[i][1]) for i in body]
+                weights = idf(docs)
+                for url, src in new.items():
+                    preview = await _page_text(client, src["handle"], 1500)
+                    terms = tokenize(f"{src['title']} {preview}")
+                    scores = [overlap_score(terms, d, weights) for d in docs]
+                    best = body[max(range(len(body)), key=lambda j: scores[j])] if any(scores) else body[0]
+                    affected.setdefault(best, set()).add(url)
+
+            for i, urls in sorted(affected.items()):
+                evidence = []
+                for url in sorted(urls, key=lambda u: numbers.get(u, 0)):
+                    src = changed.get(url) or new[url]
+                    evidence.append({"n": numbers.get(url, "?"), "title": src.get("title", ""), "url": url,
+                                     "text": await _page_text(client, src["handle"])})
+                heading, text = sections[i]
+                stats["llm_calls"] += 1
+                rewritten = await _rewrite_section(topic, heading, text, evidence, model)
+                if rewritten is not None:
+                    sections[i] = (heading, rewritten)
+                    stats["sections_rewritten"] += 1
+
+    if not (changed or new):
+        manifest["updated_at"] = now
+        manifest_path(out_file).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+        return stats
+
+    # 4) merge: new sources go to the end of the Sources list
+    if new:
+        lines = "".join(f"- [{numbers[u]}] {s['title'] or u} — {u}\n" for u, s in new.items())
+        idx = next((i for i, (h, _) in enumerate(sections) if _is_sources(h)), None)
+        if idx is None:
+            sections.append(("Sources", "## Sources\n\n" + lines))
+        else:
+            h, t = sections[idx]
+            sections[idx] = (h, t.rstrip("\n") + "\n" + lines + "\n")
+    merged = "".join(t for _, t in sections)
+    Path(out_file).write_text(merged, encoding="utf-8")
+
+    manifest["sources"].update(new)
+    manifest["known_urls"] = sorted(known)
+    merged_sections = split_sections(merged)
+    merged_citations = _citations(merged_sections)
+    manifest["sections"] = [
+        {"heading": h, "sha256": _sha(t), "sources": sorted(_cited_urls(t, merged_citations))}
+        for h, t in merged_sections
+    ]
+    manifest["updated_at"] = now
+    manifest_path(out_file).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    return stats
@@ -0,0 +1,227 @@
+"""
+Hedged web search across several backends.
+
+search_web used to wait on a single DuckDuckGo call, so one slow or
+rate-limited backend stalled the whole pipeline. HedgedSearch queries
+backends in order of preference:
+1. the first backend starts at once;
+2. if it has not answered within hedge_after seconds (or it failed or
+   returned nothing), the next one starts, and so on down the list;
+3. once any backend returns results, the others get grace seconds to
+   finish. Backends still running after that are cancelled;
+4. the result lists are merged with reciprocal rank fusion
+   (score = sum of 1 / (RRF_K + rank)) and deduplicated by normalized URL.
+A backend wins a query when its results arrive first. Per-backend calls,
+errors, cancellations, wins and latency percentiles are kept for
+server_stats.
+
+Backends are plain objects with a name and an async search(query, n)
+returning [{"title", "url", "snippet"}]:
+- DDGBackend: DuckDuckGo, run in a worker thread (the library is blocking).
+  Cancelling only stops waiting; the thread finishes in the background.
+- CorpusBackend: the local corpus of fetched pages (corpus.py). It needs no
+  network, so RA_SEARCH_BACKENDS=corpus gives offline, deterministic results.
+
+Configuration (env): RA_SEARCH_BACKENDS (comma-separated order, default
+"ddg,corpus"), RA_SEARCH_HEDGE_MS (default 800), RA_SEARCH_GRACE_MS
+(default 150).
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+from research_assistant.sessions import normalize_url
+
+RRF_K = 60
+SNIPPET_CHARS = 300
+LATENCY_SAMPLES = 256
+
+
+class BackendUnavailable(RuntimeError):
+    """The backend is not configured on this server (e.g. the corpus is off)."""
+
+
+class DDGBackend:
+    name = "ddg"
+
+    def __init__(self, factory: Callable[[], Any]):
+        self.factory = factory  # returns a DDGS() context manager; late-bound so it can be swapped
+
+    def _search(self, query: str, n: int) -> List[Dict[str, Any]]:
+        with self.factory() as ddgs:
+            return [
+                {"title": r.get("title"), "url": r.get("href"), "snippet": r.get("body")}
+                for r in ddgs.text(query, max_results=n, safesearch="Moderate")
+            ]
+
+    async def search(self, query: str, n: int) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(self._search, query, n)
+
+
+class CorpusBackend:
+    name = "corpus"
+
+    def __init__(self, corpus: Callable[[], Any]):
+        self.corpus = corpus  # returns the Corpus, or None when it is disabled
+
+    async def search(self, query: str, n: int) -> List[Dict[str, Any]]:
+        corpus = self.corpus()
+        if corpus is None:
+            raise BackendUnavailable("local corpus is disabled")
+        hits = await asyncio.to_thread(corpus.search, query, n, SNIPPET_CHARS, 1)
+        return [{"title": h["title"], "url": h["url"], "snippet": h["text"]} for h in hits]
+
+
+def fuse(ranked: Dict[str, List[Dict[str, Any]]], n: int) -> List[Dict[str, Any]]:
+    """Reciprocal rank fusion of {backend: results}; one entry per normalized URL, best first."""
+    merged: Dict[str, Dict[str, Any]] = {}
+    scores: Dict[str, float] = {}
+    for name, results in ranked.items():
+        seen = set()
+        for rank, r in enumerate(results):
+            if not r.get("url"):
+                continue
+            key = normalize_url(r["url"])
+            if key in seen:
+                continue
+            seen.add(key)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (RRF_K + rank + 1)
+            entry = merged.setdefault(key, {"title": r.get("title"), "url": r["url"], "snippet": r.get("snippet"),
+                                            "backends": []})
+            entry["backends"].append(name)
+    order = sorted(merged, key=lambda key: -scores[key])
+    return [merged[key] for key in order[:n]]
+
+
+class _BackendStats:
+    def __init__(self):
+        self.counts = {"calls": 0, "hedged_calls": 0, "errors": 0, "unavailable": 0, "empty": 0, "cancelled": 0,
+                       "wins": 0}
+        self.latencies: Deque[float] = deque(maxlen=LATENCY_SAMPLES)
+
+    def stats(self, queries: int) -> Dict[str, Any]:
+        lat = sorted(self.latencies)
+
+        def pct(p: float) -> Optional[float]:
+            return round(lat[min(len(lat) - 1, int(p * len(lat)))] * 1000, 1) if lat else None
+
+        return {
+            **self.counts,
+            "win_rate": round(self.counts["wins"] / queries, 3) if queries else None,
+            "latency_ms_p50": pct(0.5),
+            "latency_ms_p95": pct(0.95),
+            "latency_ms_mean": round(sum(lat) / len(lat) * 1000, 1) if lat else None,
+        }
+
+
+class HedgedSearch:
+    def __init__(self, backends: Sequence[Any], hedge_after: float = 0.8, grace: float = 0.15):
+        self.backends = list(backends)
+        self.hedge_after = hedge_after
+        self.grace = grace
+        self.queries = 0
+        self._stats = {b.name: _BackendStats() for b in self.backends}
+
+    @classmethod
+    def from_env(cls, available: Dict[str, Any]) -> "HedgedSearch":
+        """Backends named in RA_SEARCH_BACKENDS, picked from available ({name: backend})."""
+        names = [n.strip() for n in os.getenv("RA_SEARCH_BACKENDS", "ddg,corpus").split(",") if n.strip()]
+        unknown = [n for n in names if n not in available]
+        if unknown:
+            raise ValueError(f"Unknown search backend(s) {unknown}; choose from {sorted(available)}")
+        return cls(
+            [available[n] for n in names],
+            hedge_after=float(os.getenv("RA_SEARCH_HEDGE_MS", "800")) / 1000,
+            grace=float(os.getenv("RA_SEARCH_GRACE_MS", "150")) / 1000,
+        )
+
+    async def search(self, query: str, n: int) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """(fused results, info) where info names the winner and the backends that answered or were cut off."""
+        self.queries += 1
+        pending: Dict["asyncio.Task[List[Dict[str, Any]]]", Tuple[str, float]] = {}
+        ranked: Dict[str, List[Dict[str, Any]]] = {}
+        errors: Dict[str, str] = {}
+        empty: List[str] = []
+        winner: Optional[str] = None
+        first_at: Optional[float] = None
+        next_i = 0
+        last_launch = 0.0
+
+        def launch() -> None:
+            nonlocal next_i, last_launch
+            backend = self.backends[next_i]
+            st = self._stats[backend.name]
+            st.counts["calls"] += 1
+            if next_i:
+                st.counts["hedged_calls"] += 1
+            last_launch = time.monotonic()
+            task = asyncio.create_task(backend.search(query, n), name=f"search {backend.name}")
+            pending[task] = (backend.name, last_launch)
+            next_i += 1
+
+        launch()
+        try:
+            while pending:
+                now = time.monotonic()
+                if first_at is not None:
+                    timeout: Optional[float] = max(0.0, first_at + self.grace - now)
+                elif next_i < len(self.backends):
+                    timeout = max(0.0, last_launch + self.hedge_after - now)
+                else:
+                    timeout = None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    name, started = pending.pop(task)
+                    st = self._stats[name]
+                    st.latencies.append(time.monotonic() - started)
+                    if isinstance(task.exception(), BackendUnavailable):
+                        st.counts["unavailable"] += 1  # not configured here: neither an error nor an answer
+                        continue
+                    if task.exception() is not None:
+                        st.counts["errors"] += 1
+                        errors[name] = f"{type(task.exception()).__name__}: {task.exception()}"
+                        continue
+                    results = task.result()
+                    if not results:
+                        st.counts["empty"] += 1
+                        empty.append(name)
+                        continue
+                    ranked[name] = results
+                    if winner is None:
+                        winner, first_at = name, time.monotonic()
+                        st.counts["wins"] += 1
+                if first_at is not None:
+                    if time.monotonic() >= first_at + self.grace:
+                        break
+                    continue
+                # hedge: the running backends are too slow, or all of them came back failed/empty
+                if next_i < len(self.backends) and (not done or not pending):
+                    launch()
+        finally:
+            cut_off = [name for name, _ in pending.values()]
+            for task, (name, _) in pending.items():
+                task.cancel()
+                task.add_done_callback(_consume)
+                self._stats[name].counts["cancelled"] += 1
+        # No results is a valid answer; fail only when no backend answered at all
+        if not ranked and not empty and errors:
+            raise RuntimeError(f"All search backends failed: {errors}")
+        return fuse(ranked, n), {"winner": winner, "answered": sorted(ranked), "cancelled": cut_off,
+                                 "errors": errors}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "order": [b.name for b in self.backends],
+            "hedge_after_ms": round(self.hedge_after * 1000),
+            "grace_ms": round(self.grace * 1000),
+            "queries": self.queries,
+            "backends": {name: st.stats(self.queries) for name, st in self._stats.items()},
+        }
+
+
+def _consume(task: "asyncio.Task[Any]") -> None:
+    if not task.cancelled():
+        task.exception()  # abandoned task: don't log "exception was never retrieved"
@@ -1,70 +1,353 @@
 import asyncio
 import datetime
-from typing import List, Dict, Any
+import os
+import threading
+from contextlib import asynccontextmanager
+from typing import List, Dict, Any, Optional, Tuple
 import httpx, certifi, json, ssl
 from fastmcp import FastMCP
 from duckduckgo_search import DDGS
 import httpx
 from bs4 import BeautifulSoup
 
+from common import tracing
+from research_assistant.admission import PARSE_OVERHEAD, Admission, Reservation, ToolMemory
+from research_assistant.corpus import Corpus
+from research_assistant.deadline import ClientGone, Deadline, DeadlineExceeded, disconnect_probe, run_until
+from research_assistant.pages import PageStore, handle_for
+from research_assistant.prefetch import Prefetcher
+from research_assistant.search import CorpusBackend, DDGBackend, HedgedSearch
+from research_assistant.sessions import ResearchSessions
+from research_assistant.store import SharedStore
 
-mcp = FastMCP("AI Research Assistant Server")
+
+@asynccontextmanager
+async def _lifespan(server):
+    try:
+        yield
+    finally:
+        PREFETCH.cancel_all()
+
+
+mcp = FastMCP("AI Research Assistant Server", lifespan=_lifespan)
+
+# Search results and fetched pages, shared by every worker process (see prefork.py)
+STORE = SharedStore.from_env()
+SEARCH_TTL = float(os.getenv("RA_SEARCH_TTL", "600"))
+FETCH_TTL = float(os.getenv("RA_FETCH_TTL", "3600"))
+MAX_CACHED_CHARS = 200_000
+# Response bodies are read up to this many bytes; the rest of a page is dropped
+MAX_PAGE_BYTES = int(os.getenv("RA_MAX_PAGE_BYTES", "5000000"))
+# Total time budget of one fetch_url (HTTP, SSL retry and parsing) unless the caller asks for less
+FETCH_TIMEOUT = float(os.getenv("RA_FETCH_TIMEOUT", "20"))
+_FETCH_ABORTS = {"deadline_exceeded": 0, "client_gone": 0, "cancelled": 0}
+# Concurrent fetch/parse jobs, their wait queue and memory budget (see admission.py)
+ADMISSION = Admission.from_env()
+# Per-tool tracemalloc peaks when RA_TRACEMALLOC=1
+MEMORY = ToolMemory.from_env()
+# Extracted pages by content hash; fetch_url returns res://page/{sha256} handles into this store
+PAGES = PageStore.from_env(STORE)
+# Characters of each handle-only page that research_summarize puts into the prompt
+PROMPT_PAGE_CHARS = 8000
+# Evidence gathered by search_web/fetch_url calls tagged with a session_id
+SESSIONS = ResearchSessions.from_env(STORE)
+# Every fetched page, searchable across sessions (needs NumPy; RA_CORPUS=off disables it)
+CORPUS = Corpus.from_env()
+_INGEST_TASKS: set = set()
+# Speculative fetches of the top search results (RA_PREFETCH_K, off by default)
+PREFETCH = Prefetcher.from_env(lambda url: _prefetch_page(url))
+# search_web backends in order of preference, hedged and rank-fused (RA_SEARCH_BACKENDS, see search.py)
+SEARCH = HedgedSearch.from_env({
+    "ddg": DDGBackend(lambda: DDGS()),
+    "corpus": CorpusBackend(lambda: CORPUS),
+})
 
 
 @mcp.tool(
     name="search_web",
-    description="Search the web for recent information about an AI-related topic using DuckDuckGo. Returns a list of results with title, href, and snippet.",
+    description=(
+        "Search the web for recent information about an AI-related topic using DuckDuckGo, hedged with the "
+        "server's other backends (e.g. the local corpus) when it is slow. Returns a list of results with title, "
+        "url, snippet and the backends that found them. Pass session_id to collect the results for "
+        "research_summarize."
+    ),
 )
-async def search_web(query: str, max_results: int = 5) -> str:
-    results: List[Dict[str, Any]] = []
-    with DDGS() as ddgs:
-        for r in ddgs.text(query, max_results=max_results, safesearch="Moderate"):  # type: ignore[arg-type]
-            # r contains: title, href, body
-            results.append({
-                "title": r.get("title"),
-            "url": r.get("href"),
-                "snippet": r.get("body"),
-            })
-    return json.dumps(results)
+async def search_web(query: str, max_results: int = 5, session_id: str = "") -> str:
+    with tracing.tool_span("tool.search_web", query=query, max_results=max_results) as sp, \
+            MEMORY.track("search_web"):
+        payload = await _search(query, max_results, sp)
+        if PREFETCH.enabled:
+            sp.set(prefetch=PREFETCH.schedule(r.get("url") for r in json.loads(payload)))
+        if session_id:
+            SESSIONS.add(session_id, "search", {"query": query, "results": json.loads(payload)})
+        return payload
+
+
+async def _search(query: str, max_results: int, sp: Any) -> str:
+    cache_key = f"{max_results}|{query}"
+    cached = STORE.get("search", cache_key) if STORE is not None else None
+    if cached is not None:
+        sp.set(cache="hit")
+        return cached
+    with tracing.span("search.hedged", cat="server") as ssp:
+        results, info = await SEARCH.search(query, max_results)
+        ssp.set(winner=info["winner"], answered=",".join(info["answered"]), cancelled=",".join(info["cancelled"]))
+    sp.set(backends=",".join(info["answered"]))
+    payload = json.dumps(results)
+    # Cache only answers the preferred backend took part in, so a hedged fallback isn't served for SEARCH_TTL
+    if STORE is not None and results and SEARCH.backends[0].name in info["answered"]:
+        STORE.put("search", cache_key, payload, SEARCH_TTL)
+    return payload
+
 
 @mcp.tool(
     name="fetch_url",
-    description="Fetch a URL and extract readable text content. Returns title and first N chars of text.",
+    description=(
+        "Fetch a URL and extract readable text content. Returns title, a res://page/{sha256} handle, "
+        "a short preview and the length; with inline=true (default) also the first max_chars of text. "
+        "Read slices later via the res://page/{sha256}/{start}/{end} resource. "
+        "Pass session_id to collect the page for research_summarize. For refreshes pass known_handle, "
+        "etag and last_modified from an earlier result: unchanged pages return {changed: false}. "
+        "timeout (seconds) bounds the whole call; it is aborted if the client cancels or disconnects. "
+        "Fails fast with 'server busy' when the server is saturated; retry later."
+    ),
 )
-async def fetch_url(url: str, max_chars: int = 5000, insecure: bool = False) -> str:
+async def fetch_url(url: str, max_chars: int = 5000, insecure: bool = False, inline: bool = True,
+                    session_id: str = "", known_handle: str = "", etag: str = "", last_modified: str = "",
+                    timeout: float = 0) -> str:
     """
     Fetch a URL and return structured text.
     - Uses certifi CA bundle for secure SSL by default.
     - If SSL fails, will retry with insecure=True.
+    - The extracted page is kept in PAGES; pass inline=False to get only the handle and preview.
+    - Refresh: pass the handle and validators (etag / last_modified) from an earlier fetch. The request is
+      conditional; an unchanged page returns {"changed": false} without text, a changed one the new page.
+    - The whole call shares one deadline (timeout, request _meta deadline_ms/deadline, or FETCH_TIMEOUT).
+      It is aborted when that passes, the client cancels, or the HTTP client disconnects.
+    - Fetches go through ADMISSION: when too many are running and queued, the call fails fast with ServerBusy.
     """
-    verify_option = False if insecure else certifi.where()
+    conditional = bool(known_handle or etag or last_modified)
+    with tracing.tool_span("tool.fetch_url", url=url, max_chars=max_chars, inline=inline,
+                           conditional=conditional) as sp, MEMORY.track("fetch_url"):
+        deadline = Deadline.for_request(timeout, default=FETCH_TIMEOUT)
+
+        async def work() -> Tuple[Optional[str], Dict[str, str]]:
+            # Joining a running prefetch is bounded by this call's deadline too (claim shields the job itself)
+            claimed = await PREFETCH.claim(url) if not conditional else None
+            if claimed is not None:
+                sp.set(prefetch="hit")
+                return claimed
+            return await _fetch_page(url, insecure, sp, {"etag": etag, "last_modified": last_modified}, deadline,
+                                     revalidate=conditional)
+
+        try:
+            handle, validators = await run_until(work(), deadline, disconnect_probe())
+        except (DeadlineExceeded, asyncio.TimeoutError):
+            _FETCH_ABORTS["deadline_exceeded"] += 1
+            sp.set(aborted="deadline")
+            raise DeadlineExceeded(f"fetch_url {url}: deadline of {deadline.budget:.1f}s exceeded") from None
+        except ClientGone:
+            _FETCH_ABORTS["client_gone"] += 1
+            sp.set(aborted="client_gone")
+            raise
+        except asyncio.CancelledError:
+            _FETCH_ABORTS["cancelled"] += 1
+            sp.set(aborted="cancelled")
+            raise
+        if handle is None or (known_handle and handle == known_handle):
+            sp.set(changed=False)
+            return json.dumps({"changed": False, "handle": known_handle, **validators})
+        page = PAGES.describe(handle, max_chars if inline else None)
+        if session_id:
+            SESSIONS.add(session_id, "page", {"url": url, "title": page["title"], "handle": handle})
+        if conditional:
+            page["changed"] = True
+        return json.dumps({**page, **validators})
+
+
+async def _http_get(url: str, verify: Any, headers: Dict[str, str], deadline: Deadline,
+                    reservation: Reservation) -> Tuple[httpx.Response, str]:
+    """
+    (response, body text). The body is streamed, capped at MAX_PAGE_BYTES, and reserved against the
+    memory budget (x PARSE_OVERHEAD for the parse that follows) as it arrives.
+    """
+    budget = deadline.remaining()
+
+    async def get() -> Tuple[httpx.Response, str]:
+        async with httpx.AsyncClient(timeout=budget, verify=verify, follow_redirects=True) as client:
+            async with client.stream("GET", url, headers=headers) as resp:
+                if resp.status_code == 304:
+                    return resp, ""
+                resp.raise_for_status()
+                declared = int(resp.headers.get("content-length") or 0)
+                if declared:
+                    await reservation.reserve(min(declared, MAX_PAGE_BYTES) * PARSE_OVERHEAD)
+                body = bytearray()
+                async for chunk in resp.aiter_bytes():
+                    body += chunk
+                    await reservation.reserve(len(body) * PARSE_OVERHEAD)
+                    if len(body) >= MAX_PAGE_BYTES:
+                        del body[MAX_PAGE_BYTES:]
+                        break
+                return resp, body.decode(resp.charset_encoding or "utf-8", errors="replace")
+
+    # httpx timeouts are per phase; wait_for caps connect + headers + body together
+    return await asyncio.wait_for(get(), timeout=budget)
 
-    try:
-        async with httpx.AsyncClient(timeout=20, verify=verify_option, follow_redirects=True) as client:
-            resp = await client.get(url)
-            resp.raise_for_status()
-            html = resp.text
-    except ssl.SSLError as e:
-        # Retry with insecure if SSL fails
-        async with httpx.AsyncClient(timeout=20, verify=False, follow_redirects=True) as client:
-            resp = await client.get(url)
-            resp.raise_for_status()
-            html = resp.text
 
+def _is_ssl_error(exc: BaseException) -> bool:
+    seen: Optional[BaseException] = exc
+    while seen is not None:
+        if isinstance(seen, ssl.SSLError):
+            return True
+        seen = seen.__cause__ or seen.__context__
+    return False
+
+
+def _extract(html: str, abort: threading.Event) -> Tuple[str, str]:
+    """(title, text) of an HTML page; runs in a worker thread and stops between steps once abort is set."""
     soup = BeautifulSoup(html, "html.parser")
+    if abort.is_set():
+        raise DeadlineExceeded("parse aborted")
     # Remove script/style/noscript
     for tag in soup(["script", "style", "noscript"]):
         tag.decompose()
-
+    if abort.is_set():
+        raise DeadlineExceeded("parse aborted")
     title = (soup.title.string.strip() if soup.title and soup.title.string else "")
     text = " ".join(soup.get_text(" ").split())
+    return title, text
+
+
+async def _fetch_page(url: str, insecure: bool, sp: Any, validators: Optional[Dict[str, str]] = None,
+                      deadline: Optional[Deadline] = None, queue: bool = True,
+                      revalidate: bool = False) -> Tuple[Optional[str], Dict[str, str]]:
+    """
+    Fetch and extract url (or reuse the cached extract); returns (page handle, response validators).
+    With validators from an earlier response the request is conditional, and the handle is None on 304.
+    revalidate=True (refreshes) skips the cached extract and always asks the origin.
+    HTTP and parsing hold an ADMISSION slot; queue=False raises ServerBusy at once instead of waiting for one.
+    """
+    cached = STORE.get("fetch", url) if STORE is not None and not revalidate else None
+    entry = json.loads(cached) if cached is not None else {}
+    if entry.get("handle") and PAGES.get(entry["handle"]) is not None:
+        sp.set(cache="hit")
+        return entry["handle"], {k: entry[k] for k in ("etag", "last_modified") if entry.get(k)}
+    headers: Dict[str, str] = {}
+    if validators and validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators and validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
+    deadline = deadline or Deadline(FETCH_TIMEOUT)
+    verify_option = False if insecure else certifi.where()
+    async with ADMISSION.slot(timeout=deadline.remaining(), wait=queue) as reservation:
+        try:
+            with tracing.span("fetch.http", cat="server", url=url):
+                resp, html = await _http_get(url, verify_option, headers, deadline, reservation)
+        except httpx.ConnectError as e:
+            # httpx wraps TLS failures in ConnectError; retry those insecurely, within what is left of the budget
+            if verify_option is False or not _is_ssl_error(e):
+                raise
+            with tracing.span("fetch.http_insecure_retry", cat="server", url=url):
+                resp, html = await _http_get(url, False, headers, deadline, reservation)
+        fresh = {k: v for k, v in (("etag", resp.headers.get("etag")), ("last_modified", resp.headers.get("last-modified"))) if v}
+        if resp.status_code == 304:
+            sp.set(not_modified=True)
+            return None, {**{k: v for k, v in (validators or {}).items() if v}, **fresh}
+
+        with tracing.span("parse.html", cat="server", bytes=len(html)):
+            # In a thread, so a cancelled or timed-out call stops waiting at once and the loop stays free
+            abort = threading.Event()
+            try:
+                title, text = await asyncio.wait_for(asyncio.to_thread(_extract, html, abort), deadline.remaining())
+            except BaseException:
+                abort.set()
+                raise
+        sp.set(html_bytes=len(html), text_chars=len(text), reserved_bytes=reservation.nbytes)
+        del html
+    handle = PAGES.put(text[:MAX_CACHED_CHARS], title=title, url=url, length=len(text))
+    if STORE is not None:
+        STORE.put("fetch", url, json.dumps({"handle": handle, **fresh}), FETCH_TTL)
+    if CORPUS is not None:
+        # Off the request path: vectorizing a long page takes a few ms
+        task = asyncio.create_task(asyncio.to_thread(CORPUS.add, url, title, text[:MAX_CACHED_CHARS]))
+        _INGEST_TASKS.add(task)
+        task.add_done_callback(_INGEST_TASKS.discard)
+    return handle, fresh
+
 
+async def _prefetch_page(url: str) -> Tuple[str, int, Dict[str, str]]:
+    with tracing.span("prefetch.fetch_url", cat="server", url=url) as sp:
+        # Never queue behind client requests: a busy server skips the prefetch instead
+        handle, validators = await _fetch_page(url, False, sp, queue=False)
+    page = PAGES.get(handle) if handle else None
+    return handle or "", len(page["text"]) if page else 0, validators
+
+
+@mcp.tool(
+    name="search_corpus",
+    description=(
+        "Search the local corpus of previously fetched pages. Returns JSON passages "
+        "[{url, title, text, score, handle}] best first; handle names the page version the passage came from. "
+        "Pass session_id to add them to a research session."
+    ),
+)
+def search_corpus(query: str, k: int = 5, max_chars: int = 1500, session_id: str = "") -> str:
+    with tracing.tool_span("tool.search_corpus", query=query, k=k) as sp, MEMORY.track("search_corpus"):
+        if CORPUS is None:
+            raise ValueError("The local corpus is disabled on this server (RA_CORPUS=off or NumPy missing)")
+        hits = CORPUS.search(query, k=k, max_chars=max_chars)
+        for h in hits:
+            sha = h.pop("sha256", "")
+            h["handle"] = handle_for(sha) if sha else ""
+        sp.set(hits=len(hits))
+        if session_id:
+            for h in hits:
+                SESSIONS.add(session_id, "passage", {"url": h["url"], "title": h["title"], "text": h["text"]})
+        return json.dumps(hits, ensure_ascii=False)
+
+
+@mcp.tool(
+    name="server_stats",
+    description=(
+        "Server counters as JSON: search backend latency and win rates, admission (in-flight, queued, rejected, reserved bytes), per-tool memory peaks, "
+        "prefetch hit rate and wasted bytes, page store and shared store usage."
+    ),
+)
+def server_stats() -> str:
     return json.dumps({
-        "title": title,
-        "text": text[:max_chars],
-        "length": len(text),
+        "pid": os.getpid(),
+        "prefetch": PREFETCH.stats(),
+        "fetch_aborts": _FETCH_ABORTS,
+        "search": SEARCH.stats(),
+        "admission": ADMISSION.stats(),
+        "memory": MEMORY.stats(),
+        "pages": PAGES.stats(),
+        "corpus": CORPUS.stats() if CORPUS is not None else None,
+        "store": STORE.stats() if STORE is not None else None,
     })
 
+
+@mcp.resource(
+    "res://page/{sha256}",
+    name="Fetched Page",
+    description="Full extracted text of a page returned by fetch_url (by content hash).",
+    mime_type="text/plain",
+)
+def page_resource(sha256: str) -> str:
+    return PAGES.read(sha256)
+
+
+@mcp.resource(
+    "res://page/{sha256}/{start}/{end}",
+    name="Fetched Page Range",
+    description="Characters [start, end) of a page returned by fetch_url.",
+    mime_type="text/plain",
+)
+def page_range_resource(sha256: str, start: str, end: str) -> str:
+    return PAGES.read(sha256, int(start), int(end))
+
+
 @mcp.resource(
     "res://about.txt",
     name="About Research Assistant",
@@ -76,7 +359,8 @@ def about_resource() -> str:
     return (
         "AI Research Assistant MCP Server\n"
         f"Last updated: {datetime.datetime.utcnow().isoformat()}Z\n"
-        "Tools: search_web, fetch_url.\n"
+        "Tools: search_web, fetch_url, search_corpus, server_stats.\n"
+        "Resources: res://page/{sha256}, res://page/{sha256}/{start}/{end}.\n"
         "Prompt: research_summarize.\n"
     )
 
@@ -84,9 +368,42 @@ def about_resource() -> str:
 @mcp.prompt(
     "research_summarize",
     title="Research Summarization Prompt",
-    description="Prompt template for summarizing research findings with citations.",
+    description=(
+        "Prompt template for summarizing research findings with citations. Pass findings_json, or the "
+        "session_id used with search_web/fetch_url to have the server assemble the evidence."
+    ),
 )
-def research_prompt(topic: str = "", findings_json: str = "") -> str:
+def research_prompt(topic: str = "", findings_json: str = "", session_id: str = "") -> str:
+    """Evidence comes from findings_json or, when session_id is given, from that research session."""
+    with tracing.tool_span("prompt.research_summarize", findings_chars=len(findings_json),
+                           session=bool(session_id)) as sp:
+        if session_id:
+            evidence = SESSIONS.evidence(session_id, PAGES, PROMPT_PAGE_CHARS)
+            sp.set(results=len(evidence["results"]), pages=len(evidence["pages"]))
+            return _render_research_prompt(topic, json.dumps(evidence, ensure_ascii=False, separators=(",", ":")))
+        return _render_research_prompt(topic, _expand_page_handles(findings_json))
+
+
+def _expand_page_handles(findings_json: str) -> str:
+    """Fill in the text of pages that were passed by handle only (see fetch_url inline=False)."""
+    try:
+        findings = json.loads(findings_json)
+    except ValueError:
+        return findings_json
+    pages = findings.get("pages") if isinstance(findings, dict) else None
+    if not isinstance(pages, list):
+        return findings_json
+    for page in pages:
+        if isinstance(page, dict) and page.get("handle") and "text" not in page:
+            try:
+                page["text"] = PAGES.read(page["handle"], 0, int(page.pop("chars", PROMPT_PAGE_CHARS)))
+            except KeyError:
+                page["text"] = page.get("preview", "")
+            page.pop("preview", None)
+    return json.dumps(findings)
+
+
+def _render_research_prompt(topic: str, findings_json: str) -> str:
     return (
         "You are a precise AI research assistant focused on AI-related topics.\n"
         "Summarize the latest information for the topic below.\n\n"
@@ -101,5 +418,30 @@ def research_prompt(topic: str = "", findings_json: str = "") -> str:
     )
 
 
+def create_app():
+    """ASGI app for multi-process serving: stateless, so any worker can serve any request."""
+    return mcp.http_app(stateless_http=True)
+
+
 if __name__ == "__main__":
-    asyncio.run(mcp.run_http_async(host="127.0.0.1", port=8010))
+    import argparse
+
+    parser = argparse.ArgumentParser(description="AI Research Assistant MCP server")
+    parser.add_argument("--trace", type=str, default=None, help="Write Chrome-trace/Perfetto JSON spans to this file")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("RA_WORKERS", "1")),
+                        help="Worker processes behind the port (>1 uses the pre-fork supervisor)")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8010)
+    parser.add_argument("--grace", type=float, default=30.0, help="Seconds a worker gets to finish in-flight calls")
+    args = parser.parse_args()
+    if args.workers > 1:
+        from research_assistant.prefork import serve
+
+        # Each worker is a fresh interpreter importing research_assistant.server (fresh code on SIGHUP reload)
+        serve("research_assistant.server", args.host, args.port, args.workers, args.grace, trace=args.trace)
+    else:
+        if args.trace:
+            tracing.enable(args.trace, process_name="research_server")
+        else:
+            tracing.enable_from_env(process_name="research_server")
+        asyncio.run(mcp.run_http_async(host=args.host, port=args.port))
@@ -0,0 +1,124 @@
+"""
+Research sessions: evidence collected on the server across tool calls.
+
+search_web and fetch_url calls that carry a session_id append what they found
+(search results, page handles, corpus passages) to that session. research_summarize(topic,
+session_id) then assembles a compact, deduplicated evidence block from it, so
+clients don't serialize and upload every result and page for the prompt.
+
+Every record is its own row in the shared store (namespace "session", key
+"<session_id>/<time_ns>-<pid>-<seq>"). Appends from different pre-fork workers
+therefore never overwrite each other. Without the shared store, sessions are
+kept in process memory (bounded to MAX_LOCAL_SESSIONS).
+
+Configuration (env): RA_SESSION_TTL (seconds a session is kept, default 3600).
+"""
+
+import itertools
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit, urlunsplit
+
+from research_assistant.pages import PageStore
+from research_assistant.store import SharedStore
+
+MAX_LOCAL_SESSIONS = 256
+
+
+def normalize_url(url: str) -> str:
+    """Dedup key for a URL: lowercase scheme/host, no fragment, no trailing slash."""
+    try:
+        parts = urlsplit(url.strip())
+    except ValueError:
+        return url.strip()
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, parts.query, ""))
+
+
+class ResearchSessions:
+    def __init__(self, shared: Optional[SharedStore] = None, ttl: float = 3600.0):
+        self.shared = shared
+        self.ttl = ttl
+        self._local: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+
+    @classmethod
+    def from_env(cls, shared: Optional[SharedStore]) -> "ResearchSessions":
+        return cls(shared, ttl=float(os.getenv("RA_SESSION_TTL", "3600")))
+
+    def add(self, session_id: str, kind: str, data: Dict[str, Any]) -> None:
+        """Append one record ("search" results, a fetched "page" or a corpus "passage") to a session."""
+        record = {"kind": kind, **data}
+        if self.shared is not None:
+            key = f"{session_id}/{time.time_ns():020d}-{os.getpid()}-{next(self._seq)}"
+            self.shared.put("session", key, json.dumps(record), self.ttl)
+            return
+        with self._lock:
+            self._local.setdefault(session_id, []).append(record)
+            self._local.move_to_end(session_id)
+            while len(self._local) > MAX_LOCAL_SESSIONS:
+                self._local.popitem(last=False)
+
+    def records(self, session_id: str) -> List[Dict[str, Any]]:
+        if self.shared is not None:
+            return [json.loads(v) for _, v in self.shared.scan("session", f"{session_id}/")]
+        with self._lock:
+            return list(self._local.get(session_id, ()))
+
+    def evidence(self, session_id: str, pages: PageStore, page_chars: int) -> Dict[str, Any]:
+        """
+        Deduplicated evidence for a session: {"results": [...], "pages": [...]}.
+
+        Results are unique by normalized URL, in the order they were first
+        found. A page fetched twice appears once. Page text is read from the
+        page store, capped at page_chars, and the snippet of a result with a
+        fetched page is dropped because the page text covers it.
+        """
+        results: Dict[str, Dict[str, Any]] = {}
+        fetched: Dict[str, Dict[str, Any]] = {}
+        stored: Dict[str, Dict[str, Any]] = {}  # corpus passages, grouped by URL
+        for rec in self.records(session_id):
+            if rec["kind"] == "search":
+                for r in rec.get("results", []):
+                    key = normalize_url(r.get("url") or "")
+                    if key and key not in results:
+                        results[key] = {"title": r.get("title"), "url": r.get("url"), "snippet": r.get("snippet")}
+            elif rec["kind"] == "page":
+                key = normalize_url(rec.get("url") or "")
+                if key and key not in fetched:
+                    fetched[key] = rec
+            elif rec["kind"] == "passage":
+                key = normalize_url(rec.get("url") or "")
+                if key:
+                    entry = stored.setdefault(key, {"url": rec["url"], "title": rec.get("title", ""), "texts": []})
+                    if rec.get("text") and rec["text"] not in entry["texts"]:
+                        entry["texts"].append(rec["text"])
+        for i, r in enumerate(results.values()):
+            r["rank"] = i + 1
+        out_pages = []
+        for key, rec in fetched.items():
+            try:
+                text = pages.read(rec["handle"], 0, page_chars)
+            except KeyError:
+                continue  # page expired from the store
+            page = {"url": rec["url"], "title": rec.get("title", ""), "text": text}
+            if key in results:
+                results[key].pop("snippet", None)
+                page["rank"] = results[key]["rank"]
+            out_pages.append(page)
+        # Corpus passages stand in for pages that were not fetched in this session
+        for key, entry in stored.items():
+            if key in fetched:
+                continue
+            page = {"url": entry["url"], "title": entry["title"], "text": " … ".join(entry["texts"])[:page_chars],
+                    "source": "corpus"}
+            if key in results:
+                results[key].pop("snippet", None)
+                page["rank"] = results[key]["rank"]
+            out_pages.append(page)
+        return {"results": list(results.values()), "pages": out_pages}
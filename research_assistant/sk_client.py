@@ -1,6 +1,7 @@
 import asyncio
 import json
 import os
+import uuid
 from typing import Any, Dict, List
 from dotenv import load_dotenv
 from fastmcp import Client as MCPClient
@@ -16,7 +17,9 @@ except Exception:  # pragma: no cover
     except Exception as e:  # pragma: no cover
         raise RuntimeError("Semantic Kernel KernelArguments not found. Please upgrade 'semantic-kernel'.") from e
 
-import google.generativeai as genai
+from common import tracing
+from common.llm_gateway import LLMUnavailableError, get_gateway
+
 SERVER_URL = "http://127.0.0.1:8010/mcp"
 load_dotenv()
 
@@ -56,7 +59,6 @@ class Summarizer:
         api_key = os.getenv("GOOGLE_API_KEY")
         if not api_key:
             raise RuntimeError("GOOGLE_API_KEY is not set in environment/.env")
-        genai.configure(api_key=api_key)
         system_instruction = (
             "You are a precise research writer. Produce a clean, accurate, and up-to-date report in Markdown. "
             "Use clear headings, bullet lists, short paragraphs, and add a Sources section at the end. "
@@ -66,15 +68,15 @@ class Summarizer:
         )
         preferred = model or os.getenv("GEMINI_MODEL") or "gemini-1.5-flash"
         try:
-            mdl = genai.GenerativeModel(preferred, system_instruction=system_instruction)
-            return mdl.generate_content(prompt).text or ""
-        except Exception:
-            if preferred != "gemini-1.5-flash":
-                try:
-                    mdl2 = genai.GenerativeModel("gemini-1.5-flash", system_instruction=system_instruction)
-                    return mdl2.generate_content(prompt).text or ""
-                except Exception:
-                    pass
+            return await get_gateway().generate(
+                prompt,
+                model=preferred,
+                system_instruction=system_instruction,
+                fallback_model="gemini-1.5-flash",
+                # Start flash in parallel if the preferred model is slow to produce a first token
+                hedge=True,
+            )
+        except LLMUnavailableError:
             # local fallback
             return ""
 
@@ -83,10 +85,12 @@ class MCPTools:
         self.server_url = server_url
 
     @kernel_function(name="search_web", description="Search the web via MCP server; returns list of results")
-    async def search_web(self, query: str, max_results: int = 6) -> List[Dict[str, Any]]:
+    async def search_web(self, query: str, max_results: int = 6, session_id: str = "") -> List[Dict[str, Any]]:
         client = MCPClient(self.server_url)
         async with client:
-            res = await client.call_tool("search_web", {"query": query, "max_results": max_results})
+            res = await tracing.call_tool(
+                client, "search_web", {"query": query, "max_results": max_results, "session_id": session_id}
+            )
             direct = getattr(res, "result", None)
             if isinstance(direct, list):
                 return direct
@@ -101,10 +105,13 @@ class MCPTools:
             return []
 
     @kernel_function(name="fetch_url", description="Fetch a URL via MCP server and extract content")
-    async def fetch_url(self, url: str, max_chars: int = 8000, insecure: bool = False) -> Dict[str, Any]:
+    async def fetch_url(self, url: str, max_chars: int = 8000, insecure: bool = False, inline: bool = True,
+                        session_id: str = "") -> Dict[str, Any]:
         client = MCPClient(self.server_url)
         async with client:
-            res = await client.call_tool("fetch_url", {"url": url, "max_chars": max_chars, "insecure": insecure})
+            res = await tracing.call_tool(client, "fetch_url", {
+                "url": url, "max_chars": max_chars, "insecure": insecure, "inline": inline, "session_id": session_id,
+            })
             direct = getattr(res, "result", None)
             if isinstance(direct, dict):
                 return direct
@@ -119,10 +126,11 @@ class MCPTools:
             return {}
 
     @kernel_function(name="get_research_prompt", description="Get the summarization prompt from MCP server")
-    async def get_research_prompt(self, topic: str, findings_json: str) -> str:
+    async def get_research_prompt(self, topic: str, findings_json: str = "", session_id: str = "") -> str:
         client = MCPClient(self.server_url)
-        async with client:
-            tpl = await client.get_prompt("research_summarize", {"topic": topic, "findings_json": findings_json})
+        async with client, tracing.span("mcp.get_prompt research_summarize", cat="mcp"):
+            args = {"topic": topic, "session_id": session_id} if session_id else {"topic": topic, "findings_json": findings_json}
+            tpl = await client.get_prompt("research_summarize", args)
             msg0 = tpl.messages[0]
             content_field = getattr(msg0, "content", None)
             if isinstance(content_field, list) and content_field:
@@ -137,12 +145,21 @@ class SKAgent:
         self.model = model or os.getenv("GEMINI_MODEL")
 
     async def run(self, topic: str, max_results: int = 6, out_file: str = "research_report.md", insecure_ssl: bool = False) -> str:
+        with tracing.span("sk_agent.run", cat="client", topic=topic):
+            return await self._run(topic, max_results=max_results, out_file=out_file, insecure_ssl=insecure_ssl)
+
+    async def _run(self, topic: str, max_results: int, out_file: str, insecure_ssl: bool) -> str:
+        # Evidence accumulates on the server under this research session
+        session_id = uuid.uuid4().hex
+
         # 1) Search
         search_fn = getattr(self.kernel, "get_function")("mcp", "search_web")
-        results_obj = await self.kernel.invoke(search_fn, KernelArguments(query=topic, max_results=max_results))  # type: ignore
+        results_obj = await self.kernel.invoke(
+            search_fn, KernelArguments(query=topic, max_results=max_results, session_id=session_id)
+        )  # type: ignore
         results: List[Dict[str, Any]] = _unwrap(results_obj)
 
-        # 2) Fetch top pages
+        # 2) Fetch top pages by handle; the server keeps them in the session
         pages: List[Dict[str, Any]] = []
         for i, r in enumerate(results[: min(5, len(results))]):
             url = r.get("url")
@@ -151,13 +168,13 @@ class SKAgent:
             fetch_fn = getattr(self.kernel, "get_function")("mcp", "fetch_url")
             try:
                 page_obj = await self.kernel.invoke(
-                    fetch_fn, KernelArguments(url=url, max_chars=8000, insecure=insecure_ssl)
+                    fetch_fn, KernelArguments(url=url, max_chars=8000, insecure=insecure_ssl, inline=False, session_id=session_id)
                 )  # type: ignore
             except Exception as e1:
                 # try insecure once; if it still fails, skip this URL
                 try:
                     page_obj = await self.kernel.invoke(
-                        fetch_fn, KernelArguments(url=url, max_chars=8000, insecure=True)
+                        fetch_fn, KernelArguments(url=url, max_chars=8000, insecure=True, inline=False, session_id=session_id)
                     )  # type: ignore
                 except Exception as e2:
                     print(f"Fetch failed for {url}: {e2}")
@@ -167,10 +184,9 @@ class SKAgent:
             page["rank"] = i + 1
             pages.append(page)
 
-        # 3) Build prompt via MCP server prompt
-        findings_json = json.dumps({"results": results, "pages": pages})
+        # 3) Build prompt via MCP server prompt from the session's evidence
         get_prompt_fn = getattr(self.kernel, "get_function")("mcp", "get_research_prompt")
-        prompt_obj = await self.kernel.invoke(get_prompt_fn, KernelArguments(topic=topic, findings_json=findings_json))  # type: ignore
+        prompt_obj = await self.kernel.invoke(get_prompt_fn, KernelArguments(topic=topic, session_id=session_id))  # type: ignore
         prompt: str = _unwrap(prompt_obj)
 
         # 4) Summarize via Gemini
@@ -180,7 +196,8 @@ class SKAgent:
 
         # 5) Save
         from pathlib import Path
-        Path(out_file).write_text(report_md, encoding="utf-8")
+        with tracing.span("save.report", cat="client", out_file=out_file):
+            Path(out_file).write_text(report_md, encoding="utf-8")
         return report_md
 
 async def run_sk_agent(topic: str, max_results: int = 6, out_file: str = "research_report.md", insecure_ssl: bool = False, model: str | None = None) -> str:
@@ -188,6 +205,14 @@ async def run_sk_agent(topic: str, max_results: int = 6, out_file: str = "resear
     return await agent.run(topic=topic, max_results=max_results, out_file=out_file, insecure_ssl=insecure_ssl)
 
 if __name__ == "__main__":
+    import argparse
+
+    _parser = argparse.ArgumentParser(description="Semantic Kernel research agent (configured via RA_* env vars)")
+    _parser.add_argument("--trace", type=str, default=None, help="Write Chrome-trace/Perfetto JSON spans to this file")
+    _cli = _parser.parse_args()
+    if _cli.trace:
+        tracing.enable(_cli.trace, process_name="sk_client")
+
     async def _main():
         topic_arg = os.getenv("RA_TOPIC", "").strip()
         if not topic_arg:
@@ -0,0 +1,143 @@
+"""
+Local key/value store shared by all research server worker processes.
+
+A small SQLite file in WAL mode, so several processes (see prefork.py) can read
+and write concurrently and a cached search or page fetched by one worker is
+reused by the others. Entries live in namespaces, carry a TTL and the file is
+size-bounded (oldest entries are evicted first).
+
+Each process opens its own connection on first use. A connection inherited
+through fork() is never reused.
+
+Calls are synchronous and made from async handlers, so a worker must never sit
+on another worker's write lock: SQLite's busy timeout is kept short and a call
+that still finds the database locked is treated as a cache miss (get/scan
+return nothing, put/delete are dropped) and counted as "busy".
+
+Configuration (env): RA_SHARED_STORE (path, default
+~/.cache/research_assistant/store.sqlite3; "off" disables the store),
+RA_STORE_MAX_BYTES (default 200 MB), RA_STORE_BUSY_MS (default 50).
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+
+class _Busy(Exception):
+    """The database stayed locked past the busy timeout."""
+
+
+class SharedStore:
+    def __init__(self, path: str, max_bytes: int = 200_000_000, busy_timeout: float = 0.05):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.busy_timeout = busy_timeout
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid = 0
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.busy = 0
+
+    @classmethod
+    def from_env(cls) -> Optional["SharedStore"]:
+        path = os.getenv("RA_SHARED_STORE") or str(Path.home() / ".cache" / "research_assistant" / "store.sqlite3")
+        if path.lower() in ("off", "none", "0"):
+            return None
+        return cls(path, max_bytes=int(os.getenv("RA_STORE_MAX_BYTES", "200000000")),
+                   busy_timeout=float(os.getenv("RA_STORE_BUSY_MS", "50")) / 1000)
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None or self._pid != os.getpid():
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS kv ("
+                " ns TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+                " size INTEGER NOT NULL, expires_at REAL NOT NULL, created_at REAL NOT NULL,"
+                " PRIMARY KEY (ns, key))"
+            )
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """Serialize this process's calls; a database still locked after the busy timeout raises _Busy."""
+        with self._lock:
+            try:
+                yield
+            except sqlite3.OperationalError as e:
+                if "locked" not in str(e) and "busy" not in str(e):
+                    raise
+                self.busy += 1
+                raise _Busy() from None
+
+    def get(self, ns: str, key: str) -> Optional[str]:
+        try:
+            with self._locked():
+                row = self._db().execute(
+                    "SELECT value FROM kv WHERE ns=? AND key=? AND expires_at>?", (ns, key, time.time())
+                ).fetchone()
+        except _Busy:
+            row = None
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0]
+
+    def put(self, ns: str, key: str, value: str, ttl: float) -> None:
+        now = time.time()
+        try:
+            with self._locked():
+                db = self._db()
+                db.execute(
+                    "INSERT OR REPLACE INTO kv (ns, key, value, size, expires_at, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (ns, key, value, len(value.encode("utf-8")), now + ttl, now),
+                )
+                self._writes += 1
+                if self._writes % 100 == 0:
+                    self._evict(db, now)
+        except _Busy:
+            pass  # another worker holds the write lock; the entry is only a cache
+
+    def scan(self, ns: str, prefix: str) -> List[Tuple[str, str]]:
+        """Live (key, value) pairs in ns whose key starts with prefix, in key order."""
+        try:
+            with self._locked():
+                rows = self._db().execute(
+                    "SELECT key, value FROM kv WHERE ns=? AND key>=? AND key<? AND expires_at>? ORDER BY key",
+                    (ns, prefix, prefix + "\uffff", time.time()),
+                ).fetchall()
+        except _Busy:
+            return []
+        return [(k, v) for k, v in rows]
+
+    def delete(self, ns: str, key: str) -> None:
+        try:
+            with self._locked():
+                self._db().execute("DELETE FROM kv WHERE ns=? AND key=?", (ns, key))
+        except _Busy:
+            pass
+
+    def _evict(self, db: sqlite3.Connection, now: float) -> None:
+        db.execute("DELETE FROM kv WHERE expires_at<=?", (now,))
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM kv").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for ns, key, size in db.execute("SELECT ns, key, size FROM kv ORDER BY created_at ASC").fetchall():
+            if total <= self.max_bytes:
+                break
+            db.execute("DELETE FROM kv WHERE ns=? AND key=?", (ns, key))
+            total -= size
+
+    def stats(self) -> dict:
+        return {"path": self.path, "hits": self.hits, "misses": self.misses, "busy": self.busy}